@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import List, Tuple, Dict, Type
+from typing import List, Tuple, Dict, Set, Type, Iterable, Iterator, Callable, Deque
 from abc import ABC, abstractmethod
 import json
 from collections import deque
@@ -8,16 +8,109 @@ import os
 import shutil
 from datetime import datetime
 import inspect
+import threading
 import time
 import base64
-from austin_heller_repo.socket_queued_message_framework import SourceTypeEnum, ClientServerMessage, ClientServerMessageTypeEnum, StructureStateEnum, StructureTransitionException, Structure, StructureFactory, StructureInfluence, ClientSocketFactory, ClientMessengerFactory
+import asyncio
+import queue
+import weakref
+import numpy as np
+from functools import partial
+from austin_heller_repo.socket_queued_message_framework import SourceTypeEnum, ClientServerMessage, ClientServerMessageTypeEnum, StructureStateEnum, StructureTransitionException, Structure, StructureFactory, StructureInfluence, ClientSocketFactory, ClientMessengerFactory, ReadWriteSocketClosedException
 from austin_heller_repo.threading import Semaphore, start_thread
 from austin_heller_repo.common import StringEnum, SubprocessWrapper, is_directory_empty
 
 try:
-	from .detector import DetectRequestDetectorClientServerMessage, DetectorClientServerMessage, DetectorClientServerMessageTypeEnum, DetectedLabel, DetectResponseDetectorClientServerMessage
+	from .detector import DetectRequestDetectorClientServerMessage, DetectorClientServerMessage, DetectorClientServerMessageTypeEnum, DetectedLabels, DetectResponseDetectorClientServerMessage, DetectRejectionDetectorClientServerMessage, DetectRejectionReasonEnum, ReadinessRequestDetectorClientServerMessage, ReadinessResponseDetectorClientServerMessage, DetectedLabelEncodingEnum, AttachmentEndpointAnnouncementDetectorClientServerMessage, AttachmentClient
 except ImportError:
-	from detector import DetectRequestDetectorClientServerMessage, DetectorClientServerMessage, DetectorClientServerMessageTypeEnum, DetectedLabel, DetectResponseDetectorClientServerMessage
+	from detector import DetectRequestDetectorClientServerMessage, DetectorClientServerMessage, DetectorClientServerMessageTypeEnum, DetectedLabels, DetectResponseDetectorClientServerMessage, DetectRejectionDetectorClientServerMessage, DetectRejectionReasonEnum, ReadinessRequestDetectorClientServerMessage, ReadinessResponseDetectorClientServerMessage, DetectedLabelEncodingEnum, AttachmentEndpointAnnouncementDetectorClientServerMessage, AttachmentClient
+
+
+class DetectRejectedException(Exception):
+
+	def __init__(self, *, image_uuid: str, detect_rejection_reason: DetectRejectionReasonEnum):
+		super().__init__(f"Detection of image {image_uuid} was rejected: {detect_rejection_reason.value}")
+
+		self.__image_uuid = image_uuid
+		self.__detect_rejection_reason = detect_rejection_reason
+
+	def get_image_uuid(self) -> str:
+		return self.__image_uuid
+
+	def get_detect_rejection_reason(self) -> DetectRejectionReasonEnum:
+		return self.__detect_rejection_reason
+
+
+class BulkDetectionResult():
+
+	def __init__(self, *, image_file_path: str, detected_labels: DetectedLabels or None, exception: Exception or None):
+
+		self.__image_file_path = image_file_path
+		self.__detected_labels = detected_labels
+		self.__exception = exception
+
+	def get_image_file_path(self) -> str:
+		return self.__image_file_path
+
+	def get_detected_labels(self) -> DetectedLabels or None:
+		return self.__detected_labels
+
+	def get_exception(self) -> Exception or None:
+		return self.__exception
+
+	def to_json(self) -> Dict:
+		return {
+			"image_file_path": self.__image_file_path,
+			"detected_labels": None if self.__detected_labels is None else self.__detected_labels.to_list_of_json(),
+			"error": None if self.__exception is None else str(self.__exception)
+		}
+
+
+class ImagePreprocessor():
+
+	def __init__(self, *, image_size: int, image_extension: str = ".jpg", jpeg_quality: int = 95):
+
+		self.__image_size = image_size
+		self.__image_extension = image_extension
+		self.__jpeg_quality = jpeg_quality
+
+	def preprocess(self, *, image_bytes: bytes, image_extension: str) -> Tuple[bytes, str, float, float]:
+
+		# returns the image to send along with the factors that map its coordinates back to the original image
+
+		# only needed by clients that preprocess
+		import cv2
+
+		image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+		if image is None:
+			# sent unchanged so that the detector reports the failure
+			return image_bytes, image_extension, 1.0, 1.0
+
+		height, width = image.shape[:2]
+		if max(height, width) <= self.__image_size:
+			# the detector would not shrink it either
+			return image_bytes, image_extension, 1.0, 1.0
+
+		# the longest side matches what the detector letterboxes to, so the model sees the same pixels either way
+		resize_ratio = self.__image_size / max(height, width)
+		resized_width = max(1, round(width * resize_ratio))
+		resized_height = max(1, round(height * resize_ratio))
+		resized_image = cv2.resize(image, (resized_width, resized_height), interpolation=cv2.INTER_AREA)
+
+		if self.__image_extension.lower() in [".jpg", ".jpeg"]:
+			encode_parameters = [cv2.IMWRITE_JPEG_QUALITY, self.__jpeg_quality]
+		else:
+			encode_parameters = []
+		is_successful, encoded_image = cv2.imencode(self.__image_extension, resized_image, encode_parameters)
+		if not is_successful:
+			raise Exception(f"Failed to encode image as {self.__image_extension}.")
+
+		return encoded_image.tobytes(), self.__image_extension, width / resized_width, height / resized_height
+
+
+class DetectorRoutingEnum(StringEnum):
+	LeastOutstanding = "least_outstanding"
+	LowestLatency = "lowest_latency"
 
 
 class ClientSourceTypeEnum(SourceTypeEnum):
@@ -43,34 +136,114 @@ class DetectorStructure(Structure):
 
 		self.__source_uuid = source_uuid
 
+		self.__attachment_client = None  # type: AttachmentClient
+
+	def get_source_uuid(self) -> str:
+		return self.__source_uuid
+
+	def set_attachment_client(self, *, attachment_client: AttachmentClient):
+		self.__attachment_client = attachment_client
+
 	def on_client_connected(self, *, source_uuid: str, source_type: SourceTypeEnum, tag_json: Dict or None):
 		raise Exception(f"Unexpected connection from source {source_type.value}")
 
-	def send_detection_request(self, *, image_bytes: bytes, image_extension: str, image_uuid: str):
+	def send_readiness_request(self, *, readiness_uuid: str):
+		self.send_client_server_message(
+			client_server_message=ReadinessRequestDetectorClientServerMessage(
+				readiness_uuid=readiness_uuid,
+				destination_uuid=self.__source_uuid
+			)
+		)
+
+	def send_detection_request(self, *, image_bytes: bytes, image_extension: str, image_uuid: str, timeout_seconds: float = None, tile_size: int = None, tile_overlap_ratio: float = None, detected_label_encoding: DetectedLabelEncodingEnum = DetectedLabelEncodingEnum.Json):
+		attachment_client = self.__attachment_client
+		if attachment_client is not None:
+			# the image travels as raw bytes over the attachment connection and the request only refers to it
+			image_attachment_uuid = str(uuid.uuid4())
+			try:
+				attachment_client.put_attachment(
+					attachment_uuid=image_attachment_uuid,
+					attachment_bytes=image_bytes
+				)
+			except Exception as ex:
+				print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: falling back to base64 after failing to upload attachment: {ex}")
+				self.__attachment_client = None
+				attachment_client.dispose()
+			else:
+				self.send_client_server_message(
+					client_server_message=DetectRequestDetectorClientServerMessage(
+						image_bytes_base64string=None,
+						image_extension=image_extension,
+						image_uuid=image_uuid,
+						destination_uuid=self.__source_uuid,
+						timeout_seconds=timeout_seconds,
+						tile_size=tile_size,
+						tile_overlap_ratio=tile_overlap_ratio,
+						detected_label_encoding_string=detected_label_encoding.value,
+						image_attachment_uuid=image_attachment_uuid
+					)
+				)
+				return
 		self.send_client_server_message(
 			client_server_message=DetectRequestDetectorClientServerMessage(
 				image_bytes_base64string=base64.b64encode(image_bytes).decode(),
 				image_extension=image_extension,
 				image_uuid=image_uuid,
-				destination_uuid=self.__source_uuid
+				destination_uuid=self.__source_uuid,
+				timeout_seconds=timeout_seconds,
+				tile_size=tile_size,
+				tile_overlap_ratio=tile_overlap_ratio,
+				detected_label_encoding_string=detected_label_encoding.value
 			)
 		)
 
+	def dispose(self):
+		super().dispose()
+		if self.__attachment_client is not None:
+			self.__attachment_client.dispose()
+
 
 class ClientStructure(Structure):
 
-	def __init__(self, *, detector_client_messenger_factory: ClientMessengerFactory):
+	def __init__(self, *, detector_client_messenger_factory: ClientMessengerFactory = None, detector_client_messenger_factories: List[ClientMessengerFactory] = None, detector_routing: DetectorRoutingEnum = DetectorRoutingEnum.LeastOutstanding, image_preprocessor: ImagePreprocessor = None, maximum_in_flight_detection_total: int = 64, minimum_reconnect_delay_seconds: float = 1.0, maximum_reconnect_delay_seconds: float = 60.0):
 		super().__init__(
 			states=ClientStructureStateEnum,
 			initial_state=ClientStructureStateEnum.Active
 		)
 
-		self.__detector_client_messenger_factory = detector_client_messenger_factory
-
-		self.__detector_structure = None  # type: DetectorStructure
+		if detector_client_messenger_factories is None:
+			if detector_client_messenger_factory is None:
+				raise Exception(f"Failed to provide a detector client messenger factory.")
+			detector_client_messenger_factories = [detector_client_messenger_factory]
+		elif detector_client_messenger_factory is not None:
+			raise Exception(f"Provide either a single detector client messenger factory or a list of them, not both.")
+
+		self.__detector_client_messenger_factories = detector_client_messenger_factories
+		self.__detector_routing = detector_routing
+		self.__image_preprocessor = image_preprocessor
+		self.__maximum_in_flight_detection_total = maximum_in_flight_detection_total
+		self.__minimum_reconnect_delay_seconds = minimum_reconnect_delay_seconds
+		self.__maximum_reconnect_delay_seconds = maximum_reconnect_delay_seconds
+
+		self.__detector_structure_per_detector_index = {}  # type: Dict[int, DetectorStructure]
 		self.__detector_structure_semaphore = Semaphore()
-		self.__detected_labels_per_image_uuid = {}  # type: Dict[str, List[DetectedLabel]]
-		self.__blocking_semaphore_per_image_uuid = {}  # type: Dict[str, Semaphore]
+		self.__reconnect_delay_seconds_per_detector_index = {}  # type: Dict[int, float]
+		self.__reconnect_time_per_detector_index = {}  # type: Dict[int, float]
+		self.__outstanding_image_uuids_per_detector_index = {}  # type: Dict[int, Set[str]]
+		self.__latency_seconds_per_detector_index = {}  # type: Dict[int, float]
+		self.__send_detection_request_method_per_image_uuid = {}  # type: Dict[str, Callable[[DetectorStructure], None]]
+		self.__detector_index_and_sent_time_per_image_uuid = {}  # type: Dict[str, Tuple[int, float]]
+		self.__x_scale_and_y_scale_per_image_uuid = {}  # type: Dict[str, Tuple[float, float]]
+		self.__unrouted_image_uuids = deque()  # type: deque[str]
+		self.__is_reconnect_thread_active = True
+		self.__detected_labels_per_image_uuid = {}  # type: Dict[str, DetectedLabels]
+		self.__detect_rejection_reason_per_image_uuid = {}  # type: Dict[str, DetectRejectionReasonEnum]
+		self.__blocking_event_per_image_uuid = {}  # type: Dict[str, threading.Event]
+		self.__is_ready_per_readiness_uuid = {}  # type: Dict[str, bool]
+		self.__blocking_semaphore_per_readiness_uuid = {}  # type: Dict[str, Semaphore]
+		self.__future_and_event_loop_per_image_uuid = {}  # type: Dict[str, Tuple[asyncio.Future, asyncio.AbstractEventLoop]]
+		self.__bulk_result_queue_and_image_file_path_per_image_uuid = {}  # type: Dict[str, Tuple[queue.Queue, str]]
+		self.__in_flight_detection_semaphore_per_event_loop = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]
 
 		self.add_transition(
 			client_server_message_type=DetectorClientServerMessageTypeEnum.DetectResponse,
@@ -80,16 +253,211 @@ class ClientStructure(Structure):
 			on_transition=self.__detector_detect_response_transition
 		)
 
+		self.add_transition(
+			client_server_message_type=DetectorClientServerMessageTypeEnum.DetectRejection,
+			from_source_type=ClientSourceTypeEnum.Detector,
+			start_structure_state=ClientStructureStateEnum.Active,
+			end_structure_state=ClientStructureStateEnum.Active,
+			on_transition=self.__detector_detect_rejection_transition
+		)
+
+		self.add_transition(
+			client_server_message_type=DetectorClientServerMessageTypeEnum.ReadinessResponse,
+			from_source_type=ClientSourceTypeEnum.Detector,
+			start_structure_state=ClientStructureStateEnum.Active,
+			end_structure_state=ClientStructureStateEnum.Active,
+			on_transition=self.__detector_readiness_response_transition
+		)
+
+		self.add_transition(
+			client_server_message_type=DetectorClientServerMessageTypeEnum.AttachmentEndpointAnnouncement,
+			from_source_type=ClientSourceTypeEnum.Detector,
+			start_structure_state=ClientStructureStateEnum.Active,
+			end_structure_state=ClientStructureStateEnum.Active,
+			on_transition=self.__detector_attachment_endpoint_announcement_transition
+		)
+
 		self.__initialize()
 
 	def __initialize(self):
 
-		self.connect_to_outbound_messenger(
-			client_messenger_factory=self.__detector_client_messenger_factory,
-			source_type=ClientSourceTypeEnum.Detector,
-			tag_json=None
+		for detector_index in range(len(self.__detector_client_messenger_factories)):
+			self.__reconnect_delay_seconds_per_detector_index[detector_index] = self.__minimum_reconnect_delay_seconds
+			self.__reconnect_time_per_detector_index[detector_index] = 0.0
+			self.__outstanding_image_uuids_per_detector_index[detector_index] = set()
+			self.__connect_to_detector(
+				detector_index=detector_index
+			)
+
+		start_thread(self.__reconnect_thread_method)
+
+	def __connect_to_detector(self, *, detector_index: int):
+
+		# the next attempt is pushed back whether or not this one succeeds and the backoff only resets once the detector is connected
+		self.__detector_structure_semaphore.acquire()
+		try:
+			reconnect_delay_seconds = self.__reconnect_delay_seconds_per_detector_index[detector_index]
+			self.__reconnect_time_per_detector_index[detector_index] = time.monotonic() + reconnect_delay_seconds
+			self.__reconnect_delay_seconds_per_detector_index[detector_index] = min(reconnect_delay_seconds * 2, self.__maximum_reconnect_delay_seconds)
+		finally:
+			self.__detector_structure_semaphore.release()
+
+		try:
+			self.connect_to_outbound_messenger(
+				client_messenger_factory=self.__detector_client_messenger_factories[detector_index],
+				source_type=ClientSourceTypeEnum.Detector,
+				tag_json={
+					"detector_index": detector_index,
+					# a detector that supports attachments answers with its attachment endpoint, while an older one ignores this
+					"is_attachment_supported": True
+				}
+			)
+		except Exception as ex:
+			print(f"{datetime.utcnow()}: ClientStructure: {inspect.stack()[0][3]}: failed to connect to detector {detector_index}: {ex}")
+
+	def __reconnect_thread_method(self):
+
+		while self.__is_reconnect_thread_active:
+			self.__detector_structure_semaphore.acquire()
+			try:
+				reconnect_time = time.monotonic()
+				detector_indexes = [detector_index for detector_index in range(len(self.__detector_client_messenger_factories)) if detector_index not in self.__detector_structure_per_detector_index and self.__reconnect_time_per_detector_index[detector_index] <= reconnect_time]
+			finally:
+				self.__detector_structure_semaphore.release()
+
+			for detector_index in detector_indexes:
+				if self.__is_reconnect_thread_active:
+					self.__connect_to_detector(
+						detector_index=detector_index
+					)
+
+			time.sleep(self.__minimum_reconnect_delay_seconds)
+
+	def __drop_detector(self, *, detector_index: int, detector_structure: DetectorStructure) -> List[str]:
+
+		# returns the image uuids that were waiting on the dropped detector so that they can be routed elsewhere
+		self.__detector_structure_semaphore.acquire()
+		try:
+			if self.__detector_structure_per_detector_index.get(detector_index, None) is not detector_structure:
+				# already dropped, and possibly already reconnected
+				return []
+			print(f"{datetime.utcnow()}: ClientStructure: {inspect.stack()[0][3]}: dropping unreachable detector {detector_index}")
+			del self.__detector_structure_per_detector_index[detector_index]
+			self.__latency_seconds_per_detector_index.pop(detector_index, None)
+			orphaned_image_uuids = list(self.__outstanding_image_uuids_per_detector_index[detector_index])
+			self.__outstanding_image_uuids_per_detector_index[detector_index].clear()
+			for image_uuid in orphaned_image_uuids:
+				self.__detector_index_and_sent_time_per_image_uuid.pop(image_uuid, None)
+			return orphaned_image_uuids
+		finally:
+			self.__detector_structure_semaphore.release()
+
+	def __get_routed_detector_index(self) -> int or None:
+
+		# expects the detector structure semaphore to be held
+		routed_detector_index = None
+		routed_cost = None
+		for detector_index in self.__detector_structure_per_detector_index.keys():
+			outstanding_total = len(self.__outstanding_image_uuids_per_detector_index[detector_index])
+			latency_seconds = self.__latency_seconds_per_detector_index.get(detector_index, 0.0)
+			if self.__detector_routing == DetectorRoutingEnum.LeastOutstanding:
+				cost = (outstanding_total, latency_seconds)
+			elif self.__detector_routing == DetectorRoutingEnum.LowestLatency:
+				# a detector without an observed latency yet is costless so that it gets measured
+				cost = ((outstanding_total + 1) * latency_seconds, outstanding_total)
+			else:
+				raise NotImplementedError(f"Detector routing not implemented: {self.__detector_routing.value}")
+			if routed_cost is None or cost < routed_cost:
+				routed_detector_index = detector_index
+				routed_cost = cost
+		return routed_detector_index
+
+	def __send_detection_request(self, *, image_bytes: bytes, image_extension: str, image_uuid: str, timeout_seconds: float, tile_size: int, tile_overlap_ratio: float, detected_label_encoding: DetectedLabelEncodingEnum):
+
+		# a tiled request is sent at full resolution since tiling exists to find what downscaling would lose
+		if self.__image_preprocessor is not None and (tile_size is None or tile_size == 0):
+			image_bytes, image_extension, x_scale, y_scale = self.__image_preprocessor.preprocess(
+				image_bytes=image_bytes,
+				image_extension=image_extension
+			)
+		else:
+			x_scale, y_scale = 1.0, 1.0
+
+		# the request is kept until it completes so that it can be sent again if its detector is dropped
+		self.__detector_structure_semaphore.acquire()
+		try:
+			if x_scale != 1.0 or y_scale != 1.0:
+				self.__x_scale_and_y_scale_per_image_uuid[image_uuid] = (x_scale, y_scale)
+			self.__send_detection_request_method_per_image_uuid[image_uuid] = partial(
+				DetectorStructure.send_detection_request,
+				image_bytes=image_bytes,
+				image_extension=image_extension,
+				image_uuid=image_uuid,
+				timeout_seconds=timeout_seconds,
+				tile_size=tile_size,
+				tile_overlap_ratio=tile_overlap_ratio,
+				detected_label_encoding=detected_label_encoding
+			)
+		finally:
+			self.__detector_structure_semaphore.release()
+
+		self.__route_detection_request(
+			image_uuid=image_uuid
 		)
 
+	def __route_detection_request(self, *, image_uuid: str):
+
+		while True:
+			self.__detector_structure_semaphore.acquire()
+			try:
+				send_detection_request_method = self.__send_detection_request_method_per_image_uuid.get(image_uuid, None)
+				if send_detection_request_method is None:
+					# the caller stopped waiting on this request
+					return
+				detector_index = self.__get_routed_detector_index()
+				if detector_index is None:
+					# waits for the next detector to connect rather than failing the caller
+					self.__unrouted_image_uuids.append(image_uuid)
+					return
+				detector_structure = self.__detector_structure_per_detector_index[detector_index]
+				self.__outstanding_image_uuids_per_detector_index[detector_index].add(image_uuid)
+				self.__detector_index_and_sent_time_per_image_uuid[image_uuid] = (detector_index, time.monotonic())
+			finally:
+				self.__detector_structure_semaphore.release()
+
+			try:
+				send_detection_request_method(detector_structure)
+				return
+			except ReadWriteSocketClosedException as ex:
+				self.__detector_structure_semaphore.acquire()
+				try:
+					self.__outstanding_image_uuids_per_detector_index[detector_index].discard(image_uuid)
+					self.__detector_index_and_sent_time_per_image_uuid.pop(image_uuid, None)
+				finally:
+					self.__detector_structure_semaphore.release()
+
+				for orphaned_image_uuid in self.__drop_detector(detector_index=detector_index, detector_structure=detector_structure):
+					self.__route_detection_request(
+						image_uuid=orphaned_image_uuid
+					)
+
+	def __complete_detection_request(self, *, image_uuid: str, is_latency_observed: bool) -> Tuple[float, float] or None:
+
+		# expects the detector structure semaphore to be held and returns the scale of a preprocessed image
+		self.__send_detection_request_method_per_image_uuid.pop(image_uuid, None)
+		detector_index_and_sent_time = self.__detector_index_and_sent_time_per_image_uuid.pop(image_uuid, None)
+		if detector_index_and_sent_time is not None:
+			detector_index, sent_time = detector_index_and_sent_time
+			self.__outstanding_image_uuids_per_detector_index[detector_index].discard(image_uuid)
+			if is_latency_observed:
+				latency_seconds = time.monotonic() - sent_time
+				previous_latency_seconds = self.__latency_seconds_per_detector_index.get(detector_index, None)
+				if previous_latency_seconds is None:
+					self.__latency_seconds_per_detector_index[detector_index] = latency_seconds
+				else:
+					self.__latency_seconds_per_detector_index[detector_index] = previous_latency_seconds * 0.8 + latency_seconds * 0.2
+		return self.__x_scale_and_y_scale_per_image_uuid.pop(image_uuid, None)
+
 	def __detector_detect_response_transition(self, structure_influence: StructureInfluence):
 
 		client_server_message = structure_influence.get_client_server_message()
@@ -101,53 +469,445 @@ class ClientStructure(Structure):
 
 			self.__detector_structure_semaphore.acquire()
 			try:
-				self.__detected_labels_per_image_uuid[image_uuid] = detected_labels
-				self.__blocking_semaphore_per_image_uuid[image_uuid].release()
+				x_scale_and_y_scale = self.__complete_detection_request(
+					image_uuid=image_uuid,
+					is_latency_observed=True
+				)
+				if x_scale_and_y_scale is not None:
+					x_scale, y_scale = x_scale_and_y_scale
+					detected_labels = detected_labels.scale(
+						x_scale=x_scale,
+						y_scale=y_scale
+					)
+				if image_uuid in self.__future_and_event_loop_per_image_uuid:
+					future, event_loop = self.__future_and_event_loop_per_image_uuid.pop(image_uuid)
+					event_loop.call_soon_threadsafe(self.__resolve_future, future, detected_labels, None)
+				elif image_uuid in self.__bulk_result_queue_and_image_file_path_per_image_uuid:
+					bulk_result_queue, image_file_path = self.__bulk_result_queue_and_image_file_path_per_image_uuid.pop(image_uuid)
+					bulk_result_queue.put(BulkDetectionResult(
+						image_file_path=image_file_path,
+						detected_labels=detected_labels,
+						exception=None
+					))
+				elif image_uuid in self.__blocking_event_per_image_uuid:
+					self.__detected_labels_per_image_uuid[image_uuid] = detected_labels
+					self.__blocking_event_per_image_uuid[image_uuid].set()
+				else:
+					# the caller stopped waiting on this request before its response arrived
+					print(f"{datetime.utcnow()}: ClientStructure: {inspect.stack()[0][3]}: ignoring response for unknown image {image_uuid}")
+			finally:
+				self.__detector_structure_semaphore.release()
+
+	def __detector_detect_rejection_transition(self, structure_influence: StructureInfluence):
+
+		client_server_message = structure_influence.get_client_server_message()
+		if not isinstance(client_server_message, DetectRejectionDetectorClientServerMessage):
+			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
+		else:
+			image_uuid = client_server_message.get_image_uuid()
+			detect_rejection_reason = client_server_message.get_detect_rejection_reason()
+
+			self.__detector_structure_semaphore.acquire()
+			try:
+				# a rejection is answered without inference, so it says nothing about the detector's latency
+				self.__complete_detection_request(
+					image_uuid=image_uuid,
+					is_latency_observed=False
+				)
+				if image_uuid in self.__future_and_event_loop_per_image_uuid:
+					future, event_loop = self.__future_and_event_loop_per_image_uuid.pop(image_uuid)
+					event_loop.call_soon_threadsafe(self.__resolve_future, future, None, DetectRejectedException(
+						image_uuid=image_uuid,
+						detect_rejection_reason=detect_rejection_reason
+					))
+				elif image_uuid in self.__bulk_result_queue_and_image_file_path_per_image_uuid:
+					bulk_result_queue, image_file_path = self.__bulk_result_queue_and_image_file_path_per_image_uuid.pop(image_uuid)
+					bulk_result_queue.put(BulkDetectionResult(
+						image_file_path=image_file_path,
+						detected_labels=None,
+						exception=DetectRejectedException(
+							image_uuid=image_uuid,
+							detect_rejection_reason=detect_rejection_reason
+						)
+					))
+				elif image_uuid in self.__blocking_event_per_image_uuid:
+					self.__detect_rejection_reason_per_image_uuid[image_uuid] = detect_rejection_reason
+					self.__blocking_event_per_image_uuid[image_uuid].set()
+				else:
+					# the caller stopped waiting on this request before its rejection arrived
+					print(f"{datetime.utcnow()}: ClientStructure: {inspect.stack()[0][3]}: ignoring rejection for unknown image {image_uuid}")
+			finally:
+				self.__detector_structure_semaphore.release()
+
+	def __resolve_future(self, future: asyncio.Future, detected_labels: DetectedLabels or None, exception: Exception or None):
+		# the awaiting caller may have been cancelled while the response was on its way
+		if not future.done():
+			if exception is not None:
+				future.set_exception(exception)
+			else:
+				future.set_result(detected_labels)
+
+	def __detector_readiness_response_transition(self, structure_influence: StructureInfluence):
+
+		client_server_message = structure_influence.get_client_server_message()
+		if not isinstance(client_server_message, ReadinessResponseDetectorClientServerMessage):
+			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
+		else:
+			readiness_uuid = client_server_message.get_readiness_uuid()
+
+			self.__detector_structure_semaphore.acquire()
+			try:
+				if readiness_uuid in self.__blocking_semaphore_per_readiness_uuid:
+					self.__is_ready_per_readiness_uuid[readiness_uuid] = client_server_message.is_ready()
+					self.__blocking_semaphore_per_readiness_uuid[readiness_uuid].release()
+			finally:
+				self.__detector_structure_semaphore.release()
+
+	def __detector_attachment_endpoint_announcement_transition(self, structure_influence: StructureInfluence):
+
+		client_server_message = structure_influence.get_client_server_message()
+		if not isinstance(client_server_message, AttachmentEndpointAnnouncementDetectorClientServerMessage):
+			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
+		else:
+			source_uuid = structure_influence.get_source_uuid()
+
+			self.__detector_structure_semaphore.acquire()
+			try:
+				for detector_structure in self.__detector_structure_per_detector_index.values():
+					if detector_structure.get_source_uuid() == source_uuid:
+						detector_structure.set_attachment_client(
+							attachment_client=AttachmentClient(
+								host_address=client_server_message.get_host_address(),
+								host_port=client_server_message.get_host_port()
+							)
+						)
 			finally:
 				self.__detector_structure_semaphore.release()
 
 	def on_client_connected(self, *, source_uuid: str, source_type: SourceTypeEnum, tag_json: Dict or None):
 		if source_type == ClientSourceTypeEnum.Detector:
-			self.__detector_structure = DetectorStructure(
+			detector_index = tag_json["detector_index"]
+			detector_structure = DetectorStructure(
 				source_uuid=source_uuid
 			)
 			self.register_child_structure(
-				structure=self.__detector_structure
+				structure=detector_structure
 			)
+
+			self.__detector_structure_semaphore.acquire()
+			try:
+				self.__detector_structure_per_detector_index[detector_index] = detector_structure
+				self.__reconnect_delay_seconds_per_detector_index[detector_index] = self.__minimum_reconnect_delay_seconds
+				unrouted_image_uuids = list(self.__unrouted_image_uuids)
+				self.__unrouted_image_uuids.clear()
+			finally:
+				self.__detector_structure_semaphore.release()
+
+			for image_uuid in unrouted_image_uuids:
+				self.__route_detection_request(
+					image_uuid=image_uuid
+				)
 		else:
 			raise Exception(f"Unexpected connection from source {source_type.value}")
 
-	def get_detected_labels(self, *, image_file_path: str) -> List[DetectedLabel]:
+	def get_detected_labels(self, *, image_file_path: str, timeout_seconds: float = None, tile_size: int = None, tile_overlap_ratio: float = None, detected_label_encoding: DetectedLabelEncodingEnum = DetectedLabelEncodingEnum.Json) -> DetectedLabels:
 		with open(image_file_path, "rb") as file_handle:
 			image_bytes = file_handle.read()
 		image_extension = os.path.splitext(image_file_path)[1]
 
 		image_uuid = str(uuid.uuid4())
 
-		blocking_semaphore = Semaphore()
-		blocking_semaphore.acquire()
+		blocking_event = threading.Event()
 
 		self.__detector_structure_semaphore.acquire()
 		try:
-			self.__blocking_semaphore_per_image_uuid[image_uuid] = blocking_semaphore
+			self.__blocking_event_per_image_uuid[image_uuid] = blocking_event
 		finally:
 			self.__detector_structure_semaphore.release()
 
-		self.__detector_structure.send_detection_request(
+		self.__send_detection_request(
 			image_bytes=image_bytes,
 			image_extension=image_extension,
-			image_uuid=image_uuid
+			image_uuid=image_uuid,
+			timeout_seconds=timeout_seconds,
+			tile_size=tile_size,
+			tile_overlap_ratio=tile_overlap_ratio,
+			detected_label_encoding=detected_label_encoding
 		)
 
+		# the same deadline is kept here in case the detector never answers, such as while no detector is connected
+		blocking_event.wait(timeout_seconds)
+
+		self.__detector_structure_semaphore.acquire()
+		try:
+			detected_labels = self.__detected_labels_per_image_uuid.pop(image_uuid, None)
+			detect_rejection_reason = self.__detect_rejection_reason_per_image_uuid.pop(image_uuid, None)
+			del self.__blocking_event_per_image_uuid[image_uuid]
+			if not blocking_event.is_set():
+				self.__complete_detection_request(
+					image_uuid=image_uuid,
+					is_latency_observed=False
+				)
+				detect_rejection_reason = DetectRejectionReasonEnum.DeadlineExpired
+		finally:
+			self.__detector_structure_semaphore.release()
+
+		if detect_rejection_reason is not None:
+			raise DetectRejectedException(
+				image_uuid=image_uuid,
+				detect_rejection_reason=detect_rejection_reason
+			)
+
+		return detected_labels
+
+	def __is_detector_ready(self, *, detector_index: int, detector_structure: DetectorStructure) -> bool:
+
+		readiness_uuid = str(uuid.uuid4())
+
+		blocking_semaphore = Semaphore()
+		blocking_semaphore.acquire()
+
+		self.__detector_structure_semaphore.acquire()
+		try:
+			self.__blocking_semaphore_per_readiness_uuid[readiness_uuid] = blocking_semaphore
+		finally:
+			self.__detector_structure_semaphore.release()
+
+		try:
+			detector_structure.send_readiness_request(
+				readiness_uuid=readiness_uuid
+			)
+		except ReadWriteSocketClosedException as ex:
+			blocking_semaphore.release()
+			for orphaned_image_uuid in self.__drop_detector(detector_index=detector_index, detector_structure=detector_structure):
+				self.__route_detection_request(
+					image_uuid=orphaned_image_uuid
+				)
+
 		blocking_semaphore.acquire()
 		blocking_semaphore.release()
 
 		self.__detector_structure_semaphore.acquire()
 		try:
-			detected_labels = self.__detected_labels_per_image_uuid[image_uuid]
-			del self.__detected_labels_per_image_uuid[image_uuid]
-			del self.__blocking_semaphore_per_image_uuid[image_uuid]
+			is_ready = self.__is_ready_per_readiness_uuid.pop(readiness_uuid, False)
+			del self.__blocking_semaphore_per_readiness_uuid[readiness_uuid]
 		finally:
 			self.__detector_structure_semaphore.release()
 
-		return detected_labels
+		return is_ready
+
+	def is_detector_ready(self) -> bool:
+
+		# ready once any connected detector can serve detections
+		self.__detector_structure_semaphore.acquire()
+		try:
+			detector_structure_per_detector_index = dict(self.__detector_structure_per_detector_index)
+		finally:
+			self.__detector_structure_semaphore.release()
+
+		for detector_index, detector_structure in detector_structure_per_detector_index.items():
+			if self.__is_detector_ready(detector_index=detector_index, detector_structure=detector_structure):
+				return True
+		return False
+
+	def __get_in_flight_detection_semaphore(self) -> asyncio.Semaphore:
+		# an asyncio semaphore belongs to the event loop that first waits on it, so each running loop gets its own
+		event_loop = asyncio.get_running_loop()
+		self.__detector_structure_semaphore.acquire()
+		try:
+			in_flight_detection_semaphore = self.__in_flight_detection_semaphore_per_event_loop.get(event_loop, None)
+			if in_flight_detection_semaphore is None:
+				in_flight_detection_semaphore = asyncio.Semaphore(self.__maximum_in_flight_detection_total)
+				self.__in_flight_detection_semaphore_per_event_loop[event_loop] = in_flight_detection_semaphore
+			return in_flight_detection_semaphore
+		finally:
+			self.__detector_structure_semaphore.release()
+
+	async def get_detected_labels_async(self, *, image_bytes: bytes, image_extension: str, timeout_seconds: float = None, tile_size: int = None, tile_overlap_ratio: float = None, detected_label_encoding: DetectedLabelEncodingEnum = DetectedLabelEncodingEnum.Json) -> DetectedLabels:
+
+		# callers beyond the in-flight limit wait here instead of piling more requests onto the detector
+		async with self.__get_in_flight_detection_semaphore():
+
+			image_uuid = str(uuid.uuid4())
+
+			event_loop = asyncio.get_running_loop()
+			future = event_loop.create_future()
+
+			self.__detector_structure_semaphore.acquire()
+			try:
+				self.__future_and_event_loop_per_image_uuid[image_uuid] = (future, event_loop)
+			finally:
+				self.__detector_structure_semaphore.release()
+
+			try:
+				# the socket write blocks, so it happens off the event loop
+				await event_loop.run_in_executor(None, partial(
+					self.__send_detection_request,
+					image_bytes=image_bytes,
+					image_extension=image_extension,
+					image_uuid=image_uuid,
+					timeout_seconds=timeout_seconds,
+					tile_size=tile_size,
+					tile_overlap_ratio=tile_overlap_ratio,
+					detected_label_encoding=detected_label_encoding
+				))
+
+				try:
+					# the same deadline as the blocking call in case the detector never answers
+					return await asyncio.wait_for(future, timeout_seconds)
+				except asyncio.TimeoutError:
+					raise DetectRejectedException(
+						image_uuid=image_uuid,
+						detect_rejection_reason=DetectRejectionReasonEnum.DeadlineExpired
+					)
+			finally:
+				self.__detector_structure_semaphore.acquire()
+				try:
+					self.__future_and_event_loop_per_image_uuid.pop(image_uuid, None)
+					self.__complete_detection_request(
+						image_uuid=image_uuid,
+						is_latency_observed=False
+					)
+				finally:
+					self.__detector_structure_semaphore.release()
+
+	def __read_image_files_thread_method(self, *, image_file_paths: Iterable[str], image_queue: queue.Queue, is_active_per_bulk: List[bool]):
+
+		def put(item: Tuple[str, bytes or None, Exception or None] or None) -> bool:
+			# give up once the caller stops consuming results so that this thread does not wait on a full queue forever
+			while is_active_per_bulk[0]:
+				try:
+					image_queue.put(item, timeout=1.0)
+					return True
+				except queue.Full:
+					pass
+			return False
+
+		try:
+			for image_file_path in image_file_paths:
+				try:
+					with open(image_file_path, "rb") as file_handle:
+						image_bytes = file_handle.read()
+				except Exception as ex:
+					is_put = put((image_file_path, None, ex))
+				else:
+					is_put = put((image_file_path, image_bytes, None))
+				if not is_put:
+					break
+		except Exception as ex:
+			print(f"{datetime.utcnow()}: ClientStructure: {inspect.stack()[0][3]}: ex: {ex}")
+		finally:
+			put(None)
+
+	def get_detected_labels_bulk(self, *, image_file_paths: Iterable[str], pipeline_depth: int, timeout_seconds: float = None, tile_size: int = None, tile_overlap_ratio: float = None, detected_label_encoding: DetectedLabelEncodingEnum = DetectedLabelEncodingEnum.Packed) -> Iterator[BulkDetectionResult]:
+
+		# results are yielded in the order they complete, each keyed by its image file path
+
+		image_queue = queue.Queue(maxsize=pipeline_depth)
+		bulk_result_queue = queue.Queue()
+		is_active_per_bulk = [True]
+		image_uuids = []  # type: List[str]
+		# every request shares the same timeout, so the oldest one sent is always the next to expire
+		timeout_time_and_image_uuids = deque()  # type: Deque[Tuple[float, str]]
+
+		# files are read ahead on a background thread so that disk reads overlap with inference
+		start_thread(partial(self.__read_image_files_thread_method, image_file_paths=image_file_paths, image_queue=image_queue, is_active_per_bulk=is_active_per_bulk))
+
+		try:
+			in_flight_total = 0
+			is_reading_complete = False
+			while not is_reading_complete or in_flight_total != 0:
+
+				# keep the pipeline full before waiting on the next result
+				while not is_reading_complete and in_flight_total < pipeline_depth:
+					image_queue_item = image_queue.get()
+					if image_queue_item is None:
+						is_reading_complete = True
+					else:
+						image_file_path, image_bytes, exception = image_queue_item
+						if exception is not None:
+							yield BulkDetectionResult(
+								image_file_path=image_file_path,
+								detected_labels=None,
+								exception=exception
+							)
+						else:
+							image_uuid = str(uuid.uuid4())
+							image_uuids.append(image_uuid)
+
+							self.__detector_structure_semaphore.acquire()
+							try:
+								self.__bulk_result_queue_and_image_file_path_per_image_uuid[image_uuid] = (bulk_result_queue, image_file_path)
+							finally:
+								self.__detector_structure_semaphore.release()
+
+							if timeout_seconds is not None:
+								timeout_time_and_image_uuids.append((time.monotonic() + timeout_seconds, image_uuid))
+
+							self.__send_detection_request(
+								image_bytes=image_bytes,
+								image_extension=os.path.splitext(image_file_path)[1],
+								image_uuid=image_uuid,
+								timeout_seconds=timeout_seconds,
+								tile_size=tile_size,
+								tile_overlap_ratio=tile_overlap_ratio,
+								detected_label_encoding=detected_label_encoding
+							)
+							in_flight_total += 1
+
+				if in_flight_total != 0:
+					# requests that were already answered no longer have a deadline to keep
+					self.__detector_structure_semaphore.acquire()
+					try:
+						while timeout_time_and_image_uuids and timeout_time_and_image_uuids[0][1] not in self.__bulk_result_queue_and_image_file_path_per_image_uuid:
+							timeout_time_and_image_uuids.popleft()
+					finally:
+						self.__detector_structure_semaphore.release()
+					if not timeout_time_and_image_uuids:
+						yield bulk_result_queue.get()
+						in_flight_total -= 1
+					else:
+						try:
+							yield bulk_result_queue.get(timeout=max(0.0, timeout_time_and_image_uuids[0][0] - time.monotonic()))
+							in_flight_total -= 1
+						except queue.Empty:
+							# a detector that dropped the request or never answers must not stall the rest of the pipeline
+							_, image_uuid = timeout_time_and_image_uuids.popleft()
+							self.__detector_structure_semaphore.acquire()
+							try:
+								bulk_result_queue_and_image_file_path = self.__bulk_result_queue_and_image_file_path_per_image_uuid.pop(image_uuid, None)
+								if bulk_result_queue_and_image_file_path is not None:
+									self.__complete_detection_request(
+										image_uuid=image_uuid,
+										is_latency_observed=False
+									)
+							finally:
+								self.__detector_structure_semaphore.release()
+							if bulk_result_queue_and_image_file_path is not None:
+								yield BulkDetectionResult(
+									image_file_path=bulk_result_queue_and_image_file_path[1],
+									detected_labels=None,
+									exception=DetectRejectedException(
+										image_uuid=image_uuid,
+										detect_rejection_reason=DetectRejectionReasonEnum.DeadlineExpired
+									)
+								)
+								in_flight_total -= 1
+		finally:
+			is_active_per_bulk[0] = False
+
+			# forget requests that are still outstanding when the caller stops early, whose late responses are then ignored as unknown
+			self.__detector_structure_semaphore.acquire()
+			try:
+				for image_uuid in image_uuids:
+					if self.__bulk_result_queue_and_image_file_path_per_image_uuid.pop(image_uuid, None) is not None:
+						self.__complete_detection_request(
+							image_uuid=image_uuid,
+							is_latency_observed=False
+						)
+			finally:
+				self.__detector_structure_semaphore.release()
+
+	def dispose(self):
+		super().dispose()
+		self.__is_reconnect_thread_active = False
@@ -0,0 +1,80 @@
+from __future__ import annotations
+import sys
+import os
+import glob
+import json
+import time
+from typing import Iterator
+from austin_heller_repo.common import HostPointer
+
+try:
+	from .client import ClientStructure, ClientMessengerFactory, ClientSocketFactory
+	from .detector import DetectorClientServerMessage
+except ImportError:
+	from client import ClientStructure, ClientMessengerFactory, ClientSocketFactory
+	from detector import DetectorClientServerMessage
+
+
+image_file_extensions = {".bmp", ".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp"}
+
+
+def get_image_file_paths(*, image_source: str) -> Iterator[str]:
+	if image_source == "-":
+		# one image file path per line of standard input
+		for line in sys.stdin:
+			image_file_path = line.strip()
+			if image_file_path != "":
+				yield image_file_path
+	elif os.path.isdir(image_source):
+		for directory_path, directory_names, file_names in os.walk(image_source):
+			directory_names.sort()
+			for file_name in sorted(file_names):
+				if os.path.splitext(file_name)[1].lower() in image_file_extensions:
+					yield os.path.join(directory_path, file_name)
+	else:
+		for image_file_path in glob.iglob(image_source, recursive=True):
+			if os.path.isfile(image_file_path):
+				yield image_file_path
+
+
+if len(sys.argv) != 7:
+	print(f"Missing at least one commandline argument.")
+else:
+
+	detector_host_address = sys.argv[1]
+	detector_host_port = int(sys.argv[2])
+	image_source = sys.argv[3]  # a directory, a glob pattern, or "-" to read paths from standard input
+	pipeline_depth = int(sys.argv[4])
+	output_file_path = sys.argv[5]  # "-" writes to standard output
+	timeout_seconds = float(sys.argv[6])  # an image without a response by then is written with an error
+
+	client_structure = ClientStructure(
+		detector_client_messenger_factory=ClientMessengerFactory(
+			client_socket_factory=ClientSocketFactory(),
+			server_host_pointer=HostPointer(
+				host_address=detector_host_address,
+				host_port=detector_host_port
+			),
+			client_server_message_class=DetectorClientServerMessage,
+			is_debug=False
+		)
+	)
+
+	time.sleep(1.0)
+
+	output_file_handle = sys.stdout if output_file_path == "-" else open(output_file_path, "w")
+	try:
+		for bulk_detection_result in client_structure.get_detected_labels_bulk(
+			image_file_paths=get_image_file_paths(
+				image_source=image_source
+			),
+			pipeline_depth=pipeline_depth,
+			timeout_seconds=timeout_seconds
+		):
+			output_file_handle.write(json.dumps(bulk_detection_result.to_json()) + "\n")
+			output_file_handle.flush()
+	finally:
+		if output_file_handle is not sys.stdout:
+			output_file_handle.close()
+
+		client_structure.dispose()
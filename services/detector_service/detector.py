@@ -3,10 +3,10 @@ import sys
 
 sys.path.append("..")
 
-from typing import List, Tuple, Dict, Type
+from typing import List, Tuple, Dict, Type, Deque, Callable, Iterator, Set
 from abc import ABC, abstractmethod
 import json
-from collections import deque
+from collections import deque, OrderedDict
 import uuid
 import os
 import shutil
@@ -14,14 +14,29 @@ from datetime import datetime
 import inspect
 import time
 import base64
-from austin_heller_repo.socket_queued_message_framework import SourceTypeEnum, ClientServerMessage, ClientServerMessageTypeEnum, StructureStateEnum, StructureTransitionException, Structure, StructureFactory, StructureInfluence, ClientMessengerFactory, ClientMessenger
+import subprocess
+import threading
+import hashlib
+import struct
+import numpy as np
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from austin_heller_repo.socket_queued_message_framework import SourceTypeEnum, ClientServerMessage, ClientServerMessageTypeEnum, StructureStateEnum, StructureTransitionException, Structure, StructureFactory, StructureInfluence, ClientMessengerFactory, ClientMessenger, ReadWriteSocketClosedException
 from austin_heller_repo.threading import Semaphore, start_thread
 from austin_heller_repo.common import StringEnum, SubprocessWrapper, is_directory_empty
 
 try:
-	from trainer_service.trainer import UpdateModelBroadcastTrainerClientServerMessage, TrainerClientServerMessageTypeEnum, TrainerClientServerMessage
+	from trainer_service.trainer import UpdateModelBroadcastTrainerClientServerMessage, TrainerClientServerMessageTypeEnum, TrainerClientServerMessage, AttachmentEndpointAnnouncementTrainerClientServerMessage, UpdateModelAcknowledgementTrainerClientServerMessage
+	from trainer_service.attachment import AttachmentServer, AttachmentClient
 except ImportError:
-	from trainer import UpdateModelBroadcastTrainerClientServerMessage, TrainerClientServerMessageTypeEnum, TrainerClientServerMessage
+	from trainer import UpdateModelBroadcastTrainerClientServerMessage, TrainerClientServerMessageTypeEnum, TrainerClientServerMessage, AttachmentEndpointAnnouncementTrainerClientServerMessage, UpdateModelAcknowledgementTrainerClientServerMessage
+	from attachment import AttachmentServer, AttachmentClient
+
+try:
+	from .inference_worker import InferenceWorkerPipe, InferenceWorkerCommandEnum, InferenceWorkerStatusEnum, InferenceWorkerClosedException
+except ImportError:
+	from inference_worker import InferenceWorkerPipe, InferenceWorkerCommandEnum, InferenceWorkerStatusEnum, InferenceWorkerClosedException
 
 
 class DetectedLabel():
@@ -35,6 +50,24 @@ class DetectedLabel():
 		self.__height = height
 		self.__confidence = confidence
 
+	def get_label_index(self) -> int:
+		return self.__label_index
+
+	def get_x(self) -> int:
+		return self.__x
+
+	def get_y(self) -> int:
+		return self.__y
+
+	def get_width(self) -> int:
+		return self.__width
+
+	def get_height(self) -> int:
+		return self.__height
+
+	def get_confidence(self) -> float:
+		return self.__confidence
+
 	def to_json(self) -> Dict:
 		return {
 			"label_index": self.__label_index,
@@ -49,6 +82,18 @@ class DetectedLabel():
 	def parse_json(json_dict: Dict) -> DetectedLabel:
 		return DetectedLabel(**json_dict)
 
+	@staticmethod
+	def parse_detection(detection: List[float]) -> DetectedLabel:
+		x_min, y_min, x_max, y_max, confidence, label_index = detection
+		return DetectedLabel(
+			label_index=int(label_index),
+			x=int(x_min),
+			y=int(y_min),
+			width=int(x_max - x_min),
+			height=int(y_max - y_min),
+			confidence=float(confidence)
+		)
+
 	@staticmethod
 	def to_list_of_json(detected_labels: List[DetectedLabel]) -> List[Dict]:
 		detected_label_json_dicts = []  # type: List[Dict]
@@ -58,6 +103,160 @@ class DetectedLabel():
 		return detected_label_json_dicts
 
 
+class DetectedLabelEncodingEnum(StringEnum):
+	Json = "json"
+	Packed = "packed"
+
+
+class DetectedLabels():
+
+	# each row matches the little-endian (label index, x, y, width, height, confidence) record of the packed encoding
+	dtype = np.dtype([
+		("label_index", "<i4"),
+		("x", "<i4"),
+		("y", "<i4"),
+		("width", "<i4"),
+		("height", "<i4"),
+		("confidence", "<f4")
+	])
+
+	def __init__(self, *, array: np.ndarray):
+
+		self.__array = array
+
+		if self.__array.dtype != DetectedLabels.dtype:
+			raise Exception(f"Unexpected detected labels dtype: {self.__array.dtype}")
+
+	def get_array(self) -> np.ndarray:
+		return self.__array
+
+	def get_label_indexes(self) -> np.ndarray:
+		return self.__array["label_index"]
+
+	def get_confidences(self) -> np.ndarray:
+		return self.__array["confidence"]
+
+	def get_boxes(self) -> np.ndarray:
+		# (x, y, width, height) per row
+		return np.stack([self.__array["x"], self.__array["y"], self.__array["width"], self.__array["height"]], axis=1)
+
+	def __len__(self) -> int:
+		return len(self.__array)
+
+	def __getitem__(self, index: int or slice or np.ndarray) -> DetectedLabel or DetectedLabels:
+		if isinstance(index, (int, np.integer)):
+			row = self.__array[index]
+			return DetectedLabel(
+				label_index=int(row["label_index"]),
+				x=int(row["x"]),
+				y=int(row["y"]),
+				width=int(row["width"]),
+				height=int(row["height"]),
+				confidence=float(row["confidence"])
+			)
+		return DetectedLabels(
+			array=self.__array[index]
+		)
+
+	def __iter__(self) -> Iterator[DetectedLabel]:
+		for index in range(len(self.__array)):
+			yield self[index]
+
+	def filter_by_confidence(self, *, minimum_confidence: float) -> DetectedLabels:
+		return self[self.__array["confidence"] >= minimum_confidence]
+
+	def filter_by_label_indexes(self, *, label_indexes: List[int]) -> DetectedLabels:
+		return self[np.isin(self.__array["label_index"], label_indexes)]
+
+	def deduplicate(self, *, iou_threshold: float, is_class_aware: bool = True) -> DetectedLabels:
+
+		x_mins = self.__array["x"].astype(np.float64)
+		y_mins = self.__array["y"].astype(np.float64)
+		x_maxes = x_mins + self.__array["width"]
+		y_maxes = y_mins + self.__array["height"]
+		areas = self.__array["width"].astype(np.float64) * self.__array["height"]
+
+		# greedy suppression where each kept box removes every lower confidence box that overlaps it too much
+		kept_indexes = []  # type: List[int]
+		remaining_indexes = np.argsort(-self.__array["confidence"], kind="stable")
+		while remaining_indexes.size != 0:
+			index = remaining_indexes[0]
+			kept_indexes.append(index)
+			other_indexes = remaining_indexes[1:]
+			intersection_widths = np.clip(np.minimum(x_maxes[index], x_maxes[other_indexes]) - np.maximum(x_mins[index], x_mins[other_indexes]), 0.0, None)
+			intersection_heights = np.clip(np.minimum(y_maxes[index], y_maxes[other_indexes]) - np.maximum(y_mins[index], y_mins[other_indexes]), 0.0, None)
+			intersection_areas = intersection_widths * intersection_heights
+			union_areas = areas[index] + areas[other_indexes] - intersection_areas
+			ious = np.divide(intersection_areas, union_areas, out=np.zeros_like(intersection_areas), where=union_areas > 0)
+			is_suppressed = ious > iou_threshold
+			if is_class_aware:
+				is_suppressed &= self.__array["label_index"][other_indexes] == self.__array["label_index"][index]
+			remaining_indexes = other_indexes[~is_suppressed]
+
+		# keep the original order of the rows that survive
+		return self[np.sort(np.array(kept_indexes, dtype=np.int64))]
+
+	def scale(self, *, x_scale: float, y_scale: float) -> DetectedLabels:
+		# maps boxes found on a resized image back to the coordinates of the original image
+		array = self.__array.copy()
+		array["x"] = np.round(self.__array["x"] * x_scale)
+		array["y"] = np.round(self.__array["y"] * y_scale)
+		array["width"] = np.round(self.__array["width"] * x_scale)
+		array["height"] = np.round(self.__array["height"] * y_scale)
+		return DetectedLabels(
+			array=array
+		)
+
+	def to_list_of_json(self) -> List[Dict]:
+		return [{
+			"label_index": label_index,
+			"x": x,
+			"y": y,
+			"width": width,
+			"height": height,
+			"confidence": confidence
+		} for label_index, x, y, width, height, confidence in self.__array.tolist()]
+
+	def to_packed_bytes(self) -> bytes:
+		return self.__array.tobytes()
+
+	@staticmethod
+	def parse_detections(detections: List[List[float]]) -> DetectedLabels:
+		array = np.zeros(len(detections), dtype=DetectedLabels.dtype)
+		if detections:
+			detections_array = np.asarray(detections, dtype=np.float64)
+			array["label_index"] = detections_array[:, 5]
+			array["x"] = detections_array[:, 0]
+			array["y"] = detections_array[:, 1]
+			array["width"] = detections_array[:, 2] - detections_array[:, 0]
+			array["height"] = detections_array[:, 3] - detections_array[:, 1]
+			array["confidence"] = detections_array[:, 4]
+		return DetectedLabels(
+			array=array
+		)
+
+	@staticmethod
+	def parse_list_of_json(json_dicts: List[Dict]) -> DetectedLabels:
+		return DetectedLabels(
+			array=np.array([(json_dict["label_index"], json_dict["x"], json_dict["y"], json_dict["width"], json_dict["height"], json_dict["confidence"]) for json_dict in json_dicts], dtype=DetectedLabels.dtype)
+		)
+
+	@staticmethod
+	def parse_packed_bytes(packed_bytes: bytes) -> DetectedLabels:
+		# a read-only view over the received bytes so that nothing is unpacked until it is read
+		if len(packed_bytes) % DetectedLabels.dtype.itemsize != 0:
+			raise Exception(f"Packed detected labels of {len(packed_bytes)} bytes are not a multiple of {DetectedLabels.dtype.itemsize} bytes.")
+		return DetectedLabels(
+			array=np.frombuffer(packed_bytes, dtype=DetectedLabels.dtype)
+		)
+
+
+class InferenceBackendEnum(StringEnum):
+	Torch = "torch"
+	Onnx = "onnx"
+	OnnxInt8 = "onnx_int8"
+
+
 class DetectorSourceTypeEnum(SourceTypeEnum):
 	Detector = "detector"
 	Trainer = "trainer"
@@ -72,6 +271,10 @@ class ClientStructureStateEnum(StructureStateEnum):
 	Active = "active"
 
 
+class TrainerStructureStateEnum(StructureStateEnum):
+	Active = "active"
+
+
 class DetectorClientServerMessageTypeEnum(ClientServerMessageTypeEnum):
 	# detector
 	DetectorError = "detector_error"
@@ -80,6 +283,17 @@ class DetectorClientServerMessageTypeEnum(ClientServerMessageTypeEnum):
 	# client
 	DetectRequest = "detect_request"
 	DetectResponse = "detect_response"
+	DetectRejection = "detect_rejection"
+	ReadinessRequest = "readiness_request"
+	ReadinessResponse = "readiness_response"
+	AttachmentEndpointAnnouncement = "attachment_endpoint_announcement"
+
+
+class DetectRejectionReasonEnum(StringEnum):
+	ModelUnavailable = "model_unavailable"
+	QueueFull = "queue_full"
+	DeadlineExpired = "deadline_expired"
+	DetectionFailed = "detection_failed"
 
 
 class DetectorClientServerMessage(ClientServerMessage, ABC):
@@ -138,7 +352,7 @@ class DetectorErrorDetectorClientServerMessage(DetectorClientServerMessage):
 
 class DetectRequestDetectorClientServerMessage(DetectorClientServerMessage):
 
-	def __init__(self, *, image_bytes_base64string: str, image_extension: str, image_uuid: str, destination_uuid: str):
+	def __init__(self, *, image_bytes_base64string: str or None, image_extension: str, image_uuid: str, destination_uuid: str, timeout_seconds: float = None, tile_size: int = None, tile_overlap_ratio: float = None, detected_label_encoding_string: str = None, image_attachment_uuid: str = None):
 		super().__init__(
 			destination_uuid=destination_uuid
 		)
@@ -146,16 +360,38 @@ class DetectRequestDetectorClientServerMessage(DetectorClientServerMessage):
 		self.__image_bytes_base64string = image_bytes_base64string
 		self.__image_extension = image_extension
 		self.__image_uuid = image_uuid
+		self.__timeout_seconds = timeout_seconds
+		self.__tile_size = tile_size
+		self.__tile_overlap_ratio = tile_overlap_ratio
+		self.__detected_label_encoding_string = detected_label_encoding_string
+		self.__image_attachment_uuid = image_attachment_uuid
 
 	def get_image_bytes(self) -> bytes:
 		return base64.b64decode(self.__image_bytes_base64string.encode())
 
+	def get_image_attachment_uuid(self) -> str or None:
+		return self.__image_attachment_uuid
+
 	def get_image_extension(self) -> str:
 		return self.__image_extension
 
 	def get_image_uuid(self) -> str:
 		return self.__image_uuid
 
+	def get_timeout_seconds(self) -> float or None:
+		return self.__timeout_seconds
+
+	def get_tile_size(self) -> int or None:
+		return self.__tile_size
+
+	def get_tile_overlap_ratio(self) -> float or None:
+		return self.__tile_overlap_ratio
+
+	def get_detected_label_encoding(self) -> DetectedLabelEncodingEnum:
+		if self.__detected_label_encoding_string is None:
+			return DetectedLabelEncodingEnum.Json
+		return DetectedLabelEncodingEnum(self.__detected_label_encoding_string)
+
 	@classmethod
 	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
 		return DetectorClientServerMessageTypeEnum.DetectRequest
@@ -165,6 +401,11 @@ class DetectRequestDetectorClientServerMessage(DetectorClientServerMessage):
 		json_object["image_bytes_base64string"] = self.__image_bytes_base64string
 		json_object["image_extension"] = self.__image_extension
 		json_object["image_uuid"] = self.__image_uuid
+		json_object["timeout_seconds"] = self.__timeout_seconds
+		json_object["tile_size"] = self.__tile_size
+		json_object["tile_overlap_ratio"] = self.__tile_overlap_ratio
+		json_object["detected_label_encoding_string"] = self.__detected_label_encoding_string
+		json_object["image_attachment_uuid"] = self.__image_attachment_uuid
 		return json_object
 
 	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
@@ -177,25 +418,37 @@ class DetectRequestDetectorClientServerMessage(DetectorClientServerMessage):
 
 class DetectResponseDetectorClientServerMessage(DetectorClientServerMessage):
 
-	def __init__(self, *, image_uuid: str, detected_label_json_dicts: List[Dict], destination_uuid: str):
+	def __init__(self, *, image_uuid: str, detected_label_json_dicts: List[Dict] or None, model_version: str, destination_uuid: str, detected_label_encoding_string: str = None, packed_detected_labels_base64string: str = None):
 		super().__init__(
 			destination_uuid=destination_uuid
 		)
 
 		self.__image_uuid = image_uuid
 		self.__detected_label_json_dicts = detected_label_json_dicts
+		self.__model_version = model_version
+		self.__detected_label_encoding_string = detected_label_encoding_string
+		self.__packed_detected_labels_base64string = packed_detected_labels_base64string
 
 	def get_image_uuid(self) -> str:
 		return self.__image_uuid
 
-	def get_detected_labels(self) -> List[DetectedLabel]:
-		detected_labels = []  # type: List[DetectedLabel]
-		for detected_label_json_dict in self.__detected_label_json_dicts:
-			detected_label = DetectedLabel.parse_json(
-				json_dict=detected_label_json_dict
-			)
-			detected_labels.append(detected_label)
-		return detected_labels
+	def get_model_version(self) -> str:
+		return self.__model_version
+
+	def get_detected_label_encoding(self) -> DetectedLabelEncodingEnum:
+		# responses from before the packed encoding existed carry no encoding
+		if self.__detected_label_encoding_string is None:
+			return DetectedLabelEncodingEnum.Json
+		return DetectedLabelEncodingEnum(self.__detected_label_encoding_string)
+
+	def get_detected_labels(self) -> DetectedLabels:
+		detected_label_encoding = self.get_detected_label_encoding()
+		if detected_label_encoding == DetectedLabelEncodingEnum.Json:
+			return DetectedLabels.parse_list_of_json(self.__detected_label_json_dicts)
+		elif detected_label_encoding == DetectedLabelEncodingEnum.Packed:
+			return DetectedLabels.parse_packed_bytes(base64.b64decode(self.__packed_detected_labels_base64string.encode()))
+		else:
+			raise NotImplementedError(f"Detected label encoding not implemented: {detected_label_encoding.value}")
 
 	@classmethod
 	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
@@ -205,6 +458,72 @@ class DetectResponseDetectorClientServerMessage(DetectorClientServerMessage):
 		json_object = super().to_json()
 		json_object["image_uuid"] = self.__image_uuid
 		json_object["detected_label_json_dicts"] = self.__detected_label_json_dicts
+		json_object["model_version"] = self.__model_version
+		json_object["detected_label_encoding_string"] = self.__detected_label_encoding_string
+		json_object["packed_detected_labels_base64string"] = self.__packed_detected_labels_base64string
+		return json_object
+
+	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
+		return DetectorErrorDetectorClientServerMessage(
+			structure_state_name=structure_transition_exception.get_structure_state().value,
+			client_server_message_json_string=json.dumps(structure_transition_exception.get_structure_influence().get_client_server_message().to_json()),
+			destination_uuid=destination_uuid
+		)
+
+
+class DetectRejectionDetectorClientServerMessage(DetectorClientServerMessage):
+
+	def __init__(self, *, image_uuid: str, detect_rejection_reason_string: str, destination_uuid: str):
+		super().__init__(
+			destination_uuid=destination_uuid
+		)
+
+		self.__image_uuid = image_uuid
+		self.__detect_rejection_reason_string = detect_rejection_reason_string
+
+	def get_image_uuid(self) -> str:
+		return self.__image_uuid
+
+	def get_detect_rejection_reason(self) -> DetectRejectionReasonEnum:
+		return DetectRejectionReasonEnum(self.__detect_rejection_reason_string)
+
+	@classmethod
+	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
+		return DetectorClientServerMessageTypeEnum.DetectRejection
+
+	def to_json(self) -> Dict:
+		json_object = super().to_json()
+		json_object["image_uuid"] = self.__image_uuid
+		json_object["detect_rejection_reason_string"] = self.__detect_rejection_reason_string
+		return json_object
+
+	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
+		return DetectorErrorDetectorClientServerMessage(
+			structure_state_name=structure_transition_exception.get_structure_state().value,
+			client_server_message_json_string=json.dumps(structure_transition_exception.get_structure_influence().get_client_server_message().to_json()),
+			destination_uuid=destination_uuid
+		)
+
+
+class ReadinessRequestDetectorClientServerMessage(DetectorClientServerMessage):
+
+	def __init__(self, *, readiness_uuid: str, destination_uuid: str):
+		super().__init__(
+			destination_uuid=destination_uuid
+		)
+
+		self.__readiness_uuid = readiness_uuid
+
+	def get_readiness_uuid(self) -> str:
+		return self.__readiness_uuid
+
+	@classmethod
+	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
+		return DetectorClientServerMessageTypeEnum.ReadinessRequest
+
+	def to_json(self) -> Dict:
+		json_object = super().to_json()
+		json_object["readiness_uuid"] = self.__readiness_uuid
 		return json_object
 
 	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
@@ -215,6 +534,436 @@ class DetectResponseDetectorClientServerMessage(DetectorClientServerMessage):
 		)
 
 
+class ReadinessResponseDetectorClientServerMessage(DetectorClientServerMessage):
+
+	def __init__(self, *, readiness_uuid: str, is_ready: bool, model_version: str or None, destination_uuid: str):
+		super().__init__(
+			destination_uuid=destination_uuid
+		)
+
+		self.__readiness_uuid = readiness_uuid
+		self.__is_ready = is_ready
+		self.__model_version = model_version
+
+	def get_readiness_uuid(self) -> str:
+		return self.__readiness_uuid
+
+	def is_ready(self) -> bool:
+		return self.__is_ready
+
+	def get_model_version(self) -> str or None:
+		return self.__model_version
+
+	@classmethod
+	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
+		return DetectorClientServerMessageTypeEnum.ReadinessResponse
+
+	def to_json(self) -> Dict:
+		json_object = super().to_json()
+		json_object["readiness_uuid"] = self.__readiness_uuid
+		json_object["is_ready"] = self.__is_ready
+		json_object["model_version"] = self.__model_version
+		return json_object
+
+	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
+		return DetectorErrorDetectorClientServerMessage(
+			structure_state_name=structure_transition_exception.get_structure_state().value,
+			client_server_message_json_string=json.dumps(structure_transition_exception.get_structure_influence().get_client_server_message().to_json()),
+			destination_uuid=destination_uuid
+		)
+
+
+class AttachmentEndpointAnnouncementDetectorClientServerMessage(DetectorClientServerMessage):
+
+	def __init__(self, *, host_address: str, host_port: int, destination_uuid: str):
+		super().__init__(
+			destination_uuid=destination_uuid
+		)
+
+		self.__host_address = host_address
+		self.__host_port = host_port
+
+	def get_host_address(self) -> str:
+		return self.__host_address
+
+	def get_host_port(self) -> int:
+		return self.__host_port
+
+	@classmethod
+	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
+		return DetectorClientServerMessageTypeEnum.AttachmentEndpointAnnouncement
+
+	def to_json(self) -> Dict:
+		json_object = super().to_json()
+		json_object["host_address"] = self.__host_address
+		json_object["host_port"] = self.__host_port
+		return json_object
+
+	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
+		return DetectorErrorDetectorClientServerMessage(
+			structure_state_name=structure_transition_exception.get_structure_state().value,
+			client_server_message_json_string=json.dumps(structure_transition_exception.get_structure_influence().get_client_server_message().to_json()),
+			destination_uuid=destination_uuid
+		)
+
+
+###############################################################################
+# Inference
+###############################################################################
+
+class InferenceWorkerDisposedException(Exception):
+
+	def __init__(self, *args):
+		super().__init__(*args)
+
+
+class InferenceWorker():
+
+	def __init__(self, *, yolov5_directory_path: str, model_file_path: str, model_version: str, image_size: int, thread_total: int, cpu_indexes: List[int], warm_up_total: int, is_debug: bool = False):
+
+		self.__yolov5_directory_path = yolov5_directory_path
+		self.__model_file_path = model_file_path
+		self.__model_version = model_version
+		self.__image_size = image_size
+		self.__thread_total = thread_total
+		self.__cpu_indexes = cpu_indexes
+		self.__warm_up_total = warm_up_total
+		self.__is_debug = is_debug
+
+		self.__inference_worker_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inference_worker.py")
+		self.__process = None  # type: subprocess.Popen
+		self.__inference_worker_pipe = None  # type: InferenceWorkerPipe
+		self.__process_semaphore = Semaphore()
+		self.__is_disposed = False
+
+	def get_model_file_path(self) -> str:
+		return self.__model_file_path
+
+	def get_model_version(self) -> str:
+		return self.__model_version
+
+	def __start_process(self):
+		if self.__is_debug:
+			print(f"{datetime.utcnow()}: InferenceWorker: {inspect.stack()[0][3]}: starting inference worker for {self.__model_file_path}")
+		process_environment = dict(os.environ)
+		process_environment["OMP_NUM_THREADS"] = str(self.__thread_total)
+		process_environment["MKL_NUM_THREADS"] = str(self.__thread_total)
+		self.__process = subprocess.Popen(
+			[sys.executable, self.__inference_worker_file_path, self.__yolov5_directory_path, self.__model_file_path, str(self.__image_size), str(self.__thread_total), ",".join([str(cpu_index) for cpu_index in self.__cpu_indexes]), str(self.__warm_up_total)],
+			stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE,
+			env=process_environment
+		)
+		self.__inference_worker_pipe = InferenceWorkerPipe(
+			input_file_handle=self.__process.stdout,
+			output_file_handle=self.__process.stdin
+		)
+		response_json, _ = self.__inference_worker_pipe.read_message()
+		if InferenceWorkerStatusEnum(response_json["status"]) != InferenceWorkerStatusEnum.Ready:
+			raise Exception(f"Unexpected inference worker status: {response_json['status']}")
+		if self.__is_debug:
+			print(f"{datetime.utcnow()}: InferenceWorker: {inspect.stack()[0][3]}: inference worker ready")
+
+	def __stop_process(self):
+		if self.__process is not None:
+			try:
+				self.__inference_worker_pipe.close()
+			except OSError:
+				pass
+			try:
+				self.__process.wait(timeout=5.0)
+			except subprocess.TimeoutExpired:
+				self.__process.kill()
+				self.__process.wait()
+			self.__process = None
+			self.__inference_worker_pipe = None
+
+	def __send_request(self, *, request_json: Dict, payload_bytes: bytes = b"") -> Dict:
+		if self.__process is None or self.__process.poll() is not None:
+			if self.__process is not None:
+				print(f"{datetime.utcnow()}: InferenceWorker: {inspect.stack()[0][3]}: inference worker exited with code {self.__process.returncode}, restarting")
+			self.__stop_process()
+			self.__start_process()
+		try:
+			self.__inference_worker_pipe.write_message(
+				message_json=request_json,
+				payload_bytes=payload_bytes
+			)
+			response_json, _ = self.__inference_worker_pipe.read_message()
+		except (InferenceWorkerClosedException, OSError) as ex:
+			# the worker crashed while processing the request, so retry once on a fresh worker
+			print(f"{datetime.utcnow()}: InferenceWorker: {inspect.stack()[0][3]}: inference worker failed, restarting: {ex}")
+			self.__stop_process()
+			self.__start_process()
+			self.__inference_worker_pipe.write_message(
+				message_json=request_json,
+				payload_bytes=payload_bytes
+			)
+			response_json, _ = self.__inference_worker_pipe.read_message()
+		if InferenceWorkerStatusEnum(response_json["status"]) != InferenceWorkerStatusEnum.Success:
+			raise Exception(f"Inference worker failed: {response_json['error_string']}")
+		return response_json
+
+	def start(self):
+		self.__process_semaphore.acquire()
+		try:
+			if self.__process is None:
+				self.__start_process()
+		finally:
+			self.__process_semaphore.release()
+
+	def detect(self, *, images_bytes: List[bytes], tile_sizes: List[int], tile_overlap_ratios: List[float]) -> Tuple[List[List[List[float]] or None], List[str or None]]:
+		self.__process_semaphore.acquire()
+		try:
+			if self.__is_disposed:
+				raise InferenceWorkerDisposedException(f"Inference worker for model version {self.__model_version} has been disposed.")
+			# the encoded images travel back to back in the payload and are decoded in the worker's memory
+			response_json = self.__send_request(
+				request_json={
+					"command": InferenceWorkerCommandEnum.Detect.value,
+					"image_lengths": [len(image_bytes) for image_bytes in images_bytes],
+					"tile_sizes": tile_sizes,
+					"tile_overlap_ratios": tile_overlap_ratios
+				},
+				payload_bytes=b"".join(images_bytes)
+			)
+		finally:
+			self.__process_semaphore.release()
+		return response_json["detections_per_image"], response_json["error_string_per_image"]
+
+	def dispose(self):
+		# waits for an in-flight detection to finish on this model before stopping the process
+		self.__process_semaphore.acquire()
+		try:
+			self.__is_disposed = True
+			self.__stop_process()
+		finally:
+			self.__process_semaphore.release()
+
+
+class InferenceWorkerPool():
+
+	def __init__(self, *, yolov5_directory_path: str, model_file_path: str, model_version: str, image_size: int, inference_worker_total: int, inference_worker_thread_total: int, warm_up_total: int, is_debug: bool = False):
+
+		self.__yolov5_directory_path = yolov5_directory_path
+		self.__model_file_path = model_file_path
+		self.__model_version = model_version
+		self.__image_size = image_size
+		self.__inference_worker_total = inference_worker_total
+		self.__inference_worker_thread_total = inference_worker_thread_total
+		self.__warm_up_total = warm_up_total
+		self.__is_debug = is_debug
+
+		self.__inference_workers = []  # type: List[InferenceWorker]
+		self.__in_flight_total_per_inference_worker_index = []  # type: List[int]
+		self.__in_flight_semaphore = Semaphore()
+		self.__is_ready = False
+
+		self.__initialize()
+
+	def __initialize(self):
+
+		# only pin replicas to cores when every replica can have cores to itself
+		is_pinned = self.__inference_worker_total * self.__inference_worker_thread_total <= os.cpu_count()
+
+		for inference_worker_index in range(self.__inference_worker_total):
+			if is_pinned:
+				cpu_indexes = list(range(inference_worker_index * self.__inference_worker_thread_total, (inference_worker_index + 1) * self.__inference_worker_thread_total))
+			else:
+				cpu_indexes = []
+			self.__inference_workers.append(InferenceWorker(
+				yolov5_directory_path=self.__yolov5_directory_path,
+				model_file_path=self.__model_file_path,
+				model_version=self.__model_version,
+				image_size=self.__image_size,
+				thread_total=self.__inference_worker_thread_total,
+				cpu_indexes=cpu_indexes,
+				warm_up_total=self.__warm_up_total,
+				is_debug=self.__is_debug
+			))
+			self.__in_flight_total_per_inference_worker_index.append(0)
+
+	def get_model_file_path(self) -> str:
+		return self.__model_file_path
+
+	def get_model_version(self) -> str:
+		return self.__model_version
+
+	def start(self):
+		# the replicas load in parallel and the first failure is raised once they have all finished
+		with ThreadPoolExecutor(max_workers=len(self.__inference_workers)) as executor:
+			for _ in executor.map(lambda inference_worker: inference_worker.start(), self.__inference_workers):
+				pass
+		# every replica has loaded and warmed up the model
+		self.__is_ready = True
+
+	def is_ready(self) -> bool:
+		return self.__is_ready
+
+	def detect(self, *, images_bytes: List[bytes], tile_sizes: List[int], tile_overlap_ratios: List[float]) -> Tuple[List[List[List[float]] or None], List[str or None]]:
+
+		self.__in_flight_semaphore.acquire()
+		try:
+			inference_worker_index = min(range(len(self.__inference_workers)), key=lambda index: self.__in_flight_total_per_inference_worker_index[index])
+			self.__in_flight_total_per_inference_worker_index[inference_worker_index] += 1
+		finally:
+			self.__in_flight_semaphore.release()
+
+		try:
+			return self.__inference_workers[inference_worker_index].detect(
+				images_bytes=images_bytes,
+				tile_sizes=tile_sizes,
+				tile_overlap_ratios=tile_overlap_ratios
+			)
+		finally:
+			self.__in_flight_semaphore.acquire()
+			self.__in_flight_total_per_inference_worker_index[inference_worker_index] -= 1
+			self.__in_flight_semaphore.release()
+
+	def dispose(self):
+		for inference_worker in self.__inference_workers:
+			inference_worker.dispose()
+
+
+class DetectionCache():
+
+	def __init__(self, *, maximum_size_bytes: int):
+
+		self.__maximum_size_bytes = maximum_size_bytes
+
+		self.__packed_detected_labels_bytes_per_key = OrderedDict()  # type: OrderedDict[Tuple[str, str, int, int, float], bytes]
+		self.__size_bytes_per_key = {}  # type: Dict[Tuple[str, str, int, int, float], int]
+		self.__size_bytes = 0
+		self.__hits_total = 0
+		self.__misses_total = 0
+		self.__semaphore = Semaphore()
+
+	def get(self, *, image_hash: str, model_version: str, image_size: int, tile_size: int, tile_overlap_ratio: float) -> bytes or None:
+		key = (image_hash, model_version, image_size, tile_size, tile_overlap_ratio)
+		self.__semaphore.acquire()
+		try:
+			packed_detected_labels_bytes = self.__packed_detected_labels_bytes_per_key.get(key, None)
+			if packed_detected_labels_bytes is None:
+				self.__misses_total += 1
+			else:
+				self.__hits_total += 1
+				self.__packed_detected_labels_bytes_per_key.move_to_end(key)
+		finally:
+			self.__semaphore.release()
+		return packed_detected_labels_bytes
+
+	def put(self, *, image_hash: str, model_version: str, image_size: int, tile_size: int, tile_overlap_ratio: float, packed_detected_labels_bytes: bytes):
+		key = (image_hash, model_version, image_size, tile_size, tile_overlap_ratio)
+		# the labels are kept in their packed encoding, so an entry costs exactly its key and payload bytes
+		size_bytes = len(image_hash) + len(model_version) + len(packed_detected_labels_bytes)
+		if size_bytes <= self.__maximum_size_bytes:
+			self.__semaphore.acquire()
+			try:
+				if key in self.__packed_detected_labels_bytes_per_key:
+					self.__size_bytes -= self.__size_bytes_per_key[key]
+				self.__packed_detected_labels_bytes_per_key[key] = packed_detected_labels_bytes
+				self.__packed_detected_labels_bytes_per_key.move_to_end(key)
+				self.__size_bytes_per_key[key] = size_bytes
+				self.__size_bytes += size_bytes
+				while self.__size_bytes > self.__maximum_size_bytes:
+					evicted_key, _ = self.__packed_detected_labels_bytes_per_key.popitem(last=False)
+					self.__size_bytes -= self.__size_bytes_per_key.pop(evicted_key)
+			finally:
+				self.__semaphore.release()
+
+	def clear(self):
+		self.__semaphore.acquire()
+		try:
+			self.__packed_detected_labels_bytes_per_key.clear()
+			self.__size_bytes_per_key.clear()
+			self.__size_bytes = 0
+		finally:
+			self.__semaphore.release()
+
+	def get_size_bytes(self) -> int:
+		return self.__size_bytes
+
+	def get_hits_total(self) -> int:
+		return self.__hits_total
+
+	def get_misses_total(self) -> int:
+		return self.__misses_total
+
+
+class DetectionRequest():
+
+	def __init__(self, *, source_uuid: str, image_uuid: str, image_hash: str, image_bytes: bytes, timeout_seconds: float or None, tile_size: int, tile_overlap_ratio: float, detected_label_encoding: DetectedLabelEncodingEnum):
+
+		self.__source_uuid = source_uuid
+		self.__image_uuid = image_uuid
+		self.__image_hash = image_hash
+		self.__image_bytes = image_bytes
+		self.__tile_size = tile_size
+		self.__tile_overlap_ratio = tile_overlap_ratio
+		self.__detected_label_encoding = detected_label_encoding
+
+		self.__received_time = time.monotonic()
+		self.__deadline_time = None if timeout_seconds is None else self.__received_time + timeout_seconds
+
+	def get_source_uuid(self) -> str:
+		return self.__source_uuid
+
+	def get_image_uuid(self) -> str:
+		return self.__image_uuid
+
+	def get_image_hash(self) -> str:
+		return self.__image_hash
+
+	def get_image_bytes(self) -> bytes:
+		return self.__image_bytes
+
+	def get_tile_size(self) -> int:
+		return self.__tile_size
+
+	def get_tile_overlap_ratio(self) -> float:
+		return self.__tile_overlap_ratio
+
+	def get_detected_label_encoding(self) -> DetectedLabelEncodingEnum:
+		return self.__detected_label_encoding
+
+	def get_received_time(self) -> float:
+		return self.__received_time
+
+	def is_expired(self) -> bool:
+		return self.__deadline_time is not None and time.monotonic() >= self.__deadline_time
+
+
+class ReadinessHttpRequestHandler(BaseHTTPRequestHandler):
+
+	def do_GET(self):
+		if self.path != "/ready":
+			self.send_response(404)
+			self.end_headers()
+		else:
+			# load balancers only look at the status code
+			is_ready = self.server.is_ready()
+			response_bytes = b"ready" if is_ready else b"not ready"
+			self.send_response(200 if is_ready else 503)
+			self.send_header("Content-Type", "text/plain")
+			self.send_header("Content-Length", str(len(response_bytes)))
+			self.end_headers()
+			self.wfile.write(response_bytes)
+
+	def log_message(self, format: str, *args):
+		pass
+
+
+class ReadinessHttpServer(ThreadingHTTPServer):
+
+	def __init__(self, *, host_port: int, is_ready_method: Callable[[], bool]):
+		super().__init__(("0.0.0.0", host_port), ReadinessHttpRequestHandler)
+
+		self.__is_ready_method = is_ready_method
+
+	def is_ready(self) -> bool:
+		return self.__is_ready_method()
+
+
 ###############################################################################
 # Structures
 ###############################################################################
@@ -232,12 +981,78 @@ class ClientStructure(Structure):
 	def on_client_connected(self, *, source_uuid: str, source_type: SourceTypeEnum, tag_json: Dict or None):
 		raise Exception(f"Client connection not expected.")
 
-	def send_detection_response(self, *, detected_labels: List[DetectedLabel]):
+	def send_detection_response(self, *, image_uuid: str, detected_labels: DetectedLabels, model_version: str, detected_label_encoding: DetectedLabelEncodingEnum):
+		if detected_label_encoding == DetectedLabelEncodingEnum.Json:
+			detect_response = DetectResponseDetectorClientServerMessage(
+				image_uuid=image_uuid,
+				detected_label_json_dicts=detected_labels.to_list_of_json(),
+				model_version=model_version,
+				destination_uuid=self.__source_uuid,
+				detected_label_encoding_string=detected_label_encoding.value
+			)
+		elif detected_label_encoding == DetectedLabelEncodingEnum.Packed:
+			detect_response = DetectResponseDetectorClientServerMessage(
+				image_uuid=image_uuid,
+				detected_label_json_dicts=None,
+				model_version=model_version,
+				destination_uuid=self.__source_uuid,
+				detected_label_encoding_string=detected_label_encoding.value,
+				packed_detected_labels_base64string=base64.b64encode(detected_labels.to_packed_bytes()).decode()
+			)
+		else:
+			raise NotImplementedError(f"Detected label encoding not implemented: {detected_label_encoding.value}")
+		self.send_client_server_message(
+			client_server_message=detect_response
+		)
+
+	def send_readiness_response(self, *, readiness_uuid: str, is_ready: bool, model_version: str or None):
+		self.send_client_server_message(
+			client_server_message=ReadinessResponseDetectorClientServerMessage(
+				readiness_uuid=readiness_uuid,
+				is_ready=is_ready,
+				model_version=model_version,
+				destination_uuid=self.__source_uuid
+			)
+		)
+
+	def send_detection_rejection(self, *, image_uuid: str, detect_rejection_reason: DetectRejectionReasonEnum):
+		self.send_client_server_message(
+			client_server_message=DetectRejectionDetectorClientServerMessage(
+				image_uuid=image_uuid,
+				detect_rejection_reason_string=detect_rejection_reason.value,
+				destination_uuid=self.__source_uuid
+			)
+		)
+
+	def send_attachment_endpoint_announcement(self, *, host_address: str, host_port: int):
+		self.send_client_server_message(
+			client_server_message=AttachmentEndpointAnnouncementDetectorClientServerMessage(
+				host_address=host_address,
+				host_port=host_port,
+				destination_uuid=self.__source_uuid
+			)
+		)
+
+
+class TrainerStructure(Structure):
+
+	def __init__(self, *, source_uuid: str):
+		super().__init__(
+			states=TrainerStructureStateEnum,
+			initial_state=TrainerStructureStateEnum.Active
+		)
+
+		self.__source_uuid = source_uuid
+
+	def on_client_connected(self, *, source_uuid: str, source_type: SourceTypeEnum, tag_json: Dict or None):
+		raise Exception(f"Trainer connection not expected.")
+
+	def send_update_model_acknowledgement(self, *, model_sha256: str, model_version_index: int or None, is_successful: bool):
 		self.send_client_server_message(
-			client_server_message=DetectResponseDetectorClientServerMessage(
-				detected_label_json_dicts=DetectedLabel.to_list_of_json(
-					detected_labels=detected_labels
-				),
+			client_server_message=UpdateModelAcknowledgementTrainerClientServerMessage(
+				model_sha256=model_sha256,
+				model_version_index=model_version_index,
+				is_successful=is_successful,
 				destination_uuid=self.__source_uuid
 			)
 		)
@@ -245,24 +1060,50 @@ class ClientStructure(Structure):
 
 class DetectorStructure(Structure):
 
-	def __init__(self, *, script_directory_path: str, temp_image_directory_path: str, model_directory_path: str, trainer_client_messenger_factory: ClientMessengerFactory, image_size: int, is_debug: bool = False):
+	def __init__(self, *, yolov5_directory_path: str, model_directory_path: str, trainer_client_messenger_factory: ClientMessengerFactory, image_size: int, detection_batch_size: int, detection_batch_window_seconds: float, detection_cache_size_bytes: int, inference_worker_total: int, inference_worker_thread_total: int, detection_queue_size: int, tile_size: int, tile_overlap_ratio: float, inference_backend: InferenceBackendEnum, warm_up_total: int, readiness_port: int, attachment_host_address: str, attachment_port: int, is_debug: bool = False):
 		super().__init__(
 			states=DetectorStructureStateEnum,
 			initial_state=DetectorStructureStateEnum.Active
 		)
 
-		self.__script_directory_path = script_directory_path
-		self.__temp_image_directory_path = temp_image_directory_path
+		self.__yolov5_directory_path = yolov5_directory_path
 		self.__model_directory_path = model_directory_path
 		self.__trainer_client_messenger_factory = trainer_client_messenger_factory
 		self.__image_size = image_size
+		self.__detection_batch_size = detection_batch_size
+		self.__detection_batch_window_seconds = detection_batch_window_seconds
+		self.__detection_cache_size_bytes = detection_cache_size_bytes
+		self.__inference_worker_total = inference_worker_total
+		self.__inference_worker_thread_total = inference_worker_thread_total
+		self.__detection_queue_size = detection_queue_size
+		self.__tile_size = tile_size
+		self.__tile_overlap_ratio = tile_overlap_ratio
+		self.__inference_backend = inference_backend
+		self.__warm_up_total = warm_up_total
+		self.__readiness_port = readiness_port
+		self.__attachment_host_address = attachment_host_address
+		self.__attachment_port = attachment_port
 		self.__is_debug = is_debug
 
-		self.__detection_script_file_path = None  # type: str
-		self.__detection_model_semaphore = Semaphore()
 		self.__detection_model_file_path = None  # type: str
-		self.__detection_subprocess_wrapper = None  # type: SubprocessWrapper
+		self.__model_registry_file_path = None  # type: str
+		self.__inference_worker_pool = None  # type: InferenceWorkerPool
+		self.__inference_worker_pool_semaphore = Semaphore()
+		self.__model_update_index = 0
+		self.__active_model_update_index = 0
+		self.__loading_model_versions = set()  # type: Set[str]
+		self.__is_disposed = False
+		self.__detection_cache = None  # type: DetectionCache
+		self.__detection_requests = deque()  # type: Deque[DetectionRequest]
+		self.__detection_requests_condition = threading.Condition()
+		self.__is_detection_batch_thread_active = True
+		self.__detection_batch_thread = None
+		self.__detection_batch_slots_semaphore = None  # type: threading.BoundedSemaphore
 		self.__client_structure_per_source_uuid = {}  # type: Dict[str, ClientStructure]
+		self.__readiness_http_server = None  # type: ReadinessHttpServer
+		self.__attachment_server = None  # type: AttachmentServer
+		self.__trainer_attachment_client = None  # type: AttachmentClient
+		self.__trainer_structure = None  # type: TrainerStructure
 
 		self.add_transition(
 			client_server_message_type=DetectorClientServerMessageTypeEnum.DetectRequest,
@@ -272,6 +1113,14 @@ class DetectorStructure(Structure):
 			on_transition=self.__client_detect_request_transition
 		)
 
+		self.add_transition(
+			client_server_message_type=DetectorClientServerMessageTypeEnum.ReadinessRequest,
+			from_source_type=DetectorSourceTypeEnum.Client,
+			start_structure_state=DetectorStructureStateEnum.Active,
+			end_structure_state=DetectorStructureStateEnum.Active,
+			on_transition=self.__client_readiness_request_transition
+		)
+
 		self.add_transition(
 			client_server_message_type=TrainerClientServerMessageTypeEnum.UpdateModelBroadcast,
 			from_source_type=DetectorSourceTypeEnum.Trainer,
@@ -280,20 +1129,225 @@ class DetectorStructure(Structure):
 			on_transition=self.__trainer_update_model_broadcast_transition
 		)
 
+		self.add_transition(
+			client_server_message_type=TrainerClientServerMessageTypeEnum.AttachmentEndpointAnnouncement,
+			from_source_type=DetectorSourceTypeEnum.Trainer,
+			start_structure_state=DetectorStructureStateEnum.Active,
+			end_structure_state=DetectorStructureStateEnum.Active,
+			on_transition=self.__trainer_attachment_endpoint_announcement_transition
+		)
+
 		self.__initialize()
 
 	def __initialize(self):
 
-		self.__detection_script_file_path = os.path.join(self.__script_directory_path, "detect.sh")
-
 		self.__detection_model_file_path = os.path.join(self.__model_directory_path, "weights.pt")
+		self.__model_registry_file_path = os.path.join(self.__model_directory_path, "weights.json")
 
+		self.__detection_cache = DetectionCache(
+			maximum_size_bytes=self.__detection_cache_size_bytes
+		)
+
+		if self.__inference_worker_total <= 0:
+			# size the pool to the cores of the host
+			self.__inference_worker_total = max(1, os.cpu_count() // self.__inference_worker_thread_total)
+
+		# one batch may be in flight per replica
+		self.__detection_batch_slots_semaphore = threading.BoundedSemaphore(self.__inference_worker_total)
+
+		model_version = None
+		model_version_index = None
+		if os.path.exists(self.__detection_model_file_path):
+			if os.path.exists(self.__model_registry_file_path):
+				with open(self.__model_registry_file_path, "r") as file_handle:
+					model_registry_json = json.load(file_handle)
+				if model_registry_json["size_bytes"] == os.path.getsize(self.__detection_model_file_path):
+					model_version = model_registry_json["sha256"]
+					model_version_index = model_registry_json["model_version_index"]
+			if model_version is None:
+				model_version = self.__get_model_version(
+					model_file_path=self.__detection_model_file_path
+				)
+				self.__save_model_registry(
+					model_version=model_version,
+					model_version_index=None
+				)
+
+		# remove staged models left behind by a previous run while keeping the export of the active model
+		for file_name in os.listdir(self.__model_directory_path):
+			if file_name.startswith("weights.") and file_name not in ["weights.pt", f"weights.{model_version}.onnx", f"weights.{model_version}.int8.onnx"]:
+				if file_name.endswith(".pt") or file_name.endswith(".onnx") or file_name.endswith(".tmp"):
+					os.remove(os.path.join(self.__model_directory_path, file_name))
+
+		if model_version is not None:
+			# load the existing weights ahead of the first request, where exporting them could take a while
+			start_thread(partial(self.__start_inference_worker_pool_thread_method, model_version=model_version))
+
+		self.__detection_batch_thread = start_thread(self.__detection_batch_thread_method)
+
+		if self.__readiness_port != 0:
+			self.__readiness_http_server = ReadinessHttpServer(
+				host_port=self.__readiness_port,
+				is_ready_method=self.is_ready
+			)
+			start_thread(self.__readiness_http_server.serve_forever)
+
+		if self.__attachment_port != 0:
+			self.__attachment_server = AttachmentServer(
+				host_address="0.0.0.0",
+				host_port=self.__attachment_port
+			)
+			start_thread(self.__attachment_server.serve_forever)
+
+		# a trainer that supports attachments answers with its attachment endpoint, and one that already sees the model it would send skips it, while an older one ignores the tag
 		self.connect_to_outbound_messenger(
 			client_messenger_factory=self.__trainer_client_messenger_factory,
 			source_type=DetectorSourceTypeEnum.Trainer,
-			tag_json=None
+			tag_json={
+				"is_attachment_supported": True,
+				"is_model_acknowledgement_supported": True,
+				"model_sha256": model_version,
+				"model_version_index": model_version_index
+			}
 		)
 
+	def __save_model_registry(self, *, model_version: str, model_version_index: int or None):
+		# records what weights.pt holds so that a restart neither hashes it again nor downloads it again
+		model_registry_json = {
+			"model_version_index": model_version_index,
+			"sha256": model_version,
+			"size_bytes": os.path.getsize(self.__detection_model_file_path)
+		}
+		temporary_file_path = f"{self.__model_registry_file_path}.{uuid.uuid4()}.tmp"
+		with open(temporary_file_path, "w") as file_handle:
+			json.dump(model_registry_json, file_handle)
+		os.replace(temporary_file_path, self.__model_registry_file_path)
+
+	def __get_model_version(self, *, model_file_path: str) -> str:
+		model_hash = hashlib.sha256()
+		with open(model_file_path, "rb") as file_handle:
+			for chunk_bytes in iter(partial(file_handle.read, 1024 * 1024), b""):
+				model_hash.update(chunk_bytes)
+		return model_hash.hexdigest()
+
+	def __get_inference_model_file_path(self, *, model_file_path: str, model_version: str) -> str:
+
+		if self.__inference_backend == InferenceBackendEnum.Torch:
+			return model_file_path
+		elif self.__inference_backend == InferenceBackendEnum.OnnxInt8 and os.path.exists(os.path.join(self.__model_directory_path, f"weights.{model_version}.int8.onnx")):
+			# the quantized variant is calibrated by the trainer and staged beside the weights it was quantized from
+			return os.path.join(self.__model_directory_path, f"weights.{model_version}.int8.onnx")
+		elif self.__inference_backend in [InferenceBackendEnum.Onnx, InferenceBackendEnum.OnnxInt8]:
+			if self.__inference_backend == InferenceBackendEnum.OnnxInt8:
+				print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: no quantized variant of model version {model_version}, serving it at full precision")
+			# the export is kept beside the weights so that it only happens once per model version
+			onnx_model_file_path = os.path.join(self.__model_directory_path, f"weights.{model_version}.onnx")
+			if not os.path.exists(onnx_model_file_path):
+				if self.__is_debug:
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: Exporting model version {model_version} to ONNX: (start)")
+				export_subprocess_wrapper = SubprocessWrapper(
+					command=sys.executable,
+					arguments=[os.path.join(self.__yolov5_directory_path, "export.py"), "--weights", model_file_path, "--imgsz", str(self.__image_size), "--include", "onnx", "--dynamic", "--device", "cpu"]
+				)
+				exit_code, export_output = export_subprocess_wrapper.run()
+				if self.__is_debug:
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: Export exit code: {exit_code}")
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: Export output: {export_output}")
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: Exporting model version {model_version} to ONNX: (end)")
+				# yolov5 writes the export beside its weights, so it only becomes the cached export once it is complete
+				exported_model_file_path = f"{os.path.splitext(model_file_path)[0]}.onnx"
+				if exit_code != 0 or not os.path.exists(exported_model_file_path):
+					# the weights can still be served by PyTorch, such as when the onnx package is missing
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: failed to export model version {model_version} to ONNX with exit code {exit_code}, serving it with PyTorch")
+					return model_file_path
+				os.replace(exported_model_file_path, onnx_model_file_path)
+			return onnx_model_file_path
+		else:
+			raise NotImplementedError(f"Inference backend not implemented: {self.__inference_backend.value}")
+
+	def __start_inference_worker_pool_thread_method(self, *, model_version: str):
+
+		attempt_index = 0
+		while True:
+			inference_worker_pool = None
+			try:
+				inference_worker_pool = InferenceWorkerPool(
+					yolov5_directory_path=self.__yolov5_directory_path,
+					model_file_path=self.__get_inference_model_file_path(
+						model_file_path=self.__detection_model_file_path,
+						model_version=model_version
+					),
+					model_version=model_version,
+					image_size=self.__image_size,
+					inference_worker_total=self.__inference_worker_total,
+					inference_worker_thread_total=self.__inference_worker_thread_total,
+					warm_up_total=self.__warm_up_total,
+					is_debug=self.__is_debug
+				)
+				self.__inference_worker_pool_semaphore.acquire()
+				try:
+					# a model from the trainer may have been swapped in while this one was exported
+					is_outdated = self.__active_model_update_index != 0
+					if not is_outdated:
+						self.__inference_worker_pool = inference_worker_pool
+				finally:
+					self.__inference_worker_pool_semaphore.release()
+				if is_outdated:
+					inference_worker_pool.dispose()
+				else:
+					inference_worker_pool.start()
+				return
+			except Exception as ex:
+				print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: ex: {ex}")
+
+			# replicas that did start are stopped, and the version is forgotten so that the trainer sending it again loads it anew
+			self.__inference_worker_pool_semaphore.acquire()
+			try:
+				if self.__inference_worker_pool is inference_worker_pool:
+					self.__inference_worker_pool = None
+				is_retried = not self.__is_disposed and self.__active_model_update_index == 0 and model_version not in self.__loading_model_versions
+			finally:
+				self.__inference_worker_pool_semaphore.release()
+			if inference_worker_pool is not None:
+				inference_worker_pool.dispose()
+			if not is_retried:
+				return
+
+			attempt_index += 1
+			retry_delay_seconds = min(2.0 ** attempt_index, 60.0)
+			print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: failed to start model version {model_version}, retrying in {retry_delay_seconds} seconds")
+			time.sleep(retry_delay_seconds)
+
+	def is_ready(self) -> bool:
+		# a model update keeps the warm model active until its replacement has warmed up, so only startup is ever not ready
+		inference_worker_pool = self.__inference_worker_pool
+		return inference_worker_pool is not None and inference_worker_pool.is_ready()
+
+	def __client_readiness_request_transition(self, structure_influence: StructureInfluence):
+
+		client_server_message = structure_influence.get_client_server_message()
+		if not isinstance(client_server_message, ReadinessRequestDetectorClientServerMessage):
+			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
+		else:
+			source_uuid = structure_influence.get_source_uuid()
+			inference_worker_pool = self.__inference_worker_pool
+			is_ready = inference_worker_pool is not None and inference_worker_pool.is_ready()
+
+			client_structure = self.__client_structure_per_source_uuid.get(source_uuid, None)
+			if client_structure is None:
+				print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: failed to find client {source_uuid}")
+			else:
+				try:
+					client_structure.send_readiness_response(
+						readiness_uuid=client_server_message.get_readiness_uuid(),
+						is_ready=is_ready,
+						model_version=inference_worker_pool.get_model_version() if is_ready else None
+					)
+				except ReadWriteSocketClosedException as ex:
+					if self.__is_debug:
+						print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: disconnected from client {source_uuid}.")
+					self.__client_structure_per_source_uuid.pop(source_uuid, None)
+
 	def __client_detect_request_transition(self, structure_influence: StructureInfluence):
 
 		client_server_message = structure_influence.get_client_server_message()
@@ -302,78 +1356,266 @@ class DetectorStructure(Structure):
 		else:
 			# run detection process
 
-			if not os.path.exists(self.__detection_model_file_path):
+			source_uuid = structure_influence.get_source_uuid()
+			image_uuid = client_server_message.get_image_uuid()
+			timeout_seconds = client_server_message.get_timeout_seconds()
+
+			# an uploaded image is claimed before anything else so that a rejected request does not leave it behind
+			image_attachment_uuid = client_server_message.get_image_attachment_uuid()
+			if image_attachment_uuid is None:
+				image_bytes = client_server_message.get_image_bytes()
+			elif self.__attachment_server is None:
+				image_bytes = None
+			else:
+				image_bytes = self.__attachment_server.pop_attachment(
+					attachment_uuid=image_attachment_uuid
+				)
+
+			if image_bytes is None:
+				print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: failed to find image attachment {image_attachment_uuid}")
+				self.__send_detection_rejection(
+					source_uuid=source_uuid,
+					image_uuid=image_uuid,
+					detect_rejection_reason=DetectRejectionReasonEnum.DetectionFailed
+				)
+			elif not self.is_ready():
+				# no traffic reaches a model until every replica has warmed it up
 				if self.__is_debug:
-					print(f"{datetime.utcnow()}: {inspect.stack()[0][3]}: Failed to find existing weights")
+					print(f"{datetime.utcnow()}: {inspect.stack()[0][3]}: Failed to find a ready model")
+				self.__send_detection_rejection(
+					source_uuid=source_uuid,
+					image_uuid=image_uuid,
+					detect_rejection_reason=DetectRejectionReasonEnum.ModelUnavailable
+				)
+			elif timeout_seconds is not None and timeout_seconds <= 0:
+				self.__send_detection_rejection(
+					source_uuid=source_uuid,
+					image_uuid=image_uuid,
+					detect_rejection_reason=DetectRejectionReasonEnum.DeadlineExpired
+				)
 			else:
 				if self.__is_debug:
 					print(f"{datetime.utcnow()}: {inspect.stack()[0][3]}: Found existing training weights")
 
-				image_bytes = client_server_message.get_image_bytes()
-				image_extension = client_server_message.get_image_extension()
+				image_hash = hashlib.sha256(image_bytes).hexdigest()
+
+				# the request may override the tiling of this deployment, where a tile size of zero disables tiling
+				tile_size = client_server_message.get_tile_size()
+				if tile_size is None:
+					tile_size = self.__tile_size
+				tile_overlap_ratio = client_server_message.get_tile_overlap_ratio()
+				if tile_overlap_ratio is None:
+					tile_overlap_ratio = self.__tile_overlap_ratio
+
+				# identical frames against the same model can be answered without running inference again
+				model_version = self.__inference_worker_pool.get_model_version()
+				packed_detected_labels_bytes = self.__detection_cache.get(
+					image_hash=image_hash,
+					model_version=model_version,
+					image_size=self.__image_size,
+					tile_size=tile_size,
+					tile_overlap_ratio=tile_overlap_ratio
+				)
+				if self.__is_debug:
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: detection cache {'hit' if packed_detected_labels_bytes is not None else 'miss'} (hits: {self.__detection_cache.get_hits_total()}, misses: {self.__detection_cache.get_misses_total()}, size: {self.__detection_cache.get_size_bytes()} bytes)")
+
+				if packed_detected_labels_bytes is not None:
+					self.__send_detection_response(
+						source_uuid=source_uuid,
+						image_uuid=image_uuid,
+						detected_labels=DetectedLabels.parse_packed_bytes(packed_detected_labels_bytes),
+						model_version=model_version,
+						detected_label_encoding=client_server_message.get_detected_label_encoding()
+					)
+				else:
+					# the detection batch thread picks the request up so that concurrent requests share one inference pass
+					is_queue_full = False
+					self.__detection_requests_condition.acquire()
+					try:
+						if len(self.__detection_requests) >= self.__detection_queue_size:
+							is_queue_full = True
+						else:
+							self.__detection_requests.append(DetectionRequest(
+								source_uuid=source_uuid,
+								image_uuid=image_uuid,
+								image_hash=image_hash,
+								image_bytes=image_bytes,
+								timeout_seconds=timeout_seconds,
+								tile_size=tile_size,
+								tile_overlap_ratio=tile_overlap_ratio,
+								detected_label_encoding=client_server_message.get_detected_label_encoding()
+							))
+							self.__detection_requests_condition.notify_all()
+					finally:
+						self.__detection_requests_condition.release()
+
+					if is_queue_full:
+						# shed the request right away so that the client can retry elsewhere
+						if self.__is_debug:
+							print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: rejected image {image_uuid} since the detection queue is full")
+						self.__send_detection_rejection(
+							source_uuid=source_uuid,
+							image_uuid=image_uuid,
+							detect_rejection_reason=DetectRejectionReasonEnum.QueueFull
+						)
 
-				if image_extension.startswith("."):
-					image_extension = image_extension[1:]
+	def __detection_batch_thread_method(self):
 
-				image_file_path = os.path.join(self.__temp_image_directory_path, f"{uuid.uuid4()}.{image_extension}")
-				with open(image_file_path, "wb") as file_handle:
-					file_handle.write(image_bytes)
+		try:
+			while self.__is_detection_batch_thread_active:
 
-				self.__detection_model_semaphore.acquire()
+				# while every replica is busy the queue keeps filling so that the next batch is larger
+				if not self.__detection_batch_slots_semaphore.acquire(timeout=1.0):
+					continue
+
+				self.__detection_requests_condition.acquire()
 				try:
-					self.__detection_subprocess_wrapper = SubprocessWrapper(
-						command="sh",
-						arguments=[self.__detection_script_file_path, image_file_path, self.__detection_model_file_path, str(self.__image_size)]
-					)
-					if self.__is_debug:
-						print(f"{datetime.utcnow()}: {inspect.stack()[0][3]}: Detection shell script: (start)")
-					exit_code, detection_output = self.__detection_subprocess_wrapper.run()
-					if self.__is_debug:
-						print(f"{datetime.utcnow()}: {inspect.stack()[0][3]}: Detection exit code: {exit_code}")
-						print(f"{datetime.utcnow()}: {inspect.stack()[0][3]}: Detection output: {detection_output}")
-						print(f"{datetime.utcnow()}: {inspect.stack()[0][3]}: Detection shell script: (end)")
-
-					detection_directory_path = None
-					for line in detection_output.split("\n"):
-						if line.startswith("Results saved to"):
-							if self.__is_debug:
-								print(line.encode())
-							detection_directory_path = os.path.join("/app/yolov5", line[31:-4])
+					while self.__is_detection_batch_thread_active and not self.__detection_requests:
+						self.__detection_requests_condition.wait()
+
+					# wait for more requests until the batch is full or the oldest request has waited out the batch window
+					batch_window_end_time = self.__detection_requests[0].get_received_time() + self.__detection_batch_window_seconds if self.__detection_requests else 0.0
+					while self.__is_detection_batch_thread_active and len(self.__detection_requests) < self.__detection_batch_size:
+						remaining_seconds = batch_window_end_time - time.monotonic()
+						if remaining_seconds <= 0:
 							break
-
-					if detection_directory_path is None:
-						if self.__is_debug:
-							print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: failed to find detection directory path")
-					else:
-						# TODO send detection response for image_uuid
-						if self.__is_debug:
-							print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: found detection directory path: {detection_directory_path}")
-							exists = os.path.exists(detection_directory_path)
-							print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: exists: {exists}")
-							is_directory = os.path.isdir(detection_directory_path)
-							print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: is_directory: {is_directory}")
-							is_file = os.path.isfile(detection_directory_path)
-							print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: is_file: {is_file}")
-							for file_name in os.listdir(detection_directory_path):
-								file_path = os.path.join(detection_directory_path, file_name)
-								print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: found file: {file_path}")
-						label_directory_path = os.path.join(detection_directory_path, "labels")
-						if not os.path.exists(label_directory_path):
-							if self.__is_debug:
-								print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: failed to find label directory path: {label_directory_path}")
+						self.__detection_requests_condition.wait(remaining_seconds)
+
+					detection_requests = []  # type: List[DetectionRequest]
+					expired_detection_requests = []  # type: List[DetectionRequest]
+					while self.__detection_requests and len(detection_requests) < self.__detection_batch_size:
+						detection_request = self.__detection_requests.popleft()
+						if detection_request.is_expired():
+							expired_detection_requests.append(detection_request)
 						else:
-							if self.__is_debug:
-								print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: found label directory path: {label_directory_path}")
-								for file_name in os.listdir(label_directory_path):
-									file_path = os.path.join(label_directory_path, file_name)
-									print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: found file: {file_path}")
+							detection_requests.append(detection_request)
+				finally:
+					self.__detection_requests_condition.release()
+
+				# requests that can no longer meet their deadline are not worth an inference pass
+				for detection_request in expired_detection_requests:
+					self.__send_detection_rejection(
+						source_uuid=detection_request.get_source_uuid(),
+						image_uuid=detection_request.get_image_uuid(),
+						detect_rejection_reason=DetectRejectionReasonEnum.DeadlineExpired
+					)
 
-						pass
+				if detection_requests:
+					start_thread(partial(self.__detect_batch_thread_method, detection_requests=detection_requests))
+				else:
+					self.__detection_batch_slots_semaphore.release()
 
-					self.__detection_subprocess_wrapper = None
+		except Exception as ex:
+			print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: ex: {ex}")
+			raise
 
-				finally:
-					self.__detection_model_semaphore.release()
+	def __detect_batch_thread_method(self, *, detection_requests: List[DetectionRequest]):
+
+		try:
+			self.__detect_batch(
+				detection_requests=detection_requests
+			)
+		except Exception as ex:
+			print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: ex: {ex}")
+			for detection_request in detection_requests:
+				self.__send_detection_rejection(
+					source_uuid=detection_request.get_source_uuid(),
+					image_uuid=detection_request.get_image_uuid(),
+					detect_rejection_reason=DetectRejectionReasonEnum.DetectionFailed
+				)
+		finally:
+			self.__detection_batch_slots_semaphore.release()
+
+	def __detect_batch(self, *, detection_requests: List[DetectionRequest]):
+
+		images_bytes = [detection_request.get_image_bytes() for detection_request in detection_requests]
+		tile_sizes = [detection_request.get_tile_size() for detection_request in detection_requests]
+		tile_overlap_ratios = [detection_request.get_tile_overlap_ratio() for detection_request in detection_requests]
+
+		if self.__is_debug:
+			print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: Detection of {len(detection_requests)} images: (start)")
+		inference_worker_pool = self.__inference_worker_pool
+		try:
+			detections_per_image, error_string_per_image = inference_worker_pool.detect(
+				images_bytes=images_bytes,
+				tile_sizes=tile_sizes,
+				tile_overlap_ratios=tile_overlap_ratios
+			)
+		except InferenceWorkerDisposedException:
+			# the model was swapped out after this batch picked it, so run the batch on its replacement
+			inference_worker_pool = self.__inference_worker_pool
+			detections_per_image, error_string_per_image = inference_worker_pool.detect(
+				images_bytes=images_bytes,
+				tile_sizes=tile_sizes,
+				tile_overlap_ratios=tile_overlap_ratios
+			)
+		model_version = inference_worker_pool.get_model_version()
+		if self.__is_debug:
+			print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: Detection of {len(detection_requests)} images: (end)")
+
+		for detection_request, detections, error_string in zip(detection_requests, detections_per_image, error_string_per_image):
+			if error_string is not None:
+				print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: failed to detect image {detection_request.get_image_uuid()}: {error_string}")
+				self.__send_detection_rejection(
+					source_uuid=detection_request.get_source_uuid(),
+					image_uuid=detection_request.get_image_uuid(),
+					detect_rejection_reason=DetectRejectionReasonEnum.DetectionFailed
+				)
+			else:
+				detected_labels = DetectedLabels.parse_detections(detections)
+				if self.__is_debug:
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: Detected {len(detected_labels)} labels for image {detection_request.get_image_uuid()}")
+
+				self.__detection_cache.put(
+					image_hash=detection_request.get_image_hash(),
+					model_version=model_version,
+					image_size=self.__image_size,
+					tile_size=detection_request.get_tile_size(),
+					tile_overlap_ratio=detection_request.get_tile_overlap_ratio(),
+					packed_detected_labels_bytes=detected_labels.to_packed_bytes()
+				)
+
+				self.__send_detection_response(
+					source_uuid=detection_request.get_source_uuid(),
+					image_uuid=detection_request.get_image_uuid(),
+					detected_labels=detected_labels,
+					model_version=model_version,
+					detected_label_encoding=detection_request.get_detected_label_encoding()
+				)
+
+	def __send_detection_response(self, *, source_uuid: str, image_uuid: str, detected_labels: DetectedLabels, model_version: str, detected_label_encoding: DetectedLabelEncodingEnum):
+
+		client_structure = self.__client_structure_per_source_uuid.get(source_uuid, None)
+		if client_structure is None:
+			print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: failed to find client {source_uuid} for image {image_uuid}")
+		else:
+			try:
+				client_structure.send_detection_response(
+					image_uuid=image_uuid,
+					detected_labels=detected_labels,
+					model_version=model_version,
+					detected_label_encoding=detected_label_encoding
+				)
+			except ReadWriteSocketClosedException as ex:
+				if self.__is_debug:
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: disconnected from client {source_uuid}.")
+				self.__client_structure_per_source_uuid.pop(source_uuid, None)
+
+	def __send_detection_rejection(self, *, source_uuid: str, image_uuid: str, detect_rejection_reason: DetectRejectionReasonEnum):
+
+		client_structure = self.__client_structure_per_source_uuid.get(source_uuid, None)
+		if client_structure is None:
+			print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: failed to find client {source_uuid} for image {image_uuid}")
+		else:
+			try:
+				client_structure.send_detection_rejection(
+					image_uuid=image_uuid,
+					detect_rejection_reason=detect_rejection_reason
+				)
+			except ReadWriteSocketClosedException as ex:
+				if self.__is_debug:
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: disconnected from client {source_uuid}.")
+				self.__client_structure_per_source_uuid.pop(source_uuid, None)
 
 	def __trainer_update_model_broadcast_transition(self, structure_influence: StructureInfluence):
 
@@ -383,51 +1625,292 @@ class DetectorStructure(Structure):
 		else:
 			if self.__is_debug:
 				print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: updating model from trainer")
-			model_bytes = client_server_message.get_model_bytes()
-			self.__detection_model_semaphore.acquire()
+			model_attachment_uuid = client_server_message.get_model_attachment_uuid()
+			if model_attachment_uuid is None:
+				model_bytes = client_server_message.get_model_bytes()
+				model_version = hashlib.sha256(model_bytes).hexdigest()
+			else:
+				# the trainer names a model attachment by the same sha256 that versions it here, so a known model is never downloaded
+				model_bytes = None
+				model_version = model_attachment_uuid
+			self.__inference_worker_pool_semaphore.acquire()
 			try:
-				with open(self.__detection_model_file_path, "wb") as file_handle:
-					file_handle.write(model_bytes)
+				inference_worker_pool = self.__inference_worker_pool
+				is_model_version_active = inference_worker_pool is not None and inference_worker_pool.get_model_version() == model_version
+				# the trainer can send the same model on connection and again in a broadcast before the first has loaded
+				is_model_version_loading = model_version in self.__loading_model_versions
+				if not is_model_version_active and not is_model_version_loading:
+					self.__loading_model_versions.add(model_version)
 			finally:
-				self.__detection_model_semaphore.release()
-			if self.__is_debug:
-				print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: updated model from trainer")
+				self.__inference_worker_pool_semaphore.release()
+			if is_model_version_active:
+				if self.__is_debug:
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: already serving model version {model_version}")
+				self.__send_update_model_acknowledgement(
+					model_version=model_version,
+					model_version_index=client_server_message.get_model_version_index(),
+					is_successful=True
+				)
+			elif is_model_version_loading:
+				# acknowledged once the load already in progress finishes
+				if self.__is_debug:
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: already loading model version {model_version}")
+			else:
+				# stage the new weights beside the active ones so that detection continues on the active model while they load
+				model_file_path = os.path.join(self.__model_directory_path, f"weights.{model_version}.pt")
+				quantized_model_attachment_uuid = None
+				if model_bytes is not None:
+					with open(model_file_path, "wb") as file_handle:
+						file_handle.write(model_bytes)
+					quantized_model_bytes = client_server_message.get_quantized_model_bytes()
+					if quantized_model_bytes is not None and self.__inference_backend == InferenceBackendEnum.OnnxInt8:
+						with open(os.path.join(self.__model_directory_path, f"weights.{model_version}.int8.onnx"), "wb") as file_handle:
+							file_handle.write(quantized_model_bytes)
+				elif self.__inference_backend == InferenceBackendEnum.OnnxInt8:
+					# only fetched when it would be served
+					quantized_model_attachment_uuid = client_server_message.get_quantized_model_attachment_uuid()
+				self.__model_update_index += 1
+				start_thread(partial(self.__swap_model_thread_method, model_file_path=model_file_path, model_version=model_version, model_update_index=self.__model_update_index, model_version_index=client_server_message.get_model_version_index(), model_attachment_uuid=model_attachment_uuid, quantized_model_attachment_uuid=quantized_model_attachment_uuid))
+
+	def __trainer_attachment_endpoint_announcement_transition(self, structure_influence: StructureInfluence):
+
+		client_server_message = structure_influence.get_client_server_message()
+		if not isinstance(client_server_message, AttachmentEndpointAnnouncementTrainerClientServerMessage):
+			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
+		else:
+			if self.__trainer_attachment_client is not None:
+				self.__trainer_attachment_client.dispose()
+			self.__trainer_attachment_client = AttachmentClient(
+				host_address=client_server_message.get_host_address(),
+				host_port=client_server_message.get_host_port()
+			)
+
+	def __send_update_model_acknowledgement(self, *, model_version: str, model_version_index: int or None, is_successful: bool):
+		# lets the trainer free the broadcast slot it holds for this detector
+		trainer_structure = self.__trainer_structure
+		if trainer_structure is not None:
+			try:
+				trainer_structure.send_update_model_acknowledgement(
+					model_sha256=model_version,
+					model_version_index=model_version_index,
+					is_successful=is_successful
+				)
+			except Exception as ex:
+				print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: ex: {ex}")
+
+	def __download_model_attachment(self, *, attachment_uuid: str, file_path: str):
+		attachment_sha256 = self.__trainer_attachment_client.get_attachment_file(
+			attachment_uuid=attachment_uuid,
+			file_path=file_path
+		)
+		if attachment_sha256 != attachment_uuid:
+			os.remove(file_path)
+			raise Exception(f"Model attachment {attachment_uuid} does not match its checksum {attachment_sha256}.")
+
+	def __swap_model_thread_method(self, *, model_file_path: str, model_version: str, model_update_index: int, model_version_index: int = None, model_attachment_uuid: str = None, quantized_model_attachment_uuid: str = None):
+
+		try:
+			try:
+				if model_attachment_uuid is not None:
+					# streamed to disk in fixed-size chunks, so memory stays flat however large the model is
+					self.__download_model_attachment(
+						attachment_uuid=model_attachment_uuid,
+						file_path=model_file_path
+					)
+					if quantized_model_attachment_uuid is not None:
+						self.__download_model_attachment(
+							attachment_uuid=quantized_model_attachment_uuid,
+							file_path=os.path.join(self.__model_directory_path, f"weights.{model_version}.int8.onnx")
+						)
+				inference_model_file_path = self.__get_inference_model_file_path(
+					model_file_path=model_file_path,
+					model_version=model_version
+				)
+			except Exception:
+				if os.path.exists(model_file_path):
+					os.remove(model_file_path)
+				self.__send_update_model_acknowledgement(
+					model_version=model_version,
+					model_version_index=model_version_index,
+					is_successful=False
+				)
+				raise
+			inference_worker_pool = InferenceWorkerPool(
+				yolov5_directory_path=self.__yolov5_directory_path,
+				model_file_path=inference_model_file_path,
+				model_version=model_version,
+				image_size=self.__image_size,
+				inference_worker_total=self.__inference_worker_total,
+				inference_worker_thread_total=self.__inference_worker_thread_total,
+				warm_up_total=self.__warm_up_total,
+				is_debug=self.__is_debug
+			)
+			try:
+				# each replica runs a synthetic inference before reporting that it is ready
+				inference_worker_pool.start()
+			except Exception as ex:
+				print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: rejected model version {model_version}: {ex}")
+				self.__send_update_model_acknowledgement(
+					model_version=model_version,
+					model_version_index=model_version_index,
+					is_successful=False
+				)
+				inference_worker_pool.dispose()
+				os.remove(model_file_path)
+				if inference_model_file_path != model_file_path:
+					os.remove(inference_model_file_path)
+			else:
+				self.__inference_worker_pool_semaphore.acquire()
+				try:
+					if model_update_index < self.__active_model_update_index:
+						# a newer model finished loading first
+						retired_inference_worker_pool = inference_worker_pool
+					else:
+						retired_inference_worker_pool = self.__inference_worker_pool
+						self.__inference_worker_pool = inference_worker_pool
+						self.__active_model_update_index = model_update_index
+
+						# keep weights.pt pointing at the active model for the next startup
+						temporary_file_path = f"{self.__detection_model_file_path}.{uuid.uuid4()}.tmp"
+						os.link(model_file_path, temporary_file_path)
+						os.replace(temporary_file_path, self.__detection_model_file_path)
+						self.__save_model_registry(
+							model_version=model_version,
+							model_version_index=model_version_index
+						)
+
+						# results from the retired model will never be requested again
+						self.__detection_cache.clear()
+				finally:
+					self.__inference_worker_pool_semaphore.release()
+
+				if inference_model_file_path != model_file_path:
+					# only the export is served while weights.pt keeps the weights
+					os.remove(model_file_path)
+
+				if retired_inference_worker_pool is inference_worker_pool:
+					if self.__is_debug:
+						print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: skipped outdated model version {model_version}")
+				elif self.__is_debug:
+					print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: updated model from trainer to version {model_version}")
+
+				# an outdated model still loaded, so the detector does hold a valid copy of it
+				self.__send_update_model_acknowledgement(
+					model_version=model_version,
+					model_version_index=model_version_index,
+					is_successful=True
+				)
+
+				if retired_inference_worker_pool is not None:
+					# in-flight detections finish on the retired model before its replicas stop
+					retired_inference_worker_pool.dispose()
+					retired_model_file_path = retired_inference_worker_pool.get_model_file_path()
+					self.__inference_worker_pool_semaphore.acquire()
+					try:
+						# a replica of the active pool reloads its file when it restarts, and a loading model may be writing the same one
+						is_retired_model_file_removed = retired_model_file_path != self.__detection_model_file_path and retired_model_file_path != self.__inference_worker_pool.get_model_file_path() and (retired_inference_worker_pool is inference_worker_pool or retired_inference_worker_pool.get_model_version() not in self.__loading_model_versions)
+					finally:
+						self.__inference_worker_pool_semaphore.release()
+					if is_retired_model_file_removed:
+						os.remove(retired_model_file_path)
+		except Exception as ex:
+			print(f"{datetime.utcnow()}: DetectorStructure: {inspect.stack()[0][3]}: ex: {ex}")
+		finally:
+			self.__inference_worker_pool_semaphore.acquire()
+			try:
+				self.__loading_model_versions.discard(model_version)
+			finally:
+				self.__inference_worker_pool_semaphore.release()
 
 	def on_client_connected(self, *, source_uuid: str, source_type: SourceTypeEnum, tag_json: Dict or None):
 		if source_type == DetectorSourceTypeEnum.Client:
 			client_structure = ClientStructure(
 				source_uuid=source_uuid
 			)
+			self.register_child_structure(
+				structure=client_structure
+			)
 			self.__client_structure_per_source_uuid[source_uuid] = client_structure
+			# clients that predate attachments connect without a tag and keep sending images as base64
+			if self.__attachment_server is not None and tag_json is not None and tag_json.get("is_attachment_supported", False):
+				client_structure.send_attachment_endpoint_announcement(
+					host_address=self.__attachment_host_address,
+					host_port=self.__attachment_port
+				)
 		elif source_type == DetectorSourceTypeEnum.Trainer:
 			if self.__is_debug:
 				print(f"Connected to trainer.")
+			self.__trainer_structure = TrainerStructure(
+				source_uuid=source_uuid
+			)
+			self.register_child_structure(
+				structure=self.__trainer_structure
+			)
 		else:
 			raise Exception(f"Unexpected connection from source: {source_type.value}")
 
 	def dispose(self):
 		super().dispose()
-		if self.__detection_subprocess_wrapper is not None:
-			self.__detection_subprocess_wrapper.kill()
+		self.__is_disposed = True
+		self.__is_detection_batch_thread_active = False
+		self.__detection_requests_condition.acquire()
+		try:
+			self.__detection_requests_condition.notify_all()
+		finally:
+			self.__detection_requests_condition.release()
+		if self.__inference_worker_pool is not None:
+			self.__inference_worker_pool.dispose()
+		if self.__readiness_http_server is not None:
+			self.__readiness_http_server.shutdown()
+			self.__readiness_http_server.server_close()
+		if self.__attachment_server is not None:
+			self.__attachment_server.shutdown()
+			self.__attachment_server.server_close()
+		if self.__trainer_attachment_client is not None:
+			self.__trainer_attachment_client.dispose()
 
 
 class DetectorStructureFactory(StructureFactory):
 
-	def __init__(self, *, script_directory_path: str, temp_image_directory_path: str, model_directory_path: str, trainer_client_messenger_factory: ClientMessengerFactory, image_size: int, is_debug: bool = False):
+	def __init__(self, *, yolov5_directory_path: str, model_directory_path: str, trainer_client_messenger_factory: ClientMessengerFactory, image_size: int, detection_batch_size: int, detection_batch_window_seconds: float, detection_cache_size_bytes: int, inference_worker_total: int, inference_worker_thread_total: int, detection_queue_size: int, tile_size: int, tile_overlap_ratio: float, inference_backend: InferenceBackendEnum, warm_up_total: int, readiness_port: int, attachment_host_address: str, attachment_port: int, is_debug: bool = False):
 
-		self.__script_directory_path = script_directory_path
-		self.__temp_image_directory_path = temp_image_directory_path
+		self.__yolov5_directory_path = yolov5_directory_path
 		self.__model_directory_path = model_directory_path
 		self.__trainer_client_messenger_factory = trainer_client_messenger_factory
 		self.__image_size = image_size
+		self.__detection_batch_size = detection_batch_size
+		self.__detection_batch_window_seconds = detection_batch_window_seconds
+		self.__detection_cache_size_bytes = detection_cache_size_bytes
+		self.__inference_worker_total = inference_worker_total
+		self.__inference_worker_thread_total = inference_worker_thread_total
+		self.__detection_queue_size = detection_queue_size
+		self.__tile_size = tile_size
+		self.__tile_overlap_ratio = tile_overlap_ratio
+		self.__inference_backend = inference_backend
+		self.__warm_up_total = warm_up_total
+		self.__readiness_port = readiness_port
+		self.__attachment_host_address = attachment_host_address
+		self.__attachment_port = attachment_port
 		self.__is_debug = is_debug
 
 	def get_structure(self) -> Structure:
 		return DetectorStructure(
-			script_directory_path=self.__script_directory_path,
-			temp_image_directory_path=self.__temp_image_directory_path,
+			yolov5_directory_path=self.__yolov5_directory_path,
 			model_directory_path=self.__model_directory_path,
 			trainer_client_messenger_factory=self.__trainer_client_messenger_factory,
 			image_size=self.__image_size,
+			detection_batch_size=self.__detection_batch_size,
+			detection_batch_window_seconds=self.__detection_batch_window_seconds,
+			detection_cache_size_bytes=self.__detection_cache_size_bytes,
+			inference_worker_total=self.__inference_worker_total,
+			inference_worker_thread_total=self.__inference_worker_thread_total,
+			detection_queue_size=self.__detection_queue_size,
+			tile_size=self.__tile_size,
+			tile_overlap_ratio=self.__tile_overlap_ratio,
+			inference_backend=self.__inference_backend,
+			warm_up_total=self.__warm_up_total,
+			readiness_port=self.__readiness_port,
+			attachment_host_address=self.__attachment_host_address,
+			attachment_port=self.__attachment_port,
 			is_debug=self.__is_debug
 		)
@@ -4,6 +4,18 @@ docker run \
   --network host \
   -e image_size=2048 \
   -e label_classes_total=2 \
-  -v $HOME/Projects_Unversioned/YoloV5Service/detector/temp_images:/app/temp_images \
+  -e detection_batch_size=8 \
+  -e detection_batch_window_seconds=0.05 \
+  -e detection_cache_size_bytes=67108864 \
+  -e inference_worker_total=0 \
+  -e inference_worker_thread_total=4 \
+  -e detection_queue_size=256 \
+  -e tile_size=0 \
+  -e tile_overlap_ratio=0.2 \
+  -e inference_backend=onnx \
+  -e warm_up_total=3 \
+  -e readiness_port=31985 \
+  -e attachment_host_address=$(hostname -I | cut -d' ' -f1) \
+  -e attachment_port=31986 \
   -v $HOME/Projects_Unversioned/YoloV5Service/detector/models:/app/models \
   yolov5_detector_cpu:latest
\ No newline at end of file
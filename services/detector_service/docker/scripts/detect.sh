@@ -1 +0,0 @@
-python /app/yolov5/detect.py --source "$1" --weights "$2" --save-txt --data /app/yolov5/data/service_data.yaml --img "$3"
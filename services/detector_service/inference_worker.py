@@ -0,0 +1,319 @@
+from __future__ import annotations
+from typing import List, Tuple, Dict, BinaryIO
+import json
+import os
+import sys
+import struct
+from austin_heller_repo.common import StringEnum
+
+
+class InferenceWorkerCommandEnum(StringEnum):
+	Detect = "detect"
+
+
+class InferenceWorkerStatusEnum(StringEnum):
+	Ready = "ready"
+	Success = "success"
+	Failure = "failure"
+
+
+class InferenceWorkerClosedException(Exception):
+
+	def __init__(self, *args):
+		super().__init__(*args)
+
+
+class InferenceWorkerPipe():
+
+	def __init__(self, *, input_file_handle: BinaryIO, output_file_handle: BinaryIO):
+
+		self.__input_file_handle = input_file_handle
+		self.__output_file_handle = output_file_handle
+
+		# each message is a big-endian (json length, payload length) header followed by the json and then the raw payload
+		self.__header_format = ">II"
+		self.__header_length = struct.calcsize(self.__header_format)
+
+	def write_message(self, *, message_json: Dict, payload_bytes: bytes = b""):
+		message_bytes = json.dumps(message_json).encode()
+		self.__output_file_handle.write(struct.pack(self.__header_format, len(message_bytes), len(payload_bytes)))
+		self.__output_file_handle.write(message_bytes)
+		if payload_bytes:
+			self.__output_file_handle.write(payload_bytes)
+		self.__output_file_handle.flush()
+
+	def __read_exactly(self, *, length: int) -> bytes:
+		read_bytes = bytearray()
+		while len(read_bytes) != length:
+			partial_bytes = self.__input_file_handle.read(length - len(read_bytes))
+			if not partial_bytes:
+				raise InferenceWorkerClosedException(f"Pipe closed after {len(read_bytes)} of {length} bytes.")
+			read_bytes.extend(partial_bytes)
+		return bytes(read_bytes)
+
+	def read_message(self) -> Tuple[Dict, bytes]:
+		message_length, payload_length = struct.unpack(self.__header_format, self.__read_exactly(
+			length=self.__header_length
+		))
+		message_json = json.loads(self.__read_exactly(
+			length=message_length
+		).decode())
+		payload_bytes = self.__read_exactly(
+			length=payload_length
+		)
+		return message_json, payload_bytes
+
+	def close(self):
+		try:
+			self.__output_file_handle.close()
+		finally:
+			self.__input_file_handle.close()
+
+
+class InferenceModel():
+
+	def __init__(self, *, yolov5_directory_path: str, model_file_path: str, image_size: int, thread_total: int, confidence_threshold: float = 0.25, iou_threshold: float = 0.45, tile_batch_size: int = 16):
+
+		self.__yolov5_directory_path = yolov5_directory_path
+		self.__model_file_path = model_file_path
+		self.__image_size = image_size
+		self.__thread_total = thread_total
+		self.__confidence_threshold = confidence_threshold
+		self.__iou_threshold = iou_threshold
+		self.__tile_batch_size = tile_batch_size
+
+		self.__model = None
+		self.__stride = None  # type: int
+
+		self.__initialize()
+
+	def __initialize(self):
+
+		if self.__yolov5_directory_path not in sys.path:
+			sys.path.insert(0, self.__yolov5_directory_path)
+
+		import torch
+		from models.common import DetectMultiBackend
+		from utils.general import check_img_size
+
+		torch.set_num_threads(self.__thread_total)
+
+		self.__model = DetectMultiBackend(self.__model_file_path, device=torch.device("cpu"))
+		self.__model.eval()
+		self.__stride = int(self.__model.stride)
+		self.__image_size = check_img_size(self.__image_size, s=self.__stride)
+
+	def __detect_images(self, *, images: List, image_size: int) -> List[List[List[float]]]:
+
+		import numpy as np
+		import torch
+		from utils.augmentations import letterbox
+		from utils.general import non_max_suppression, scale_coords
+
+		letterboxed_images = []
+		for image in images:
+			# minimal padding is only possible for a single image since a batch must share one shape
+			letterboxed_image = letterbox(image, image_size, stride=self.__stride, auto=self.__model.pt and len(images) == 1)[0]
+			letterboxed_image = np.ascontiguousarray(letterboxed_image.transpose((2, 0, 1))[::-1])
+			letterboxed_images.append(letterboxed_image)
+
+		detections_per_image = []  # type: List[List[List[float]]]
+		with torch.no_grad():
+			image_tensor = torch.from_numpy(np.stack(letterboxed_images)).float() / 255.0
+			prediction = self.__model(image_tensor)
+			detections_per_batch_index = non_max_suppression(prediction, self.__confidence_threshold, self.__iou_threshold, max_det=1000)
+			for image, detections in zip(images, detections_per_batch_index):
+				detections[:, :4] = scale_coords(image_tensor.shape[2:], detections[:, :4], image.shape).round()
+				detections_per_image.append(detections.tolist())
+		return detections_per_image
+
+	def __get_tile_offsets(self, *, length: int, tile_size: int, tile_stride: int) -> List[int]:
+		tile_offsets = list(range(0, max(length - tile_size, 0) + 1, tile_stride))
+		# the last tile is pulled back to end at the edge so that no tile hangs over it
+		if tile_offsets[-1] + tile_size < length:
+			tile_offsets.append(length - tile_size)
+		return tile_offsets
+
+	def __detect_tiled_images(self, *, images: List, tile_size: int, tile_overlap_ratio: float) -> List[List[List[float]]]:
+
+		import torch
+		import torchvision
+		from utils.general import check_img_size
+
+		tile_size = check_img_size(tile_size, s=self.__stride)
+		tile_stride = max(int(tile_size * (1.0 - tile_overlap_ratio)), 1)
+
+		# tiles keep the native resolution so that small objects are not shrunk away by a whole-image resize
+		tiles = []
+		tile_origins = []  # type: List[Tuple[int, int, int]]
+		for image_index, image in enumerate(images):
+			image_height, image_width = image.shape[:2]
+			for tile_y in self.__get_tile_offsets(length=image_height, tile_size=tile_size, tile_stride=tile_stride):
+				for tile_x in self.__get_tile_offsets(length=image_width, tile_size=tile_size, tile_stride=tile_stride):
+					tiles.append(image[tile_y:tile_y + tile_size, tile_x:tile_x + tile_size])
+					tile_origins.append((image_index, tile_x, tile_y))
+
+		tile_detections_per_image = [[] for _ in images]  # type: List[List[List[float]]]
+		for tile_batch_index in range(0, len(tiles), self.__tile_batch_size):
+			for (image_index, tile_x, tile_y), detections in zip(tile_origins[tile_batch_index:tile_batch_index + self.__tile_batch_size], self.__detect_images(
+				images=tiles[tile_batch_index:tile_batch_index + self.__tile_batch_size],
+				image_size=tile_size
+			)):
+				for detection in detections:
+					tile_detections_per_image[image_index].append([detection[0] + tile_x, detection[1] + tile_y, detection[2] + tile_x, detection[3] + tile_y, detection[4], detection[5]])
+
+		# objects inside the overlap are found by more than one tile, so the boxes are suppressed again across tiles
+		detections_per_image = []  # type: List[List[List[float]]]
+		for image, tile_detections in zip(images, tile_detections_per_image):
+			if not tile_detections:
+				detections_per_image.append([])
+			else:
+				detections = torch.tensor(tile_detections)
+				class_offsets = detections[:, 5:6] * max(image.shape[:2])
+				keep_indexes = torchvision.ops.nms(detections[:, :4] + class_offsets, detections[:, 4], self.__iou_threshold)
+				detections_per_image.append(detections[keep_indexes].tolist())
+		return detections_per_image
+
+	def validate(self):
+
+		import numpy as np
+
+		# a synthetic inference proves that the weights load into a usable model before any traffic reaches it
+		self.__detect_images(
+			images=[np.zeros((self.__image_size, self.__image_size, 3), dtype=np.uint8)],
+			image_size=self.__image_size
+		)
+
+	def warm_up(self, *, warm_up_total: int):
+
+		import numpy as np
+
+		# noise gives non-maximum suppression candidates to work through so that every stage of a real request is exercised
+		random_state = np.random.RandomState(0)
+		for _ in range(warm_up_total):
+			self.__detect_images(
+				images=[random_state.randint(0, 256, (self.__image_size, self.__image_size, 3), dtype=np.uint8)],
+				image_size=self.__image_size
+			)
+
+	def detect(self, *, images_bytes: List[memoryview], tile_sizes: List[int], tile_overlap_ratios: List[float]) -> Tuple[List[List[List[float]] or None], List[str or None]]:
+
+		# each detection is [x_min, y_min, x_max, y_max, confidence, label_index] in the coordinates of the original image
+		# an image that fails to decode gets None for its detections and an error string instead of failing the whole batch
+		# a tile size of zero runs the whole image at the model image size while anything larger runs overlapping tiles of that size
+
+		import cv2
+		import numpy as np
+
+		detections_per_image = [None] * len(images_bytes)  # type: List[List[List[float]] or None]
+		error_string_per_image = [None] * len(images_bytes)  # type: List[str or None]
+
+		images_per_tiling = {}  # type: Dict[Tuple[int, float], List]
+		image_indexes_per_tiling = {}  # type: Dict[Tuple[int, float], List[int]]
+		for image_index, (image_bytes, tile_size, tile_overlap_ratio) in enumerate(zip(images_bytes, tile_sizes, tile_overlap_ratios)):
+			if tile_size < 0 or not 0.0 <= tile_overlap_ratio < 1.0:
+				error_string_per_image[image_index] = f"Invalid tiling of size {tile_size} with overlap ratio {tile_overlap_ratio}."
+			else:
+				image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+				if image is None:
+					error_string_per_image[image_index] = f"Failed to decode image of {len(image_bytes)} bytes."
+				else:
+					tiling = (tile_size, tile_overlap_ratio if tile_size != 0 else 0.0)
+					images_per_tiling.setdefault(tiling, []).append(image)
+					image_indexes_per_tiling.setdefault(tiling, []).append(image_index)
+
+		for (tile_size, tile_overlap_ratio), images in images_per_tiling.items():
+			if tile_size == 0:
+				detections_per_tiled_image = self.__detect_images(
+					images=images,
+					image_size=self.__image_size
+				)
+			else:
+				detections_per_tiled_image = self.__detect_tiled_images(
+					images=images,
+					tile_size=tile_size,
+					tile_overlap_ratio=tile_overlap_ratio
+				)
+			for image_index, detections in zip(image_indexes_per_tiling[(tile_size, tile_overlap_ratio)], detections_per_tiled_image):
+				detections_per_image[image_index] = detections
+
+		return detections_per_image, error_string_per_image
+
+
+if __name__ == "__main__":
+
+	if len(sys.argv) != 7:
+		print(f"Failed to provide expected arguments: inference_worker.py [yolov5 directory path] [model file path] [image size integer] [thread total] [comma-separated cpu indexes or empty] [warm up total]", file=sys.stderr)
+		sys.exit(1)
+
+	yolov5_directory_path = sys.argv[1]
+	model_file_path = sys.argv[2]
+	image_size = int(sys.argv[3])
+	thread_total = int(sys.argv[4])
+	cpu_indexes = [int(cpu_index) for cpu_index in sys.argv[5].split(",") if cpu_index]
+	warm_up_total = int(sys.argv[6])
+
+	if cpu_indexes and hasattr(os, "sched_setaffinity"):
+		# keep replicas from competing with each other for the same cores
+		os.sched_setaffinity(0, cpu_indexes)
+
+	# keep stdout reserved for the protocol so that anything yolov5 prints ends up in stderr
+	inference_worker_pipe = InferenceWorkerPipe(
+		input_file_handle=sys.stdin.buffer,
+		output_file_handle=os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+	)
+	os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+	inference_model = InferenceModel(
+		yolov5_directory_path=yolov5_directory_path,
+		model_file_path=model_file_path,
+		image_size=image_size,
+		thread_total=thread_total
+	)
+	inference_model.validate()
+	inference_model.warm_up(
+		warm_up_total=warm_up_total
+	)
+
+	inference_worker_pipe.write_message(
+		message_json={
+			"status": InferenceWorkerStatusEnum.Ready.value
+		}
+	)
+
+	is_running = True
+	while is_running:
+		try:
+			request_json, request_payload_bytes = inference_worker_pipe.read_message()
+		except InferenceWorkerClosedException:
+			is_running = False
+		else:
+			try:
+				command = InferenceWorkerCommandEnum(request_json["command"])
+				if command == InferenceWorkerCommandEnum.Detect:
+					images_bytes = []  # type: List[memoryview]
+					request_payload_memoryview = memoryview(request_payload_bytes)
+					image_offset = 0
+					for image_length in request_json["image_lengths"]:
+						images_bytes.append(request_payload_memoryview[image_offset:image_offset + image_length])
+						image_offset += image_length
+					detections_per_image, error_string_per_image = inference_model.detect(
+						images_bytes=images_bytes,
+						tile_sizes=request_json["tile_sizes"],
+						tile_overlap_ratios=request_json["tile_overlap_ratios"]
+					)
+					response_json = {
+						"status": InferenceWorkerStatusEnum.Success.value,
+						"detections_per_image": detections_per_image,
+						"error_string_per_image": error_string_per_image
+					}
+				else:
+					raise NotImplementedError(f"Command not implemented: {command.value}")
+			except Exception as ex:
+				response_json = {
+					"status": InferenceWorkerStatusEnum.Failure.value,
+					"error_string": str(ex)
+				}
+			inference_worker_pipe.write_message(
+				message_json=response_json
+			)
@@ -5,17 +5,30 @@ import time
 from austin_heller_repo.socket_queued_message_framework import ServerMessenger, ServerSocketFactory, HostPointer, ClientMessengerFactory, ClientSocketFactory
 
 try:
-	from .detector import DetectorStructureFactory, DetectorSourceTypeEnum, DetectorClientServerMessage, TrainerClientServerMessage
+	from .detector import DetectorStructureFactory, DetectorSourceTypeEnum, DetectorClientServerMessage, TrainerClientServerMessage, InferenceBackendEnum
 except ImportError:
-	from detector import DetectorStructureFactory, DetectorSourceTypeEnum, DetectorClientServerMessage, TrainerClientServerMessage
+	from detector import DetectorStructureFactory, DetectorSourceTypeEnum, DetectorClientServerMessage, TrainerClientServerMessage, InferenceBackendEnum
 
 
-if len(sys.argv) != 3:
-	print(f"Failed to provide expected arguments: main.py")
+if len(sys.argv) != 16:
+	print(f"Failed to provide expected arguments: main.py [image size integer] [label_classes_total] [detection_batch_size] [detection_batch_window_seconds] [detection_cache_size_bytes] [inference_worker_total, 0 for one per inference_worker_thread_total cores] [inference_worker_thread_total] [detection_queue_size] [tile_size, 0 to disable tiling] [tile_overlap_ratio] [inference_backend, torch or onnx or onnx_int8] [warm_up_total] [readiness_port, 0 to disable the http endpoint] [attachment_host_address, as reachable by clients] [attachment_port, 0 to receive images as base64]")
 else:
 
 	image_size = int(sys.argv[1])
 	label_classes_total = int(sys.argv[2])
+	detection_batch_size = int(sys.argv[3])
+	detection_batch_window_seconds = float(sys.argv[4])
+	detection_cache_size_bytes = int(sys.argv[5])
+	inference_worker_total = int(sys.argv[6])
+	inference_worker_thread_total = int(sys.argv[7])
+	detection_queue_size = int(sys.argv[8])
+	tile_size = int(sys.argv[9])
+	tile_overlap_ratio = float(sys.argv[10])
+	inference_backend = InferenceBackendEnum(sys.argv[11])
+	warm_up_total = int(sys.argv[12])
+	readiness_port = int(sys.argv[13])
+	attachment_host_address = sys.argv[14]
+	attachment_port = int(sys.argv[15])
 
 	# create data yaml file
 	with open("/app/yolov5/data/service_data.yaml", "w") as file_handle:
@@ -46,8 +59,7 @@ else:
 		source_type_enum_class=DetectorSourceTypeEnum,
 		server_messenger_source_type=DetectorSourceTypeEnum.Trainer,
 		structure_factory=DetectorStructureFactory(
-			script_directory_path="/app/scripts",
-			temp_image_directory_path="/app/temp_images",
+			yolov5_directory_path="/app/yolov5",
 			model_directory_path="/app/models",
 			trainer_client_messenger_factory=ClientMessengerFactory(
 				client_socket_factory=ClientSocketFactory(),
@@ -59,6 +71,19 @@ else:
 				is_debug=False
 			),
 			image_size=image_size,
+			detection_batch_size=detection_batch_size,
+			detection_batch_window_seconds=detection_batch_window_seconds,
+			detection_cache_size_bytes=detection_cache_size_bytes,
+			inference_worker_total=inference_worker_total,
+			inference_worker_thread_total=inference_worker_thread_total,
+			detection_queue_size=detection_queue_size,
+			tile_size=tile_size,
+			tile_overlap_ratio=tile_overlap_ratio,
+			inference_backend=inference_backend,
+			warm_up_total=warm_up_total,
+			readiness_port=readiness_port,
+			attachment_host_address=attachment_host_address,
+			attachment_port=attachment_port,
 			is_debug=True
 		),
 		is_debug=False
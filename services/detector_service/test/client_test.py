@@ -1,6 +1,8 @@
 from __future__ import annotations
 import unittest
-from ..client import ClientStructure, ClientMessengerFactory, ClientSocketFactory, DetectorClientServerMessage
+import asyncio
+import time
+from ..client import ClientStructure, ClientMessengerFactory, ClientSocketFactory, DetectorClientServerMessage, DetectorRoutingEnum, ImagePreprocessor
 from austin_heller_repo.common import HostPointer
 
 
@@ -39,3 +41,181 @@ class ClientTest(unittest.TestCase):
 		print(f"Found {len(detected_labels)} labels.")
 
 		client_structure.dispose()
+
+	def test_is_detector_ready(self):
+
+		client_structure = get_default_client_structure()
+
+		is_ready = client_structure.is_detector_ready()
+
+		print(f"Detector ready: {is_ready}")
+
+		client_structure.dispose()
+
+	def test_detect_labels_async(self):
+
+		client_structure = get_default_client_structure()
+
+		with open("/home/austin/Projects_Unversioned/YoloV5Service/trainer/training/images/1a88e1b1-5c28-47ad-ba3c-33b92db5e8b3.png", "rb") as file_handle:
+			image_bytes = file_handle.read()
+
+		async def get_detected_labels_in_parallel():
+			return await asyncio.gather(*[client_structure.get_detected_labels_async(
+				image_bytes=image_bytes,
+				image_extension=".png"
+			) for _ in range(10)])
+
+		detected_labels_per_image = asyncio.run(get_detected_labels_in_parallel())
+
+		self.assertEqual(10, len(detected_labels_per_image))
+		print(f"Found {[len(detected_labels) for detected_labels in detected_labels_per_image]} labels.")
+
+		client_structure.dispose()
+
+	def test_detect_labels_async_cancelled_in_flight(self):
+
+		client_structure = get_default_client_structure()
+
+		with open("/home/austin/Projects_Unversioned/YoloV5Service/trainer/training/images/1a88e1b1-5c28-47ad-ba3c-33b92db5e8b3.png", "rb") as file_handle:
+			image_bytes = file_handle.read()
+
+		async def cancel_detection_in_flight():
+			detection_task = asyncio.create_task(client_structure.get_detected_labels_async(
+				image_bytes=image_bytes,
+				image_extension=".png"
+			))
+			await asyncio.sleep(0.01)
+			detection_task.cancel()
+			with self.assertRaises(asyncio.CancelledError):
+				await detection_task
+
+		asyncio.run(cancel_detection_in_flight())
+
+		# the response to the cancelled request arrives after its caller is gone and must not break the next request
+		time.sleep(1.0)
+
+		detected_labels = asyncio.run(client_structure.get_detected_labels_async(
+			image_bytes=image_bytes,
+			image_extension=".png"
+		))
+
+		self.assertIsNotNone(detected_labels)
+
+		client_structure.dispose()
+
+	def test_detect_labels_bulk(self):
+
+		client_structure = get_default_client_structure()
+
+		image_file_paths = ["/home/austin/Projects_Unversioned/YoloV5Service/trainer/training/images/1a88e1b1-5c28-47ad-ba3c-33b92db5e8b3.png"] * 10 + ["/nonexistent.png"]
+
+		bulk_detection_results = list(client_structure.get_detected_labels_bulk(
+			image_file_paths=image_file_paths,
+			pipeline_depth=4
+		))
+
+		self.assertEqual(11, len(bulk_detection_results))
+		self.assertEqual(1, len([bulk_detection_result for bulk_detection_result in bulk_detection_results if bulk_detection_result.get_exception() is not None]))
+		print(f"Found {[len(bulk_detection_result.get_detected_labels()) for bulk_detection_result in bulk_detection_results if bulk_detection_result.get_detected_labels() is not None]} labels.")
+
+		client_structure.dispose()
+
+	def test_detect_labels_bulk_stopped_early(self):
+
+		client_structure = get_default_client_structure()
+
+		image_file_paths = ["/home/austin/Projects_Unversioned/YoloV5Service/trainer/training/images/1a88e1b1-5c28-47ad-ba3c-33b92db5e8b3.png"] * 10
+
+		bulk_detection_results = client_structure.get_detected_labels_bulk(
+			image_file_paths=image_file_paths,
+			pipeline_depth=4
+		)
+		next(bulk_detection_results)
+		bulk_detection_results.close()
+
+		# the responses to the abandoned requests arrive afterwards and must not break the next request
+		time.sleep(1.0)
+
+		detected_labels = client_structure.get_detected_labels(
+			image_file_path=image_file_paths[0]
+		)
+
+		self.assertIsNotNone(detected_labels)
+
+		client_structure.dispose()
+
+	def test_detect_labels_multiple_detectors(self):
+
+		# the second detector is never reachable, so every detection has to be routed to the first
+		client_structure = ClientStructure(
+			detector_client_messenger_factories=[
+				ClientMessengerFactory(
+					client_socket_factory=ClientSocketFactory(),
+					server_host_pointer=HostPointer(
+						host_address=host_address,
+						host_port=host_port
+					),
+					client_server_message_class=DetectorClientServerMessage,
+					is_debug=False
+				) for host_address, host_port in [("0.0.0.0", 31983), ("0.0.0.0", 31999)]
+			],
+			detector_routing=DetectorRoutingEnum.LowestLatency
+		)
+
+		time.sleep(1.0)
+
+		for _ in range(5):
+			detected_labels = client_structure.get_detected_labels(
+				image_file_path="/home/austin/Projects_Unversioned/YoloV5Service/trainer/training/images/1a88e1b1-5c28-47ad-ba3c-33b92db5e8b3.png"
+			)
+			print(f"Found {len(detected_labels)} labels.")
+
+		client_structure.dispose()
+
+	def test_image_preprocessor_downscales_to_image_size(self):
+
+		import cv2
+		import numpy as np
+
+		is_successful, encoded_image = cv2.imencode(".png", np.zeros((3000, 4000, 3), dtype=np.uint8))
+		self.assertTrue(is_successful)
+
+		image_preprocessor = ImagePreprocessor(
+			image_size=640
+		)
+
+		image_bytes, image_extension, x_scale, y_scale = image_preprocessor.preprocess(
+			image_bytes=encoded_image.tobytes(),
+			image_extension=".png"
+		)
+
+		self.assertEqual(".jpg", image_extension)
+		self.assertEqual((480, 640), cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR).shape[:2])
+		self.assertAlmostEqual(6.25, x_scale)
+		self.assertAlmostEqual(6.25, y_scale)
+
+	def test_detect_labels_preprocessed(self):
+
+		client_structure = ClientStructure(
+			detector_client_messenger_factory=ClientMessengerFactory(
+				client_socket_factory=ClientSocketFactory(),
+				server_host_pointer=HostPointer(
+					host_address="0.0.0.0",
+					host_port=31983
+				),
+				client_server_message_class=DetectorClientServerMessage,
+				is_debug=False
+			),
+			image_preprocessor=ImagePreprocessor(
+				image_size=2048
+			)
+		)
+
+		time.sleep(1.0)
+
+		detected_labels = client_structure.get_detected_labels(
+			image_file_path="/home/austin/Projects_Unversioned/YoloV5Service/trainer/training/images/1a88e1b1-5c28-47ad-ba3c-33b92db5e8b3.png"
+		)
+		print(f"Found {len(detected_labels)} labels.")
+
+		client_structure.dispose()
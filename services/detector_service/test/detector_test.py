@@ -0,0 +1,205 @@
+from __future__ import annotations
+import unittest
+from ..detector import DetectedLabel, DetectionCache, DetectionRequest, DetectRequestDetectorClientServerMessage, DetectResponseDetectorClientServerMessage, DetectedLabelEncodingEnum, DetectedLabels
+
+
+class DetectorTest(unittest.TestCase):
+
+	def test_parse_detection(self):
+
+		detected_label = DetectedLabel.parse_detection([10.0, 20.0, 110.0, 70.0, 0.75, 1.0])
+
+		self.assertEqual({
+			"label_index": 1,
+			"x": 10,
+			"y": 20,
+			"width": 100,
+			"height": 50,
+			"confidence": 0.75
+		}, detected_label.to_json())
+
+	def test_detection_cache_evicts_least_recently_used(self):
+
+		packed_detected_labels_bytes = DetectedLabels.parse_detections([[0.0, 0.0, 10.0, 10.0, 0.5, 0.0]]).to_packed_bytes()
+
+		detection_cache = DetectionCache(
+			maximum_size_bytes=100
+		)
+
+		for image_hash in ["first", "second", "third"]:
+			detection_cache.put(
+				image_hash=image_hash,
+				model_version="version",
+				image_size=640,
+				tile_size=0,
+				tile_overlap_ratio=0.0,
+				packed_detected_labels_bytes=packed_detected_labels_bytes
+			)
+			self.assertIsNotNone(detection_cache.get(
+				image_hash="first",
+				model_version="version",
+				image_size=640,
+				tile_size=0,
+				tile_overlap_ratio=0.0
+			))
+
+		self.assertLessEqual(detection_cache.get_size_bytes(), 100)
+		self.assertIsNone(detection_cache.get(
+			image_hash="second",
+			model_version="version",
+			image_size=640,
+			tile_size=0,
+			tile_overlap_ratio=0.0
+		))
+		self.assertIsNone(detection_cache.get(
+			image_hash="first",
+			model_version="other_version",
+			image_size=640,
+			tile_size=0,
+			tile_overlap_ratio=0.0
+		))
+		self.assertEqual(3, detection_cache.get_hits_total())
+		self.assertEqual(2, detection_cache.get_misses_total())
+
+		detection_cache.clear()
+
+		self.assertEqual(0, detection_cache.get_size_bytes())
+
+	def test_detection_cache_counts_stored_payload_bytes(self):
+
+		detected_labels = DetectedLabels.parse_detections([[0.0, 0.0, 10.0, 10.0, 0.5, 0.0], [20.0, 20.0, 40.0, 30.0, 0.75, 2.0]])
+
+		detection_cache = DetectionCache(
+			maximum_size_bytes=1024
+		)
+
+		detection_cache.put(
+			image_hash="image",
+			model_version="version",
+			image_size=640,
+			tile_size=0,
+			tile_overlap_ratio=0.0,
+			packed_detected_labels_bytes=detected_labels.to_packed_bytes()
+		)
+		packed_detected_labels_bytes = detection_cache.get(
+			image_hash="image",
+			model_version="version",
+			image_size=640,
+			tile_size=0,
+			tile_overlap_ratio=0.0
+		)
+
+		self.assertEqual(len("image") + len("version") + len(packed_detected_labels_bytes), detection_cache.get_size_bytes())
+		self.assertEqual(2 * DetectedLabels.dtype.itemsize, len(packed_detected_labels_bytes))
+		self.assertEqual(detected_labels.to_list_of_json(), DetectedLabels.parse_packed_bytes(packed_detected_labels_bytes).to_list_of_json())
+
+		# replacing an entry charges only its new payload
+		detection_cache.put(
+			image_hash="image",
+			model_version="version",
+			image_size=640,
+			tile_size=0,
+			tile_overlap_ratio=0.0,
+			packed_detected_labels_bytes=detected_labels[:1].to_packed_bytes()
+		)
+
+		self.assertEqual(len("image") + len("version") + DetectedLabels.dtype.itemsize, detection_cache.get_size_bytes())
+
+	def test_detection_request_deadline(self):
+
+		detection_request = DetectionRequest(
+			source_uuid="source",
+			image_uuid="image",
+			image_hash="hash",
+			image_bytes=b"",
+			timeout_seconds=0.0,
+			tile_size=0,
+			tile_overlap_ratio=0.0,
+			detected_label_encoding=DetectedLabelEncodingEnum.Json
+		)
+		self.assertTrue(detection_request.is_expired())
+
+		detection_request = DetectionRequest(
+			source_uuid="source",
+			image_uuid="image",
+			image_hash="hash",
+			image_bytes=b"",
+			timeout_seconds=None,
+			tile_size=0,
+			tile_overlap_ratio=0.0,
+			detected_label_encoding=DetectedLabelEncodingEnum.Json
+		)
+		self.assertFalse(detection_request.is_expired())
+
+	def test_detect_request_timeout_seconds_round_trip(self):
+
+		detect_request = DetectRequestDetectorClientServerMessage(
+			image_bytes_base64string="",
+			image_extension=".jpg",
+			image_uuid="image",
+			destination_uuid="destination",
+			timeout_seconds=2.5
+		)
+
+		self.assertEqual(2.5, detect_request.to_json()["timeout_seconds"])
+
+	def test_packed_detected_labels_round_trip(self):
+
+		detected_labels = DetectedLabels.parse_detections([
+			[10.0, 20.0, 110.0, 70.0, 0.75, 1.0],
+			[0.0, 0.0, 5.0, 5.0, 0.5, 0.0]
+		])
+
+		packed_bytes = detected_labels.to_packed_bytes()
+
+		self.assertEqual(48, len(packed_bytes))
+
+		packed_detected_labels = DetectedLabels.parse_packed_bytes(packed_bytes)
+
+		self.assertEqual(2, len(packed_detected_labels))
+		self.assertEqual(DetectedLabel.parse_detection([0.0, 0.0, 5.0, 5.0, 0.5, 0.0]).to_json(), packed_detected_labels[-1].to_json())
+		self.assertEqual(detected_labels.to_list_of_json(), packed_detected_labels.to_list_of_json())
+		with self.assertRaises(IndexError):
+			packed_detected_labels[2]
+
+	def test_detected_labels_filtering(self):
+
+		detected_labels = DetectedLabels.parse_list_of_json([
+			{"label_index": 0, "x": 0, "y": 0, "width": 10, "height": 10, "confidence": 0.9},
+			{"label_index": 0, "x": 1, "y": 1, "width": 10, "height": 10, "confidence": 0.8},
+			{"label_index": 1, "x": 1, "y": 1, "width": 10, "height": 10, "confidence": 0.7},
+			{"label_index": 1, "x": 50, "y": 50, "width": 10, "height": 10, "confidence": 0.2}
+		])
+
+		self.assertEqual([0.9, 0.8, 0.7], [round(float(confidence), 2) for confidence in detected_labels.filter_by_confidence(minimum_confidence=0.5).get_confidences()])
+		self.assertEqual([1, 1], detected_labels.filter_by_label_indexes(label_indexes=[1]).get_label_indexes().tolist())
+		self.assertEqual([0.9, 0.7, 0.2], [round(float(confidence), 2) for confidence in detected_labels.deduplicate(iou_threshold=0.5).get_confidences()])
+		self.assertEqual([0.9, 0.2], [round(float(confidence), 2) for confidence in detected_labels.deduplicate(iou_threshold=0.5, is_class_aware=False).get_confidences()])
+		self.assertEqual({"label_index": 1, "x": 100, "y": 100, "width": 20, "height": 20}, {key: value for key, value in detected_labels.scale(x_scale=2.0, y_scale=2.0)[3].to_json().items() if key != "confidence"})
+
+	def test_detect_response_without_encoding_is_json(self):
+
+		detect_response = DetectResponseDetectorClientServerMessage(
+			image_uuid="image",
+			detected_label_json_dicts=[DetectedLabel.parse_detection([10.0, 20.0, 110.0, 70.0, 0.75, 1.0]).to_json()],
+			model_version="version",
+			destination_uuid="destination"
+		)
+
+		self.assertEqual(DetectedLabelEncodingEnum.Json, detect_response.get_detected_label_encoding())
+		self.assertEqual(1, len(detect_response.get_detected_labels()))
+
+	def test_detect_request_refers_to_image_attachment(self):
+
+		detect_request = DetectRequestDetectorClientServerMessage(
+			image_bytes_base64string=None,
+			image_extension=".png",
+			image_uuid="image",
+			destination_uuid="destination",
+			image_attachment_uuid="attachment"
+		)
+
+		json_object = detect_request.to_json()
+
+		self.assertIsNone(json_object["image_bytes_base64string"])
+		self.assertEqual("attachment", json_object["image_attachment_uuid"])
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import sys
+import os
+import time
+from typing import List, Tuple, Iterator
+from austin_heller_repo.common import HostPointer
+
+try:
+	from .image_source import ImageSourceStructure, ClientMessengerFactory, ClientSocketFactory, TrainerClientServerMessage
+	from .trainer import ImageUsageTypeEnum
+except ImportError:
+	from image_source import ImageSourceStructure, ClientMessengerFactory, ClientSocketFactory, TrainerClientServerMessage
+	from trainer import ImageUsageTypeEnum
+
+
+image_file_extensions = {".bmp", ".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp"}
+validation_directory_names = {"val", "valid", "validation"}
+test_directory_names = {"test"}
+
+
+def get_dataset_image_file_paths(*, dataset_directory_path: str) -> Iterator[Tuple[str, str or None, ImageUsageTypeEnum]]:
+	# a yolo dataset keeps each image under an "images" directory and its labels at the same place under "labels"
+	for directory_path, directory_names, file_names in os.walk(dataset_directory_path):
+		directory_names.sort()
+		relative_directory_names = os.path.relpath(directory_path, dataset_directory_path).split(os.sep)
+		if "images" not in relative_directory_names or test_directory_names.intersection(relative_directory_names):
+			# a held out test split is never given to the trainer
+			continue
+		images_index = len(relative_directory_names) - 1 - relative_directory_names[::-1].index("images")
+		labels_directory_path = os.path.join(dataset_directory_path, *relative_directory_names[:images_index], "labels", *relative_directory_names[images_index + 1:])
+		if validation_directory_names.intersection(relative_directory_names):
+			image_usage_type = ImageUsageTypeEnum.Validation
+		else:
+			image_usage_type = ImageUsageTypeEnum.Training
+		for file_name in sorted(file_names):
+			if os.path.splitext(file_name)[1].lower() in image_file_extensions:
+				annotation_file_path = os.path.join(labels_directory_path, f"{os.path.splitext(file_name)[0]}.txt")
+				if not os.path.exists(annotation_file_path):
+					annotation_file_path = None
+				yield os.path.join(directory_path, file_name), annotation_file_path, image_usage_type
+
+
+if len(sys.argv) != 7:
+	print(f"Missing at least one commandline argument.")
+else:
+
+	trainer_host_address = sys.argv[1]
+	trainer_host_port = int(sys.argv[2])
+	dataset_directory_path = sys.argv[3]
+	image_batch_size = int(sys.argv[4])
+	maximum_in_flight_image_batch_total = int(sys.argv[5])
+	timeout_seconds = float(sys.argv[6])  # how long to wait for the trainer to acknowledge the last batches
+
+	image_source_structure = ImageSourceStructure(
+		trainer_client_messenger_factory=ClientMessengerFactory(
+			client_socket_factory=ClientSocketFactory(),
+			server_host_pointer=HostPointer(
+				host_address=trainer_host_address,
+				host_port=trainer_host_port
+			),
+			client_server_message_class=TrainerClientServerMessage,
+			is_debug=False
+		),
+		maximum_in_flight_image_batch_total=maximum_in_flight_image_batch_total
+	)
+
+	time.sleep(1.0)
+
+	try:
+		start_time = time.monotonic()
+		sent_image_total = 0
+		sent_size_bytes = 0
+
+		def send_image_batch(image_file_paths: List[Tuple[str, str or None, ImageUsageTypeEnum]]):
+			global sent_image_total, sent_size_bytes
+			image_source_structure.send_image_batch(
+				image_file_paths=image_file_paths
+			)
+			sent_image_total += len(image_file_paths)
+			sent_size_bytes += sum([os.path.getsize(image_file_path) for image_file_path, _, _ in image_file_paths])
+			elapsed_seconds = time.monotonic() - start_time
+			print(f"sent {sent_image_total} images: {sent_image_total / elapsed_seconds:.1f} images/s, {sent_size_bytes / elapsed_seconds / 2**20:.1f} MiB/s")
+
+		image_file_paths = []  # type: List[Tuple[str, str or None, ImageUsageTypeEnum]]
+		for image_file_path_and_annotation_file_path in get_dataset_image_file_paths(
+			dataset_directory_path=dataset_directory_path
+		):
+			image_file_paths.append(image_file_path_and_annotation_file_path)
+			if len(image_file_paths) == image_batch_size:
+				send_image_batch(image_file_paths)
+				image_file_paths = []
+		if image_file_paths:
+			send_image_batch(image_file_paths)
+
+		is_acknowledged = image_source_structure.wait_for_image_batches(
+			timeout_seconds=timeout_seconds
+		)
+
+		elapsed_seconds = time.monotonic() - start_time
+		print(f"added {image_source_structure.get_added_image_total()} of {sent_image_total} images in {elapsed_seconds:.1f} seconds: {sent_image_total / elapsed_seconds:.1f} images/s, {sent_size_bytes / elapsed_seconds / 2**20:.1f} MiB/s")
+		if image_source_structure.get_rejected_image_total() != 0:
+			print(f"rejected {image_source_structure.get_rejected_image_total()} images")
+	finally:
+		image_source_structure.dispose()
+
+	if not is_acknowledged:
+		print(f"timed out after {timeout_seconds} seconds waiting for the trainer to acknowledge every batch")
+		sys.exit(1)
@@ -0,0 +1,667 @@
+from __future__ import annotations
+from typing import List, Tuple, Dict, Callable
+import json
+import os
+import uuid
+import hashlib
+import socket
+import socketserver
+import struct
+import time
+from datetime import datetime
+import inspect
+from functools import partial
+from austin_heller_repo.threading import Semaphore
+from austin_heller_repo.common import StringEnum
+
+
+class AttachmentOperationEnum(StringEnum):
+	Put = "put"
+	Get = "get"
+	BeginUpload = "begin_upload"
+	PutUploadChunk = "put_upload_chunk"
+	CommitUpload = "commit_upload"
+
+
+class AttachmentClosedException(ConnectionError):
+	pass
+
+
+def receive_into(*, connection_socket: socket.socket, buffer: memoryview):
+	# fills the buffer in place so that a payload is never assembled from copied chunks
+	received_total = 0
+	while received_total < len(buffer):
+		received_length = connection_socket.recv_into(buffer[received_total:])
+		if received_length == 0:
+			raise AttachmentClosedException(f"Connection closed after {received_total} of {len(buffer)} bytes.")
+		received_total += received_length
+
+
+def send_attachment_frame(*, connection_socket: socket.socket, header_json: Dict, attachment_bytes: bytes or bytearray or None):
+	# a frame is a length-prefixed json header followed by the raw attachment, whose length is given in the header
+	header_bytes = json.dumps(header_json).encode()
+	connection_socket.sendall(struct.pack(">I", len(header_bytes)) + header_bytes)
+	if attachment_bytes is not None:
+		connection_socket.sendall(memoryview(attachment_bytes))
+
+
+def send_attachment_file_frame(*, connection_socket: socket.socket, header_json: Dict, attachment_file_path: str):
+	send_attachment_frame(
+		connection_socket=connection_socket,
+		header_json=header_json,
+		attachment_bytes=None
+	)
+	# the kernel copies the file to the socket, so it is never read into memory
+	with open(attachment_file_path, "rb") as file_handle:
+		connection_socket.sendfile(file_handle)
+
+
+def receive_attachment_header(*, connection_socket: socket.socket) -> Dict:
+	header_length_bytes = bytearray(4)
+	receive_into(
+		connection_socket=connection_socket,
+		buffer=memoryview(header_length_bytes)
+	)
+	header_length = struct.unpack(">I", header_length_bytes)[0]
+	if header_length > 65536:
+		raise Exception(f"Attachment header of {header_length} bytes is too large.")
+	header_bytes = bytearray(header_length)
+	receive_into(
+		connection_socket=connection_socket,
+		buffer=memoryview(header_bytes)
+	)
+	return json.loads(header_bytes)
+
+
+def receive_attachment_file(*, connection_socket: socket.socket, size_bytes: int, file_handle, chunk_size_bytes: int) -> str:
+	# streams the attachment through one reused chunk buffer and returns the sha256 of what was written
+	attachment_hash = hashlib.sha256()
+	chunk_bytes = bytearray(chunk_size_bytes)
+	chunk_view = memoryview(chunk_bytes)
+	remaining_size_bytes = size_bytes
+	while remaining_size_bytes != 0:
+		chunk_length = min(chunk_size_bytes, remaining_size_bytes)
+		receive_into(
+			connection_socket=connection_socket,
+			buffer=chunk_view[:chunk_length]
+		)
+		attachment_hash.update(chunk_view[:chunk_length])
+		file_handle.write(chunk_view[:chunk_length])
+		remaining_size_bytes -= chunk_length
+	return attachment_hash.hexdigest()
+
+
+def receive_attachment_frame(*, connection_socket: socket.socket, maximum_attachment_size_bytes: int) -> Tuple[Dict, bytearray or None]:
+	header_json = receive_attachment_header(
+		connection_socket=connection_socket
+	)
+
+	size_bytes = header_json.get("size_bytes", None)
+	if size_bytes is None:
+		return header_json, None
+	if size_bytes > maximum_attachment_size_bytes:
+		raise Exception(f"Attachment of {size_bytes} bytes exceeds the maximum of {maximum_attachment_size_bytes} bytes.")
+	# grown as the payload arrives, so a header that claims a large attachment costs nothing until its bytes are actually sent
+	attachment_bytes = bytearray()
+	chunk_view = memoryview(bytearray(min(size_bytes, 1024 * 1024)))
+	while len(attachment_bytes) < size_bytes:
+		received_length = connection_socket.recv_into(chunk_view[:min(len(chunk_view), size_bytes - len(attachment_bytes))])
+		if received_length == 0:
+			raise AttachmentClosedException(f"Connection closed after {len(attachment_bytes)} of {size_bytes} bytes.")
+		attachment_bytes += chunk_view[:received_length]
+	return header_json, attachment_bytes
+
+
+class AttachmentRequestHandler(socketserver.BaseRequestHandler):
+
+	def handle(self):
+		attachment_server = self.server  # type: AttachmentServer
+		# a header and its payload are separate writes, which must not wait on the acknowledgement of the previous response
+		self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		try:
+			while True:
+				try:
+					header_json, attachment_bytes = receive_attachment_frame(
+						connection_socket=self.request,
+						maximum_attachment_size_bytes=attachment_server.get_maximum_attachment_size_bytes()
+					)
+				except AttachmentClosedException:
+					# the sender is done with this connection
+					break
+
+				attachment_operation = AttachmentOperationEnum(header_json["operation"])
+				attachment_uuid = header_json["attachment_uuid"]
+				if attachment_operation == AttachmentOperationEnum.Put:
+					attachment_server.put_attachment(
+						attachment_uuid=attachment_uuid,
+						attachment_bytes=attachment_bytes
+					)
+					send_attachment_frame(
+						connection_socket=self.request,
+						header_json={
+							"is_successful": True
+						},
+						attachment_bytes=None
+					)
+				elif attachment_operation == AttachmentOperationEnum.Get:
+					attachment_bytes = attachment_server.get_attachment(
+						attachment_uuid=attachment_uuid
+					)
+					attachment_file_path_and_sha256 = attachment_server.get_attachment_file_path_and_sha256(
+						attachment_uuid=attachment_uuid
+					)
+					if attachment_file_path_and_sha256 is not None:
+						attachment_file_path, attachment_sha256 = attachment_file_path_and_sha256
+						send_attachment_file_frame(
+							connection_socket=self.request,
+							header_json={
+								"is_successful": True,
+								"size_bytes": os.path.getsize(attachment_file_path),
+								"sha256": attachment_sha256
+							},
+							attachment_file_path=attachment_file_path
+						)
+					elif attachment_bytes is None:
+						send_attachment_frame(
+							connection_socket=self.request,
+							header_json={
+								"is_successful": False
+							},
+							attachment_bytes=None
+						)
+					else:
+						send_attachment_frame(
+							connection_socket=self.request,
+							header_json={
+								"is_successful": True,
+								"size_bytes": len(attachment_bytes)
+							},
+							attachment_bytes=attachment_bytes
+						)
+				elif attachment_operation == AttachmentOperationEnum.BeginUpload:
+					upload_offset = attachment_server.begin_upload(
+						attachment_uuid=attachment_uuid,
+						total_size_bytes=header_json["total_size_bytes"],
+						sha256=header_json["sha256"]
+					)
+					send_attachment_frame(
+						connection_socket=self.request,
+						header_json={
+							"is_successful": upload_offset is not None,
+							"offset": upload_offset
+						},
+						attachment_bytes=None
+					)
+				elif attachment_operation == AttachmentOperationEnum.PutUploadChunk:
+					upload_offset = attachment_server.put_upload_chunk(
+						attachment_uuid=attachment_uuid,
+						offset=header_json["offset"],
+						chunk_bytes=attachment_bytes
+					)
+					# a chunk at an offset the server has already moved past is not written, and the sender continues from the returned offset
+					send_attachment_frame(
+						connection_socket=self.request,
+						header_json={
+							"is_successful": upload_offset is not None and upload_offset == header_json["offset"] + len(attachment_bytes),
+							"offset": upload_offset
+						},
+						attachment_bytes=None
+					)
+				elif attachment_operation == AttachmentOperationEnum.CommitUpload:
+					send_attachment_frame(
+						connection_socket=self.request,
+						header_json={
+							"is_successful": attachment_server.commit_upload(
+								attachment_uuid=attachment_uuid
+							)
+						},
+						attachment_bytes=None
+					)
+				else:
+					raise NotImplementedError(f"Attachment operation not implemented: {attachment_operation.value}")
+		except Exception as ex:
+			print(f"{datetime.utcnow()}: AttachmentRequestHandler: {inspect.stack()[0][3]}: ex: {ex}")
+
+
+class AttachmentServer(socketserver.ThreadingTCPServer):
+
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self, *, host_address: str, host_port: int, uploaded_attachment_expiry_seconds: float = 300.0, maximum_attachment_size_bytes: int = 2**30, upload_directory_path: str = None):
+		super().__init__((host_address, host_port), AttachmentRequestHandler)
+
+		self.__uploaded_attachment_expiry_seconds = uploaded_attachment_expiry_seconds
+		self.__maximum_attachment_size_bytes = maximum_attachment_size_bytes
+		self.__upload_directory_path = upload_directory_path
+
+		self.__attachment_bytes_per_attachment_uuid = {}  # type: Dict[str, bytes or bytearray]
+		self.__expiry_time_per_attachment_uuid = {}  # type: Dict[str, float]
+		self.__attachment_file_path_and_sha256_per_attachment_uuid = {}  # type: Dict[str, Tuple[str, str]]
+		self.__upload_per_attachment_uuid = {}  # type: Dict[str, Tuple[int, str, Semaphore]]
+		self.__uploaded_file_path_per_attachment_uuid = {}  # type: Dict[str, str]
+		self.__upload_expiry_time_per_attachment_uuid = {}  # type: Dict[str, float]
+		self.__attachments_semaphore = Semaphore()
+		self.__next_remove_expired_time = time.monotonic()
+
+		if self.__upload_directory_path is not None:
+			self.__restore_uploads()
+
+	def get_maximum_attachment_size_bytes(self) -> int:
+		return self.__maximum_attachment_size_bytes
+
+	def service_actions(self):
+		# called between requests by serve_forever, so that attachments nobody claims are released even when no further put arrives
+		if time.monotonic() >= self.__next_remove_expired_time:
+			self.__attachments_semaphore.acquire()
+			try:
+				self.__remove_expired_attachments()
+				if self.__upload_directory_path is not None:
+					self.__remove_expired_uploads()
+			finally:
+				self.__attachments_semaphore.release()
+			self.__next_remove_expired_time = time.monotonic() + 1.0
+
+	def __remove_expired_attachments(self):
+		# expects the attachments semaphore to be held
+		remove_time = time.monotonic()
+		expired_attachment_uuids = [expired_attachment_uuid for expired_attachment_uuid, expiry_time in self.__expiry_time_per_attachment_uuid.items() if expiry_time <= remove_time]  # type: List[str]
+		for expired_attachment_uuid in expired_attachment_uuids:
+			del self.__expiry_time_per_attachment_uuid[expired_attachment_uuid]
+			del self.__attachment_bytes_per_attachment_uuid[expired_attachment_uuid]
+
+	def put_attachment(self, *, attachment_uuid: str, attachment_bytes: bytearray):
+		# an upload is held until the message that refers to it arrives, and is forgotten if that message never does
+		self.__attachments_semaphore.acquire()
+		try:
+			self.__remove_expired_attachments()
+			self.__attachment_bytes_per_attachment_uuid[attachment_uuid] = attachment_bytes
+			self.__expiry_time_per_attachment_uuid[attachment_uuid] = time.monotonic() + self.__uploaded_attachment_expiry_seconds
+		finally:
+			self.__attachments_semaphore.release()
+
+	def pop_attachment(self, *, attachment_uuid: str) -> bytearray or None:
+		self.__attachments_semaphore.acquire()
+		try:
+			self.__expiry_time_per_attachment_uuid.pop(attachment_uuid, None)
+			return self.__attachment_bytes_per_attachment_uuid.pop(attachment_uuid, None)
+		finally:
+			self.__attachments_semaphore.release()
+
+	def add_attachment(self, *, attachment_uuid: str, attachment_bytes: bytes):
+		# an added attachment is served to any number of receivers until it is removed
+		self.__attachments_semaphore.acquire()
+		try:
+			self.__attachment_bytes_per_attachment_uuid[attachment_uuid] = attachment_bytes
+		finally:
+			self.__attachments_semaphore.release()
+
+	def add_attachment_file(self, *, attachment_uuid: str, attachment_file_path: str, attachment_sha256: str):
+		# served straight from the file, which must not change until the attachment is removed
+		self.__attachments_semaphore.acquire()
+		try:
+			self.__attachment_file_path_and_sha256_per_attachment_uuid[attachment_uuid] = (attachment_file_path, attachment_sha256)
+		finally:
+			self.__attachments_semaphore.release()
+
+	def get_attachment_file_path_and_sha256(self, *, attachment_uuid: str) -> Tuple[str, str] or None:
+		self.__attachments_semaphore.acquire()
+		try:
+			return self.__attachment_file_path_and_sha256_per_attachment_uuid.get(attachment_uuid, None)
+		finally:
+			self.__attachments_semaphore.release()
+
+	def remove_attachment(self, *, attachment_uuid: str):
+		self.__attachments_semaphore.acquire()
+		try:
+			self.__expiry_time_per_attachment_uuid.pop(attachment_uuid, None)
+			self.__attachment_bytes_per_attachment_uuid.pop(attachment_uuid, None)
+			self.__attachment_file_path_and_sha256_per_attachment_uuid.pop(attachment_uuid, None)
+		finally:
+			self.__attachments_semaphore.release()
+
+	def get_attachment(self, *, attachment_uuid: str) -> bytes or bytearray or None:
+		self.__attachments_semaphore.acquire()
+		try:
+			return self.__attachment_bytes_per_attachment_uuid.get(attachment_uuid, None)
+		finally:
+			self.__attachments_semaphore.release()
+
+	def __get_upload_file_path(self, *, attachment_uuid: str, is_committed: bool) -> str:
+		# parsed so that an attachment uuid can never name a path outside of the upload directory
+		return os.path.join(self.__upload_directory_path, f"{uuid.UUID(attachment_uuid)}.{'upload' if is_committed else 'part'}")
+
+	def __get_upload_state_file_path(self, *, attachment_uuid: str) -> str:
+		return os.path.join(self.__upload_directory_path, f"{uuid.UUID(attachment_uuid)}.json")
+
+	def __restore_uploads(self):
+		# partial uploads outlive a restart so that their senders resume them, while a committed one was never claimed and is discarded
+		stale_time = time.time() - self.__uploaded_attachment_expiry_seconds
+		restored_attachment_uuids = []  # type: List[str]
+		for file_name in os.listdir(self.__upload_directory_path):
+			attachment_uuid, _, file_extension = file_name.partition(".")
+			if file_extension == "part" and os.path.getmtime(os.path.join(self.__upload_directory_path, file_name)) > stale_time and os.path.exists(os.path.join(self.__upload_directory_path, f"{attachment_uuid}.json")):
+				restored_attachment_uuids.append(attachment_uuid)
+		for file_name in os.listdir(self.__upload_directory_path):
+			if file_name.partition(".")[0] not in restored_attachment_uuids:
+				os.remove(os.path.join(self.__upload_directory_path, file_name))
+		for attachment_uuid in restored_attachment_uuids:
+			self.__upload_expiry_time_per_attachment_uuid[attachment_uuid] = time.monotonic() + self.__uploaded_attachment_expiry_seconds
+
+	def __remove_expired_uploads(self):
+		# expects the attachments semaphore to be held
+		remove_time = time.monotonic()
+		expired_attachment_uuids = [expired_attachment_uuid for expired_attachment_uuid, expiry_time in self.__upload_expiry_time_per_attachment_uuid.items() if expiry_time <= remove_time]  # type: List[str]
+		for expired_attachment_uuid in expired_attachment_uuids:
+			del self.__upload_expiry_time_per_attachment_uuid[expired_attachment_uuid]
+			self.__upload_per_attachment_uuid.pop(expired_attachment_uuid, None)
+			self.__uploaded_file_path_per_attachment_uuid.pop(expired_attachment_uuid, None)
+			for is_committed in [False, True]:
+				upload_file_path = self.__get_upload_file_path(
+					attachment_uuid=expired_attachment_uuid,
+					is_committed=is_committed
+				)
+				if os.path.exists(upload_file_path):
+					os.remove(upload_file_path)
+			upload_state_file_path = self.__get_upload_state_file_path(
+				attachment_uuid=expired_attachment_uuid
+			)
+			if os.path.exists(upload_state_file_path):
+				os.remove(upload_state_file_path)
+
+	def begin_upload(self, *, attachment_uuid: str, total_size_bytes: int, sha256: str) -> int or None:
+		# a chunked upload is appended to a file as it arrives, and beginning it again resumes from what has already been written
+		if self.__upload_directory_path is None or total_size_bytes > self.__maximum_attachment_size_bytes:
+			return None
+		upload_file_path = self.__get_upload_file_path(
+			attachment_uuid=attachment_uuid,
+			is_committed=False
+		)
+		upload_state_file_path = self.__get_upload_state_file_path(
+			attachment_uuid=attachment_uuid
+		)
+		self.__attachments_semaphore.acquire()
+		try:
+			self.__remove_expired_uploads()
+			upload = self.__upload_per_attachment_uuid.get(attachment_uuid, None)
+			if upload is None and attachment_uuid in self.__upload_expiry_time_per_attachment_uuid and attachment_uuid not in self.__uploaded_file_path_per_attachment_uuid and os.path.exists(upload_state_file_path):
+				# begun before a restart, and resumed if it is still the same file
+				with open(upload_state_file_path, "r") as file_handle:
+					upload_state_json = json.load(file_handle)
+				if upload_state_json["total_size_bytes"] == total_size_bytes and upload_state_json["sha256"] == sha256:
+					upload = (total_size_bytes, sha256, Semaphore())
+					self.__upload_per_attachment_uuid[attachment_uuid] = upload
+			if upload is None or upload[0] != total_size_bytes or upload[1] != sha256:
+				upload = (total_size_bytes, sha256, Semaphore())
+				self.__upload_per_attachment_uuid[attachment_uuid] = upload
+				with open(upload_state_file_path, "w") as file_handle:
+					json.dump({
+						"total_size_bytes": total_size_bytes,
+						"sha256": sha256
+					}, file_handle)
+				with open(upload_file_path, "wb"):
+					pass
+			self.__upload_expiry_time_per_attachment_uuid[attachment_uuid] = time.monotonic() + self.__uploaded_attachment_expiry_seconds
+		finally:
+			self.__attachments_semaphore.release()
+		upload[2].acquire()
+		try:
+			return os.path.getsize(upload_file_path)
+		finally:
+			upload[2].release()
+
+	def put_upload_chunk(self, *, attachment_uuid: str, offset: int, chunk_bytes: bytearray) -> int or None:
+		self.__attachments_semaphore.acquire()
+		try:
+			upload = self.__upload_per_attachment_uuid.get(attachment_uuid, None)
+			if upload is not None:
+				self.__upload_expiry_time_per_attachment_uuid[attachment_uuid] = time.monotonic() + self.__uploaded_attachment_expiry_seconds
+		finally:
+			self.__attachments_semaphore.release()
+		if upload is None:
+			return None
+		upload_file_path = self.__get_upload_file_path(
+			attachment_uuid=attachment_uuid,
+			is_committed=False
+		)
+		upload[2].acquire()
+		try:
+			upload_offset = os.path.getsize(upload_file_path)
+			if offset != upload_offset or upload_offset + len(chunk_bytes) > upload[0]:
+				return upload_offset
+			with open(upload_file_path, "ab") as file_handle:
+				file_handle.write(chunk_bytes)
+			return upload_offset + len(chunk_bytes)
+		finally:
+			upload[2].release()
+
+	def commit_upload(self, *, attachment_uuid: str) -> bool:
+		self.__attachments_semaphore.acquire()
+		try:
+			upload = self.__upload_per_attachment_uuid.get(attachment_uuid, None)
+		finally:
+			self.__attachments_semaphore.release()
+		if upload is None:
+			return False
+		upload_file_path = self.__get_upload_file_path(
+			attachment_uuid=attachment_uuid,
+			is_committed=False
+		)
+		uploaded_file_path = self.__get_upload_file_path(
+			attachment_uuid=attachment_uuid,
+			is_committed=True
+		)
+		upload[2].acquire()
+		try:
+			if os.path.getsize(upload_file_path) != upload[0]:
+				return False
+			upload_hash = hashlib.sha256()
+			with open(upload_file_path, "rb") as file_handle:
+				for chunk_bytes in iter(partial(file_handle.read, 1024 * 1024), b""):
+					upload_hash.update(chunk_bytes)
+			if upload_hash.hexdigest() != upload[1]:
+				# the written bytes cannot be trusted, so the upload starts over
+				with open(upload_file_path, "wb"):
+					pass
+				return False
+			os.replace(upload_file_path, uploaded_file_path)
+			os.remove(self.__get_upload_state_file_path(
+				attachment_uuid=attachment_uuid
+			))
+		finally:
+			upload[2].release()
+		self.__attachments_semaphore.acquire()
+		try:
+			self.__upload_per_attachment_uuid.pop(attachment_uuid, None)
+			self.__uploaded_file_path_per_attachment_uuid[attachment_uuid] = uploaded_file_path
+			self.__upload_expiry_time_per_attachment_uuid[attachment_uuid] = time.monotonic() + self.__uploaded_attachment_expiry_seconds
+		finally:
+			self.__attachments_semaphore.release()
+		return True
+
+	def pop_uploaded_attachment_file_path(self, *, attachment_uuid: str) -> str or None:
+		# the caller takes ownership of the committed file
+		self.__attachments_semaphore.acquire()
+		try:
+			self.__upload_expiry_time_per_attachment_uuid.pop(attachment_uuid, None)
+			return self.__uploaded_file_path_per_attachment_uuid.pop(attachment_uuid, None)
+		finally:
+			self.__attachments_semaphore.release()
+
+
+class AttachmentClient():
+
+	def __init__(self, *, host_address: str, host_port: int, timeout_seconds: float = 60.0, maximum_attachment_size_bytes: int = 2**30):
+
+		self.__host_address = host_address
+		self.__host_port = host_port
+		self.__timeout_seconds = timeout_seconds
+		self.__maximum_attachment_size_bytes = maximum_attachment_size_bytes
+
+		self.__connection_socket = None  # type: socket.socket
+		self.__connection_socket_semaphore = Semaphore()
+
+	def __send_attachment_request(self, *, header_json: Dict, attachment_bytes: bytes or bytearray or None, receive_response_method: Callable[[socket.socket], object] = None) -> Tuple[Dict, bytearray or None] or object:
+
+		# the connection is reused between requests, so a request that fails on a connection the server has since closed is retried once on a new one
+		self.__connection_socket_semaphore.acquire()
+		try:
+			for attempt_index in range(2):
+				if self.__connection_socket is None:
+					self.__connection_socket = socket.create_connection((self.__host_address, self.__host_port), timeout=self.__timeout_seconds)
+					self.__connection_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+				try:
+					send_attachment_frame(
+						connection_socket=self.__connection_socket,
+						header_json=header_json,
+						attachment_bytes=attachment_bytes
+					)
+					if receive_response_method is not None:
+						return receive_response_method(self.__connection_socket)
+					return receive_attachment_frame(
+						connection_socket=self.__connection_socket,
+						maximum_attachment_size_bytes=self.__maximum_attachment_size_bytes
+					)
+				except OSError:
+					self.__connection_socket.close()
+					self.__connection_socket = None
+					if attempt_index != 0:
+						raise
+		finally:
+			self.__connection_socket_semaphore.release()
+
+	def put_attachment(self, *, attachment_uuid: str, attachment_bytes: bytes or bytearray):
+		response_header_json, _ = self.__send_attachment_request(
+			header_json={
+				"operation": AttachmentOperationEnum.Put.value,
+				"attachment_uuid": attachment_uuid,
+				"size_bytes": len(attachment_bytes)
+			},
+			attachment_bytes=attachment_bytes
+		)
+		if not response_header_json["is_successful"]:
+			raise Exception(f"Failed to put attachment {attachment_uuid}.")
+
+	def put_attachment_file(self, *, attachment_uuid: str, file_path: str, chunk_size_bytes: int = 1024 * 1024, maximum_attempt_total: int = 5):
+
+		# only chunks the server has acknowledged are kept, so a dropped connection resumes from the last one instead of starting over
+		file_hash = hashlib.sha256()
+		with open(file_path, "rb") as file_handle:
+			for chunk_bytes in iter(partial(file_handle.read, chunk_size_bytes), b""):
+				file_hash.update(chunk_bytes)
+		total_size_bytes = os.path.getsize(file_path)
+
+		with open(file_path, "rb") as file_handle:
+			attempt_index = 0
+			while True:
+				try:
+					response_header_json, _ = self.__send_attachment_request(
+						header_json={
+							"operation": AttachmentOperationEnum.BeginUpload.value,
+							"attachment_uuid": attachment_uuid,
+							"total_size_bytes": total_size_bytes,
+							"sha256": file_hash.hexdigest()
+						},
+						attachment_bytes=None
+					)
+					if not response_header_json["is_successful"]:
+						raise Exception(f"Failed to begin upload of attachment {attachment_uuid}.")
+					upload_offset = response_header_json["offset"]
+					while upload_offset < total_size_bytes:
+						file_handle.seek(upload_offset)
+						chunk_bytes = file_handle.read(chunk_size_bytes)
+						response_header_json, _ = self.__send_attachment_request(
+							header_json={
+								"operation": AttachmentOperationEnum.PutUploadChunk.value,
+								"attachment_uuid": attachment_uuid,
+								"offset": upload_offset,
+								"size_bytes": len(chunk_bytes)
+							},
+							attachment_bytes=chunk_bytes
+						)
+						if response_header_json["offset"] is None:
+							raise Exception(f"Failed to find upload of attachment {attachment_uuid}.")
+						if not response_header_json["is_successful"] and response_header_json["offset"] == upload_offset:
+							raise Exception(f"Failed to put chunk at offset {upload_offset} of attachment {attachment_uuid}.")
+						upload_offset = response_header_json["offset"]
+					response_header_json, _ = self.__send_attachment_request(
+						header_json={
+							"operation": AttachmentOperationEnum.CommitUpload.value,
+							"attachment_uuid": attachment_uuid
+						},
+						attachment_bytes=None
+					)
+					if response_header_json["is_successful"]:
+						return
+					# the server discards bytes that do not match the checksum, so the next attempt starts over from the beginning
+					attempt_index += 1
+					if attempt_index == maximum_attempt_total:
+						raise Exception(f"Failed to commit upload of attachment {attachment_uuid}.")
+				except OSError:
+					attempt_index += 1
+					if attempt_index == maximum_attempt_total:
+						raise
+					time.sleep(min(2.0 ** attempt_index, 30.0))
+
+	def get_attachment(self, *, attachment_uuid: str) -> bytearray:
+		response_header_json, attachment_bytes = self.__send_attachment_request(
+			header_json={
+				"operation": AttachmentOperationEnum.Get.value,
+				"attachment_uuid": attachment_uuid
+			},
+			attachment_bytes=None
+		)
+		if not response_header_json["is_successful"]:
+			raise Exception(f"Failed to find attachment {attachment_uuid}.")
+		return attachment_bytes
+
+	def get_attachment_file(self, *, attachment_uuid: str, file_path: str, chunk_size_bytes: int = 1024 * 1024) -> str:
+
+		# the file only appears at its path once all of it has arrived and matches its checksum, and its sha256 is returned
+		temporary_file_path = f"{file_path}.{uuid.uuid4()}.tmp"
+
+		def receive_response(connection_socket: socket.socket) -> Tuple[Dict, str or None]:
+			response_header_json = receive_attachment_header(
+				connection_socket=connection_socket
+			)
+			if not response_header_json["is_successful"]:
+				return response_header_json, None
+			with open(temporary_file_path, "wb") as file_handle:
+				attachment_sha256 = receive_attachment_file(
+					connection_socket=connection_socket,
+					size_bytes=response_header_json["size_bytes"],
+					file_handle=file_handle,
+					chunk_size_bytes=chunk_size_bytes
+				)
+				file_handle.flush()
+				os.fsync(file_handle.fileno())
+			return response_header_json, attachment_sha256
+
+		try:
+			response_header_json, attachment_sha256 = self.__send_attachment_request(
+				header_json={
+					"operation": AttachmentOperationEnum.Get.value,
+					"attachment_uuid": attachment_uuid
+				},
+				attachment_bytes=None,
+				receive_response_method=receive_response
+			)
+			if not response_header_json["is_successful"]:
+				raise Exception(f"Failed to find attachment {attachment_uuid}.")
+			if "sha256" in response_header_json and response_header_json["sha256"] != attachment_sha256:
+				raise Exception(f"Attachment {attachment_uuid} failed its checksum.")
+			os.replace(temporary_file_path, file_path)
+		finally:
+			if os.path.exists(temporary_file_path):
+				os.remove(temporary_file_path)
+
+		return attachment_sha256
+
+	def dispose(self):
+		self.__connection_socket_semaphore.acquire()
+		try:
+			if self.__connection_socket is not None:
+				self.__connection_socket.close()
+				self.__connection_socket = None
+		finally:
+			self.__connection_socket_semaphore.release()
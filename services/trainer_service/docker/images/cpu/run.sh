@@ -10,6 +10,14 @@ docker run \
   -e label_classes_total=2 \
   -e image_source_port=32854 \
   -e detector_port=32856 \
+  -e is_quantization_enabled=false \
+  -e quantization_calibration_image_total=100 \
+  -e attachment_port=32858 \
+  -e training_image_total_threshold=10 \
+  -e minimum_training_interval_seconds=600 \
+  -e model_broadcast_thread_total=8 \
+  -e model_broadcast_timeout_seconds=300 \
+  -e attachment_advertised_host_address=$(hostname -I | cut -d' ' -f1) \
   -v $HOME/Projects_Unversioned/YoloV5Service/trainer/temp_images:/app/temp_images \
   -v $HOME/Projects_Unversioned/YoloV5Service/trainer/training:/app/training \
   -v $HOME/Projects_Unversioned/YoloV5Service/trainer/validation:/app/validation \
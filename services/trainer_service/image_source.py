@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import List, Tuple, Dict, Type
+from typing import List, Tuple, Dict, Type, Set
 from abc import ABC, abstractmethod
 import json
 from collections import deque
@@ -10,14 +10,17 @@ from datetime import datetime
 import inspect
 import time
 import base64
+import threading
 from austin_heller_repo.socket_queued_message_framework import SourceTypeEnum, ClientServerMessage, ClientServerMessageTypeEnum, StructureStateEnum, StructureTransitionException, Structure, StructureFactory, StructureInfluence, ClientSocketFactory, ClientMessengerFactory
 from austin_heller_repo.threading import Semaphore, start_thread
 from austin_heller_repo.common import StringEnum, SubprocessWrapper, is_directory_empty
 
 try:
-	from .trainer import AddImageAnnouncementTrainerClientServerMessage, ImageUsageTypeEnum, TrainerClientServerMessage, TrainerClientServerMessageTypeEnum
+	from .trainer import AddImageAnnouncementTrainerClientServerMessage, ImageUsageTypeEnum, TrainerClientServerMessage, TrainerClientServerMessageTypeEnum, AttachmentEndpointAnnouncementTrainerClientServerMessage, TrainModelRequestTrainerClientServerMessage, AddImageBatchAnnouncementTrainerClientServerMessage, AddImageBatchAcknowledgementTrainerClientServerMessage
+	from .attachment import AttachmentClient
 except ImportError:
-	from trainer import AddImageAnnouncementTrainerClientServerMessage, ImageUsageTypeEnum, TrainerClientServerMessage, TrainerClientServerMessageTypeEnum
+	from trainer import AddImageAnnouncementTrainerClientServerMessage, ImageUsageTypeEnum, TrainerClientServerMessage, TrainerClientServerMessageTypeEnum, AttachmentEndpointAnnouncementTrainerClientServerMessage, TrainModelRequestTrainerClientServerMessage, AddImageBatchAnnouncementTrainerClientServerMessage, AddImageBatchAcknowledgementTrainerClientServerMessage
+	from attachment import AttachmentClient
 
 
 class ImageSourceSourceTypeEnum(SourceTypeEnum):
@@ -35,66 +38,245 @@ class TrainerStructureStateEnum(StructureStateEnum):
 
 class TrainerStructure(Structure):
 
-	def __init__(self, *, source_uuid: str):
+	def __init__(self, *, source_uuid: str, chunked_upload_minimum_size_bytes: int):
 		super().__init__(
 			states=TrainerStructureStateEnum,
 			initial_state=TrainerStructureStateEnum.Active
 		)
 
 		self.__source_uuid = source_uuid
+		self.__chunked_upload_minimum_size_bytes = chunked_upload_minimum_size_bytes
+
+		self.__attachment_client = None  # type: AttachmentClient
+
+	def set_attachment_client(self, *, attachment_client: AttachmentClient):
+		self.__attachment_client = attachment_client
 
 	def on_client_connected(self, *, source_uuid: str, source_type: SourceTypeEnum, tag_json: Dict or None):
 		raise Exception(f"Unexpected connection from source {source_type.value}")
 
-	def send_training_image(self, *, image_bytes: bytes, image_extension: str, annotation_bytes: bytes):
+	def __send_image(self, *, image_bytes: bytes, image_extension: str, annotation_bytes: bytes, image_usage_type: ImageUsageTypeEnum):
+		attachment_client = self.__attachment_client
+		if attachment_client is not None:
+			# the image travels as raw bytes over the attachment connection and the announcement only refers to it
+			image_attachment_uuid = str(uuid.uuid4())
+			try:
+				attachment_client.put_attachment(
+					attachment_uuid=image_attachment_uuid,
+					attachment_bytes=image_bytes
+				)
+			except Exception as ex:
+				print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: falling back to base64 after failing to upload attachment: {ex}")
+				self.__attachment_client = None
+				attachment_client.dispose()
+			else:
+				self.send_client_server_message(
+					client_server_message=AddImageAnnouncementTrainerClientServerMessage(
+						image_bytes_base64string=None,
+						image_extension=image_extension,
+						annotation_bytes_base64string=base64.b64encode(annotation_bytes).decode(),
+						image_usage_type_string=image_usage_type.value,
+						destination_uuid=self.__source_uuid,
+						image_attachment_uuid=image_attachment_uuid
+					)
+				)
+				return
 		self.send_client_server_message(
 			client_server_message=AddImageAnnouncementTrainerClientServerMessage(
 				image_bytes_base64string=base64.b64encode(image_bytes).decode(),
 				image_extension=image_extension,
 				annotation_bytes_base64string=base64.b64encode(annotation_bytes).decode(),
-				image_usage_type_string=ImageUsageTypeEnum.Training.value,
+				image_usage_type_string=image_usage_type.value,
 				destination_uuid=self.__source_uuid
 			)
 		)
 
+	def send_image_file(self, *, image_file_path: str, annotation_bytes: bytes, image_usage_type: ImageUsageTypeEnum):
+		image_extension = os.path.splitext(image_file_path)[1]
+		attachment_client = self.__attachment_client
+		if attachment_client is not None and os.path.getsize(image_file_path) >= self.__chunked_upload_minimum_size_bytes:
+			# a large image is uploaded in resumable chunks straight from its file rather than held in memory on either side
+			image_attachment_uuid = str(uuid.uuid4())
+			try:
+				attachment_client.put_attachment_file(
+					attachment_uuid=image_attachment_uuid,
+					file_path=image_file_path
+				)
+			except Exception as ex:
+				print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: falling back to a single upload after failing to upload chunks: {ex}")
+			else:
+				self.send_client_server_message(
+					client_server_message=AddImageAnnouncementTrainerClientServerMessage(
+						image_bytes_base64string=None,
+						image_extension=image_extension,
+						annotation_bytes_base64string=base64.b64encode(annotation_bytes).decode(),
+						image_usage_type_string=image_usage_type.value,
+						destination_uuid=self.__source_uuid,
+						image_attachment_uuid=image_attachment_uuid
+					)
+				)
+				return
+		with open(image_file_path, "rb") as file_handle:
+			image_bytes = file_handle.read()
+		self.__send_image(
+			image_bytes=image_bytes,
+			image_extension=image_extension,
+			annotation_bytes=annotation_bytes,
+			image_usage_type=image_usage_type
+		)
+
+	def send_training_image(self, *, image_bytes: bytes, image_extension: str, annotation_bytes: bytes):
+		self.__send_image(
+			image_bytes=image_bytes,
+			image_extension=image_extension,
+			annotation_bytes=annotation_bytes,
+			image_usage_type=ImageUsageTypeEnum.Training
+		)
+
 	def send_validation_image(self, *, image_bytes: bytes, image_extension: str, annotation_bytes: bytes):
+		self.__send_image(
+			image_bytes=image_bytes,
+			image_extension=image_extension,
+			annotation_bytes=annotation_bytes,
+			image_usage_type=ImageUsageTypeEnum.Validation
+		)
+
+	def send_image_batch(self, *, image_batch_uuid: str, images: List[Tuple[bytes, str, bytes, ImageUsageTypeEnum]]):
+		image_json_dicts = []  # type: List[Dict]
+		for image_bytes, image_extension, annotation_bytes, image_usage_type in images:
+			image_json_dicts.append({
+				"image_extension": image_extension,
+				"annotation_bytes_base64string": base64.b64encode(annotation_bytes).decode(),
+				"image_usage_type_string": image_usage_type.value,
+				"image_size_bytes": len(image_bytes)
+			})
+		attachment_client = self.__attachment_client
+		if attachment_client is not None:
+			# the images of the batch travel back to back as one raw attachment
+			images_attachment_uuid = str(uuid.uuid4())
+			try:
+				attachment_client.put_attachment(
+					attachment_uuid=images_attachment_uuid,
+					attachment_bytes=b"".join([image_bytes for image_bytes, _, _, _ in images])
+				)
+			except Exception as ex:
+				print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: falling back to base64 after failing to upload attachment: {ex}")
+				self.__attachment_client = None
+				attachment_client.dispose()
+			else:
+				self.send_client_server_message(
+					client_server_message=AddImageBatchAnnouncementTrainerClientServerMessage(
+						image_batch_uuid=image_batch_uuid,
+						image_json_dicts=image_json_dicts,
+						destination_uuid=self.__source_uuid,
+						images_attachment_uuid=images_attachment_uuid
+					)
+				)
+				return
+		for image_json_dict, (image_bytes, _, _, _) in zip(image_json_dicts, images):
+			image_json_dict["image_bytes_base64string"] = base64.b64encode(image_bytes).decode()
 		self.send_client_server_message(
-			client_server_message=AddImageAnnouncementTrainerClientServerMessage(
-				image_bytes_base64string=base64.b64encode(image_bytes).decode(),
-				image_extension=image_extension,
-				annotation_bytes_base64string=base64.b64encode(annotation_bytes).decode(),
-				image_usage_type_string=ImageUsageTypeEnum.Validation.value,
+			client_server_message=AddImageBatchAnnouncementTrainerClientServerMessage(
+				image_batch_uuid=image_batch_uuid,
+				image_json_dicts=image_json_dicts,
 				destination_uuid=self.__source_uuid
 			)
 		)
 
+	def send_train_model_request(self):
+		self.send_client_server_message(
+			client_server_message=TrainModelRequestTrainerClientServerMessage(
+				destination_uuid=self.__source_uuid
+			)
+		)
+
+	def dispose(self):
+		super().dispose()
+		if self.__attachment_client is not None:
+			self.__attachment_client.dispose()
+
 
 class ImageSourceStructure(Structure):
 
-	def __init__(self, *, trainer_client_messenger_factory: ClientMessengerFactory):
+	def __init__(self, *, trainer_client_messenger_factory: ClientMessengerFactory, maximum_in_flight_image_batch_total: int = 4, chunked_upload_minimum_size_bytes: int = 16 * 2**20, maximum_image_batch_size_bytes: int = 64 * 2**20):
 		super().__init__(
 			states=ImageSourceStructureStateEnum,
 			initial_state=ImageSourceStructureStateEnum.Active
 		)
 
 		self.__trainer_client_messenger_factory = trainer_client_messenger_factory
+		self.__maximum_in_flight_image_batch_total = maximum_in_flight_image_batch_total
+		self.__chunked_upload_minimum_size_bytes = chunked_upload_minimum_size_bytes
+		self.__maximum_image_batch_size_bytes = maximum_image_batch_size_bytes
 
 		self.__trainer_structure = None  # type: TrainerStructure
+		self.__in_flight_image_batch_uuids = set()  # type: Set[str]
+		self.__added_image_total = 0
+		self.__rejected_image_total = 0
+		self.__image_batch_condition = threading.Condition()
+
+		self.add_transition(
+			client_server_message_type=TrainerClientServerMessageTypeEnum.AddImageBatchAcknowledgement,
+			from_source_type=ImageSourceSourceTypeEnum.Trainer,
+			start_structure_state=ImageSourceStructureStateEnum.Active,
+			end_structure_state=ImageSourceStructureStateEnum.Active,
+			on_transition=self.__trainer_add_image_batch_acknowledgement_transition
+		)
+
+		self.add_transition(
+			client_server_message_type=TrainerClientServerMessageTypeEnum.AttachmentEndpointAnnouncement,
+			from_source_type=ImageSourceSourceTypeEnum.Trainer,
+			start_structure_state=ImageSourceStructureStateEnum.Active,
+			end_structure_state=ImageSourceStructureStateEnum.Active,
+			on_transition=self.__trainer_attachment_endpoint_announcement_transition
+		)
 
 		self.__initialize()
 
 	def __initialize(self):
 
+		# a trainer that supports attachments answers with its attachment endpoint, while an older one ignores the tag
 		self.connect_to_outbound_messenger(
 			client_messenger_factory=self.__trainer_client_messenger_factory,
 			source_type=ImageSourceSourceTypeEnum.Trainer,
-			tag_json=None
+			tag_json={
+				"is_attachment_supported": True
+			}
 		)
 
+	def __trainer_attachment_endpoint_announcement_transition(self, structure_influence: StructureInfluence):
+
+		client_server_message = structure_influence.get_client_server_message()
+		if not isinstance(client_server_message, AttachmentEndpointAnnouncementTrainerClientServerMessage):
+			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
+		else:
+			self.__trainer_structure.set_attachment_client(
+				attachment_client=AttachmentClient(
+					host_address=client_server_message.get_host_address(),
+					host_port=client_server_message.get_host_port()
+				)
+			)
+
+	def __trainer_add_image_batch_acknowledgement_transition(self, structure_influence: StructureInfluence):
+
+		client_server_message = structure_influence.get_client_server_message()
+		if not isinstance(client_server_message, AddImageBatchAcknowledgementTrainerClientServerMessage):
+			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
+		else:
+			self.__image_batch_condition.acquire()
+			try:
+				self.__in_flight_image_batch_uuids.discard(client_server_message.get_image_batch_uuid())
+				self.__added_image_total += client_server_message.get_added_image_total()
+				self.__rejected_image_total += client_server_message.get_image_total() - client_server_message.get_added_image_total()
+				self.__image_batch_condition.notify_all()
+			finally:
+				self.__image_batch_condition.release()
+
 	def on_client_connected(self, *, source_uuid: str, source_type: SourceTypeEnum, tag_json: Dict or None):
 		if source_type == ImageSourceSourceTypeEnum.Trainer:
 			self.__trainer_structure = TrainerStructure(
-				source_uuid=source_uuid
+				source_uuid=source_uuid,
+				chunked_upload_minimum_size_bytes=self.__chunked_upload_minimum_size_bytes
 			)
 			self.register_child_structure(
 				structure=self.__trainer_structure
@@ -103,25 +285,99 @@ class ImageSourceStructure(Structure):
 			raise Exception(f"Unexpected connection from source {source_type.value}")
 
 	def send_training_image(self, *, image_file_path: str, annotation_file_path: str):
-		with open(image_file_path, "rb") as file_handle:
-			image_bytes = file_handle.read()
 		with open(annotation_file_path, "rb") as file_handle:
 			annotation_bytes = file_handle.read()
-		image_extension = os.path.splitext(image_file_path)[1]
-		self.__trainer_structure.send_training_image(
-			image_bytes=image_bytes,
-			image_extension=image_extension,
-			annotation_bytes=annotation_bytes
+		self.__trainer_structure.send_image_file(
+			image_file_path=image_file_path,
+			annotation_bytes=annotation_bytes,
+			image_usage_type=ImageUsageTypeEnum.Training
 		)
 
 	def send_validation_image(self, *, image_file_path: str, annotation_file_path: str):
-		with open(image_file_path, "rb") as file_handle:
-			image_bytes = file_handle.read()
 		with open(annotation_file_path, "rb") as file_handle:
 			annotation_bytes = file_handle.read()
-		image_extension = os.path.splitext(image_file_path)[1]
-		self.__trainer_structure.send_validation_image(
-			image_bytes=image_bytes,
-			image_extension=image_extension,
-			annotation_bytes=annotation_bytes
+		self.__trainer_structure.send_image_file(
+			image_file_path=image_file_path,
+			annotation_bytes=annotation_bytes,
+			image_usage_type=ImageUsageTypeEnum.Validation
 		)
+
+	def send_image_batch(self, *, image_file_paths: List[Tuple[str, str or None, ImageUsageTypeEnum]]):
+
+		# split by size so that neither the joined attachment nor its base64 fallback grows with the number of images
+		images = []  # type: List[Tuple[bytes, str, bytes, ImageUsageTypeEnum]]
+		images_size_bytes = 0
+		for image_file_path, annotation_file_path, image_usage_type in image_file_paths:
+			with open(image_file_path, "rb") as file_handle:
+				image_bytes = file_handle.read()
+			if annotation_file_path is None:
+				# an image without labels is a background image
+				annotation_bytes = b""
+			else:
+				with open(annotation_file_path, "rb") as file_handle:
+					annotation_bytes = file_handle.read()
+			if images and images_size_bytes + len(image_bytes) + len(annotation_bytes) > self.__maximum_image_batch_size_bytes:
+				self.__send_image_batch(
+					images=images
+				)
+				images = []
+				images_size_bytes = 0
+			images.append((image_bytes, os.path.splitext(image_file_path)[1], annotation_bytes, image_usage_type))
+			images_size_bytes += len(image_bytes) + len(annotation_bytes)
+
+		if images:
+			self.__send_image_batch(
+				images=images
+			)
+
+	def __send_image_batch(self, *, images: List[Tuple[bytes, str, bytes, ImageUsageTypeEnum]]):
+
+		# the next batch is read while earlier ones are in flight, and sending waits once too many are unacknowledged
+		image_batch_uuid = str(uuid.uuid4())
+		self.__image_batch_condition.acquire()
+		try:
+			while len(self.__in_flight_image_batch_uuids) >= self.__maximum_in_flight_image_batch_total:
+				self.__image_batch_condition.wait()
+			self.__in_flight_image_batch_uuids.add(image_batch_uuid)
+		finally:
+			self.__image_batch_condition.release()
+
+		try:
+			self.__trainer_structure.send_image_batch(
+				image_batch_uuid=image_batch_uuid,
+				images=images
+			)
+		except Exception:
+			# a batch that never reached the trainer will never be acknowledged
+			self.__image_batch_condition.acquire()
+			try:
+				self.__in_flight_image_batch_uuids.discard(image_batch_uuid)
+				self.__image_batch_condition.notify_all()
+			finally:
+				self.__image_batch_condition.release()
+			raise
+
+	def wait_for_image_batches(self, *, timeout_seconds: float = None) -> bool:
+		timeout_time = None if timeout_seconds is None else time.monotonic() + timeout_seconds
+		self.__image_batch_condition.acquire()
+		try:
+			while self.__in_flight_image_batch_uuids:
+				if timeout_time is None:
+					self.__image_batch_condition.wait()
+				else:
+					remaining_seconds = timeout_time - time.monotonic()
+					if remaining_seconds <= 0:
+						return False
+					self.__image_batch_condition.wait(remaining_seconds)
+			return True
+		finally:
+			self.__image_batch_condition.release()
+
+	def get_added_image_total(self) -> int:
+		return self.__added_image_total
+
+	def get_rejected_image_total(self) -> int:
+		return self.__rejected_image_total
+
+	def send_train_model_request(self):
+		self.__trainer_structure.send_train_model_request()
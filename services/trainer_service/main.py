@@ -11,8 +11,8 @@ except ImportError:
 	from trainer import TrainerStructureFactory, TrainerSourceTypeEnum, TrainerClientServerMessage, TrainerClientServerMessageTypeEnum
 
 
-if len(sys.argv) != 14:
-	print(f"{datetime.utcnow()}: script: Failed to provide expected arguments: main.py [image size integer] [training_batch_size] [training_epochs] [label_classes_total] [training directory path] [validation directory path] [models directory path] [temp images directory path] [scripts directory path] [yolov5 directory path] [host address] [image source port] [detector port]")
+if len(sys.argv) != 22:
+	print(f"{datetime.utcnow()}: script: Failed to provide expected arguments: main.py [image size integer] [training_batch_size] [training_epochs] [label_classes_total] [training directory path] [validation directory path] [models directory path] [temp images directory path] [scripts directory path] [yolov5 directory path] [host address] [image source port] [detector port] [is_quantization_enabled, true or false] [quantization_calibration_image_total] [attachment port, 0 to send payloads as base64] [training image total threshold] [minimum training interval seconds] [model broadcast thread total] [model broadcast timeout seconds] [attachment advertised host address, as reachable by image sources and detectors]")
 else:
 
 	image_size = int(sys.argv[1])
@@ -28,6 +28,14 @@ else:
 	host_address = sys.argv[11]
 	image_source_port = int(sys.argv[12])
 	detector_port = int(sys.argv[13])
+	is_quantization_enabled = sys.argv[14].lower() == "true"
+	quantization_calibration_image_total = int(sys.argv[15])
+	attachment_port = int(sys.argv[16])
+	training_image_total_threshold = int(sys.argv[17])
+	minimum_training_interval_seconds = float(sys.argv[18])
+	model_broadcast_thread_total = int(sys.argv[19])
+	model_broadcast_timeout_seconds = float(sys.argv[20])
+	attachment_advertised_host_address = sys.argv[21]
 
 	if training_directory_path[-1] == "/":
 		training_directory_path = training_directory_path[:-1]
@@ -93,6 +101,15 @@ else:
 			image_size=image_size,
 			training_batch_size=training_batch_size,
 			training_epochs=training_epochs,
+			is_quantization_enabled=is_quantization_enabled,
+			quantization_calibration_image_total=quantization_calibration_image_total,
+			attachment_host_address=host_address,
+			attachment_advertised_host_address=attachment_advertised_host_address,
+			attachment_port=attachment_port,
+			training_image_total_threshold=training_image_total_threshold,
+			minimum_training_interval_seconds=minimum_training_interval_seconds,
+			model_broadcast_thread_total=model_broadcast_thread_total,
+			model_broadcast_timeout_seconds=model_broadcast_timeout_seconds,
 			is_debug=True
 		),
 		is_debug=False
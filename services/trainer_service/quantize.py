@@ -0,0 +1,142 @@
+from __future__ import annotations
+from typing import List, Dict
+import json
+import os
+import sys
+import random
+import shutil
+
+
+class ValidationImageCalibrationDataReader():
+
+	def __init__(self, *, image_file_paths: List[str], image_size: int, input_name: str):
+
+		self.__image_file_paths = image_file_paths
+		self.__image_size = image_size
+		self.__input_name = input_name
+
+		self.__image_index = 0
+
+	def get_next(self) -> Dict or None:
+
+		import cv2
+		import numpy as np
+		from utils.augmentations import letterbox
+
+		while self.__image_index < len(self.__image_file_paths):
+			image = cv2.imread(self.__image_file_paths[self.__image_index])
+			self.__image_index += 1
+			if image is not None:
+				# prepared exactly as the detector prepares an image so that the activation ranges match what it will see
+				letterboxed_image = letterbox(image, self.__image_size, auto=False)[0]
+				letterboxed_image = np.ascontiguousarray(letterboxed_image.transpose((2, 0, 1))[::-1])
+				return {
+					self.__input_name: np.expand_dims(letterboxed_image, 0).astype(np.float32) / 255.0
+				}
+		return None
+
+	def rewind(self):
+		self.__image_index = 0
+
+
+def get_validation_report(*, weights_file_path: str, data_file_path: str, image_size: int) -> Dict:
+
+	import val
+
+	# the per-image speeds are measured on the host running the report, so they compare models rather than predict detector latency
+	(precision, recall, map50, map50_95, *_), _, (preprocess_milliseconds, inference_milliseconds, nms_milliseconds) = val.run(
+		data=data_file_path,
+		weights=weights_file_path,
+		imgsz=image_size,
+		batch_size=1,
+		device="cpu",
+		task="val",
+		plots=False
+	)
+	return {
+		"file_size_bytes": os.path.getsize(weights_file_path),
+		"precision": float(precision),
+		"recall": float(recall),
+		"map50": float(map50),
+		"map50_95": float(map50_95),
+		"preprocess_milliseconds": float(preprocess_milliseconds),
+		"inference_milliseconds": float(inference_milliseconds),
+		"nms_milliseconds": float(nms_milliseconds)
+	}
+
+
+if __name__ == "__main__":
+
+	if len(sys.argv) != 9:
+		print(f"Failed to provide expected arguments: quantize.py [yolov5 directory path] [weights file path] [data file path] [validation images directory path] [image size integer] [calibration image total] [quantized model file path] [report file path]", file=sys.stderr)
+		sys.exit(1)
+
+	yolov5_directory_path = sys.argv[1]
+	weights_file_path = sys.argv[2]
+	data_file_path = sys.argv[3]
+	validation_images_directory_path = sys.argv[4]
+	image_size = int(sys.argv[5])
+	calibration_image_total = int(sys.argv[6])
+	quantized_model_file_path = sys.argv[7]
+	report_file_path = sys.argv[8]
+
+	if yolov5_directory_path not in sys.path:
+		sys.path.insert(0, yolov5_directory_path)
+
+	import export
+	import onnxruntime
+	from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+
+	# export beside the quantized model so that the weights directory only ever holds the weights
+	float_model_file_path = f"{os.path.splitext(quantized_model_file_path)[0]}.float.onnx"
+	exported_weights_file_path = f"{os.path.splitext(quantized_model_file_path)[0]}.float.pt"
+	shutil.copy(weights_file_path, exported_weights_file_path)
+	try:
+		export.run(
+			weights=exported_weights_file_path,
+			imgsz=(image_size, image_size),
+			include=("onnx",),
+			dynamic=True,
+			device="cpu"
+		)
+	finally:
+		os.remove(exported_weights_file_path)
+
+	try:
+		image_file_paths = [os.path.join(validation_images_directory_path, file_name) for file_name in sorted(os.listdir(validation_images_directory_path))]
+		random.shuffle(image_file_paths)
+
+		input_name = onnxruntime.InferenceSession(float_model_file_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+		quantize_static(
+			float_model_file_path,
+			quantized_model_file_path,
+			ValidationImageCalibrationDataReader(
+				image_file_paths=image_file_paths[:calibration_image_total],
+				image_size=image_size,
+				input_name=input_name
+			),
+			quant_format=QuantFormat.QDQ,
+			per_channel=True,
+			activation_type=QuantType.QUInt8,
+			weight_type=QuantType.QInt8
+		)
+
+		report_json = {
+			"calibration_image_total": min(calibration_image_total, len(image_file_paths)),
+			"float32": get_validation_report(
+				weights_file_path=float_model_file_path,
+				data_file_path=data_file_path,
+				image_size=image_size
+			),
+			"int8": get_validation_report(
+				weights_file_path=quantized_model_file_path,
+				data_file_path=data_file_path,
+				image_size=image_size
+			)
+		}
+	finally:
+		os.remove(float_model_file_path)
+
+	with open(report_file_path, "w") as file_handle:
+		json.dump(report_json, file_handle, indent=4)
@@ -0,0 +1,261 @@
+from __future__ import annotations
+import unittest
+import tempfile
+import hashlib
+import os
+import time
+from ..attachment import AttachmentServer, AttachmentClient
+from austin_heller_repo.threading import start_thread
+
+
+class AttachmentTest(unittest.TestCase):
+
+	def test_attachment_round_trip(self):
+
+		attachment_server = AttachmentServer(
+			host_address="127.0.0.1",
+			host_port=0
+		)
+		start_thread(attachment_server.serve_forever)
+
+		attachment_client = AttachmentClient(
+			host_address="127.0.0.1",
+			host_port=attachment_server.server_address[1]
+		)
+
+		try:
+			image_bytes = bytes(range(256)) * 1024
+
+			attachment_client.put_attachment(
+				attachment_uuid="image",
+				attachment_bytes=image_bytes
+			)
+			self.assertEqual(image_bytes, attachment_server.pop_attachment(attachment_uuid="image"))
+			self.assertIsNone(attachment_server.pop_attachment(attachment_uuid="image"))
+
+			attachment_server.add_attachment(
+				attachment_uuid="model",
+				attachment_bytes=image_bytes
+			)
+			self.assertEqual(image_bytes, attachment_client.get_attachment(attachment_uuid="model"))
+			self.assertEqual(image_bytes, attachment_client.get_attachment(attachment_uuid="model"))
+
+			attachment_server.remove_attachment(
+				attachment_uuid="model"
+			)
+			with self.assertRaises(Exception):
+				attachment_client.get_attachment(attachment_uuid="model")
+		finally:
+			attachment_client.dispose()
+			attachment_server.shutdown()
+			attachment_server.server_close()
+
+	def test_attachment_put_expires_without_further_puts(self):
+
+		attachment_server = AttachmentServer(
+			host_address="127.0.0.1",
+			host_port=0,
+			uploaded_attachment_expiry_seconds=0.1
+		)
+		start_thread(attachment_server.serve_forever)
+
+		attachment_client = AttachmentClient(
+			host_address="127.0.0.1",
+			host_port=attachment_server.server_address[1]
+		)
+
+		try:
+			attachment_client.put_attachment(
+				attachment_uuid="image",
+				attachment_bytes=bytes(range(256)) * 1024
+			)
+
+			# the server releases it on its own once nobody claims it
+			time.sleep(2.0)
+
+			self.assertIsNone(attachment_server.get_attachment(attachment_uuid="image"))
+		finally:
+			attachment_client.dispose()
+			attachment_server.shutdown()
+			attachment_server.server_close()
+
+	def test_attachment_file_streams_to_verified_file(self):
+
+		attachment_server = AttachmentServer(
+			host_address="127.0.0.1",
+			host_port=0
+		)
+		start_thread(attachment_server.serve_forever)
+
+		attachment_client = AttachmentClient(
+			host_address="127.0.0.1",
+			host_port=attachment_server.server_address[1]
+		)
+
+		with tempfile.TemporaryDirectory() as directory_path:
+			try:
+				model_bytes = bytes(range(256)) * 4099
+				model_sha256 = hashlib.sha256(model_bytes).hexdigest()
+				source_file_path = os.path.join(directory_path, "source.pt")
+				with open(source_file_path, "wb") as file_handle:
+					file_handle.write(model_bytes)
+
+				attachment_server.add_attachment_file(
+					attachment_uuid=model_sha256,
+					attachment_file_path=source_file_path,
+					attachment_sha256=model_sha256
+				)
+				destination_file_path = os.path.join(directory_path, "destination.pt")
+				self.assertEqual(model_sha256, attachment_client.get_attachment_file(
+					attachment_uuid=model_sha256,
+					file_path=destination_file_path,
+					chunk_size_bytes=1000
+				))
+				with open(destination_file_path, "rb") as file_handle:
+					self.assertEqual(model_bytes, file_handle.read())
+
+				# a corrupted transfer never replaces the destination file
+				attachment_server.add_attachment_file(
+					attachment_uuid="corrupted",
+					attachment_file_path=source_file_path,
+					attachment_sha256=hashlib.sha256(b"other").hexdigest()
+				)
+				corrupted_file_path = os.path.join(directory_path, "corrupted.pt")
+				with self.assertRaises(Exception):
+					attachment_client.get_attachment_file(
+						attachment_uuid="corrupted",
+						file_path=corrupted_file_path
+					)
+				self.assertEqual(["destination.pt", "source.pt"], sorted(os.listdir(directory_path)))
+			finally:
+				attachment_client.dispose()
+				attachment_server.shutdown()
+				attachment_server.server_close()
+
+	def test_attachment_upload_resumes_from_acknowledged_offset(self):
+
+		with tempfile.TemporaryDirectory() as directory_path:
+			upload_directory_path = os.path.join(directory_path, "uploads")
+			os.makedirs(upload_directory_path)
+
+			attachment_server = AttachmentServer(
+				host_address="127.0.0.1",
+				host_port=0,
+				upload_directory_path=upload_directory_path
+			)
+			start_thread(attachment_server.serve_forever)
+
+			attachment_client = AttachmentClient(
+				host_address="127.0.0.1",
+				host_port=attachment_server.server_address[1]
+			)
+
+			try:
+				image_bytes = bytes(range(256)) * 4099
+				image_file_path = os.path.join(directory_path, "image.png")
+				with open(image_file_path, "wb") as file_handle:
+					file_handle.write(image_bytes)
+				attachment_uuid = "5f0c6a4e-3f5e-4b8e-9a61-0d3c2b1a0f9e"
+
+				# an upload interrupted after its first chunk picks up from there
+				self.assertEqual(0, attachment_server.begin_upload(
+					attachment_uuid=attachment_uuid,
+					total_size_bytes=len(image_bytes),
+					sha256=hashlib.sha256(image_bytes).hexdigest()
+				))
+				self.assertEqual(1000, attachment_server.put_upload_chunk(
+					attachment_uuid=attachment_uuid,
+					offset=0,
+					chunk_bytes=bytearray(image_bytes[:1000])
+				))
+				self.assertEqual(1000, attachment_server.begin_upload(
+					attachment_uuid=attachment_uuid,
+					total_size_bytes=len(image_bytes),
+					sha256=hashlib.sha256(image_bytes).hexdigest()
+				))
+
+				attachment_client.put_attachment_file(
+					attachment_uuid=attachment_uuid,
+					file_path=image_file_path,
+					chunk_size_bytes=4096
+				)
+				uploaded_file_path = attachment_server.pop_uploaded_attachment_file_path(
+					attachment_uuid=attachment_uuid
+				)
+				with open(uploaded_file_path, "rb") as file_handle:
+					self.assertEqual(image_bytes, file_handle.read())
+				self.assertIsNone(attachment_server.pop_uploaded_attachment_file_path(attachment_uuid=attachment_uuid))
+
+				# bytes that do not match the checksum are never committed
+				other_attachment_uuid = "9d2b7c1e-6a4f-4e0b-8c3d-1f2e3a4b5c6d"
+				attachment_server.begin_upload(
+					attachment_uuid=other_attachment_uuid,
+					total_size_bytes=len(image_bytes),
+					sha256=hashlib.sha256(b"other").hexdigest()
+				)
+				attachment_server.put_upload_chunk(
+					attachment_uuid=other_attachment_uuid,
+					offset=0,
+					chunk_bytes=bytearray(image_bytes)
+				)
+				self.assertFalse(attachment_server.commit_upload(attachment_uuid=other_attachment_uuid))
+				self.assertIsNone(attachment_server.pop_uploaded_attachment_file_path(attachment_uuid=other_attachment_uuid))
+			finally:
+				attachment_client.dispose()
+				attachment_server.shutdown()
+				attachment_server.server_close()
+
+	def test_attachment_upload_resumes_after_server_restart(self):
+
+		with tempfile.TemporaryDirectory() as directory_path:
+			upload_directory_path = os.path.join(directory_path, "uploads")
+			os.makedirs(upload_directory_path)
+
+			image_bytes = bytes(range(256)) * 4099
+			image_sha256 = hashlib.sha256(image_bytes).hexdigest()
+			attachment_uuid = "5f0c6a4e-3f5e-4b8e-9a61-0d3c2b1a0f9e"
+
+			attachment_server = AttachmentServer(
+				host_address="127.0.0.1",
+				host_port=0,
+				upload_directory_path=upload_directory_path
+			)
+			try:
+				self.assertEqual(0, attachment_server.begin_upload(
+					attachment_uuid=attachment_uuid,
+					total_size_bytes=len(image_bytes),
+					sha256=image_sha256
+				))
+				self.assertEqual(1000, attachment_server.put_upload_chunk(
+					attachment_uuid=attachment_uuid,
+					offset=0,
+					chunk_bytes=bytearray(image_bytes[:1000])
+				))
+			finally:
+				attachment_server.server_close()
+
+			attachment_server = AttachmentServer(
+				host_address="127.0.0.1",
+				host_port=0,
+				upload_directory_path=upload_directory_path
+			)
+			try:
+				# the chunk written before the restart is kept
+				self.assertEqual(1000, attachment_server.begin_upload(
+					attachment_uuid=attachment_uuid,
+					total_size_bytes=len(image_bytes),
+					sha256=image_sha256
+				))
+				self.assertEqual(len(image_bytes), attachment_server.put_upload_chunk(
+					attachment_uuid=attachment_uuid,
+					offset=1000,
+					chunk_bytes=bytearray(image_bytes[1000:])
+				))
+				self.assertTrue(attachment_server.commit_upload(attachment_uuid=attachment_uuid))
+				uploaded_file_path = attachment_server.pop_uploaded_attachment_file_path(
+					attachment_uuid=attachment_uuid
+				)
+				with open(uploaded_file_path, "rb") as file_handle:
+					self.assertEqual(image_bytes, file_handle.read())
+			finally:
+				attachment_server.server_close()
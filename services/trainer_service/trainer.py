@@ -5,15 +5,25 @@ import json
 from collections import deque
 import uuid
 import os
+import sys
 import shutil
 from datetime import datetime
 import inspect
 import time
 import base64
+import hashlib
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from austin_heller_repo.socket_queued_message_framework import SourceTypeEnum, ClientServerMessage, ClientServerMessageTypeEnum, StructureStateEnum, StructureTransitionException, Structure, StructureFactory, StructureInfluence, ReadWriteSocketClosedException
 from austin_heller_repo.threading import Semaphore, start_thread
 from austin_heller_repo.common import StringEnum, SubprocessWrapper, is_directory_empty
 
+try:
+	from .attachment import AttachmentServer
+except ImportError:
+	from attachment import AttachmentServer
+
 
 class ImageUsageTypeEnum(StringEnum):
 	Training = "training"
@@ -30,6 +40,10 @@ class TrainerStructureStateEnum(StructureStateEnum):
 	Active = "active"
 
 
+class ImageSourceStructureStateEnum(StructureStateEnum):
+	Active = "active"
+
+
 class DetectorStructureStateEnum(StructureStateEnum):
 	Active = "active"
 
@@ -37,10 +51,15 @@ class DetectorStructureStateEnum(StructureStateEnum):
 class TrainerClientServerMessageTypeEnum(ClientServerMessageTypeEnum):
 	# trainer_service
 	TrainerError = "service_error"
+	AttachmentEndpointAnnouncement = "attachment_endpoint_announcement"
 	# client
 	AddImageAnnouncement = "add_image_announcement"
+	AddImageBatchAnnouncement = "add_image_batch_announcement"
+	AddImageBatchAcknowledgement = "add_image_batch_acknowledgement"
+	TrainModelRequest = "train_model_request"
 	# detector
 	UpdateModelBroadcast = "update_model_broadcast"
+	UpdateModelAcknowledgement = "update_model_acknowledgement"
 
 
 class TrainerClientServerMessage(ClientServerMessage, ABC):
@@ -93,13 +112,47 @@ class TrainerErrorTrainerClientServerMessage(TrainerClientServerMessage):
 		return None
 
 
+class AttachmentEndpointAnnouncementTrainerClientServerMessage(TrainerClientServerMessage):
+
+	def __init__(self, *, host_address: str, host_port: int, destination_uuid: str):
+		super().__init__(
+			destination_uuid=destination_uuid
+		)
+
+		self.__host_address = host_address
+		self.__host_port = host_port
+
+	def get_host_address(self) -> str:
+		return self.__host_address
+
+	def get_host_port(self) -> int:
+		return self.__host_port
+
+	@classmethod
+	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
+		return TrainerClientServerMessageTypeEnum.AttachmentEndpointAnnouncement
+
+	def to_json(self) -> Dict:
+		json_object = super().to_json()
+		json_object["host_address"] = self.__host_address
+		json_object["host_port"] = self.__host_port
+		return json_object
+
+	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
+		return TrainerErrorTrainerClientServerMessage(
+			structure_state_name=structure_transition_exception.get_structure_state().value,
+			client_server_message_json_string=json.dumps(structure_transition_exception.get_structure_influence().get_client_server_message().to_json()),
+			destination_uuid=destination_uuid
+		)
+
+
 ###############################################################################
 # Client
 ###############################################################################
 
 class AddImageAnnouncementTrainerClientServerMessage(TrainerClientServerMessage):
 
-	def __init__(self, *, image_bytes_base64string: str, image_extension: str, annotation_bytes_base64string: str, image_usage_type_string: str, destination_uuid: str):
+	def __init__(self, *, image_bytes_base64string: str or None, image_extension: str, annotation_bytes_base64string: str, image_usage_type_string: str, destination_uuid: str, image_attachment_uuid: str = None):
 		super().__init__(
 			destination_uuid=destination_uuid
 		)
@@ -108,10 +161,14 @@ class AddImageAnnouncementTrainerClientServerMessage(TrainerClientServerMessage)
 		self.__image_extension = image_extension
 		self.__annotation_bytes_base64string = annotation_bytes_base64string
 		self.__image_usage_type_string = image_usage_type_string
+		self.__image_attachment_uuid = image_attachment_uuid
 
 	def get_image_bytes(self) -> bytes:
 		return base64.b64decode(self.__image_bytes_base64string.encode())
 
+	def get_image_attachment_uuid(self) -> str or None:
+		return self.__image_attachment_uuid
+
 	def get_image_extension(self) -> str:
 		return self.__image_extension
 
@@ -131,6 +188,111 @@ class AddImageAnnouncementTrainerClientServerMessage(TrainerClientServerMessage)
 		json_object["image_extension"] = self.__image_extension
 		json_object["annotation_bytes_base64string"] = self.__annotation_bytes_base64string
 		json_object["image_usage_type_string"] = self.__image_usage_type_string
+		json_object["image_attachment_uuid"] = self.__image_attachment_uuid
+		return json_object
+
+	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
+		return TrainerErrorTrainerClientServerMessage(
+			structure_state_name=structure_transition_exception.get_structure_state().value,
+			client_server_message_json_string=json.dumps(structure_transition_exception.get_structure_influence().get_client_server_message().to_json()),
+			destination_uuid=destination_uuid
+		)
+
+
+class AddImageBatchAnnouncementTrainerClientServerMessage(TrainerClientServerMessage):
+
+	def __init__(self, *, image_batch_uuid: str, image_json_dicts: List[Dict], destination_uuid: str, images_attachment_uuid: str = None):
+		super().__init__(
+			destination_uuid=destination_uuid
+		)
+
+		self.__image_batch_uuid = image_batch_uuid
+		self.__image_json_dicts = image_json_dicts
+		self.__images_attachment_uuid = images_attachment_uuid
+
+	def get_image_batch_uuid(self) -> str:
+		return self.__image_batch_uuid
+
+	def get_image_json_dicts(self) -> List[Dict]:
+		# each image either carries its bytes as base64 or its size within the concatenated images attachment
+		return self.__image_json_dicts
+
+	def get_images_attachment_uuid(self) -> str or None:
+		return self.__images_attachment_uuid
+
+	@classmethod
+	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
+		return TrainerClientServerMessageTypeEnum.AddImageBatchAnnouncement
+
+	def to_json(self) -> Dict:
+		json_object = super().to_json()
+		json_object["image_batch_uuid"] = self.__image_batch_uuid
+		json_object["image_json_dicts"] = self.__image_json_dicts
+		json_object["images_attachment_uuid"] = self.__images_attachment_uuid
+		return json_object
+
+	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
+		return TrainerErrorTrainerClientServerMessage(
+			structure_state_name=structure_transition_exception.get_structure_state().value,
+			client_server_message_json_string=json.dumps(structure_transition_exception.get_structure_influence().get_client_server_message().to_json()),
+			destination_uuid=destination_uuid
+		)
+
+
+class AddImageBatchAcknowledgementTrainerClientServerMessage(TrainerClientServerMessage):
+
+	def __init__(self, *, image_batch_uuid: str, added_image_total: int, image_total: int, destination_uuid: str):
+		super().__init__(
+			destination_uuid=destination_uuid
+		)
+
+		self.__image_batch_uuid = image_batch_uuid
+		self.__added_image_total = added_image_total
+		self.__image_total = image_total
+
+	def get_image_batch_uuid(self) -> str:
+		return self.__image_batch_uuid
+
+	def get_added_image_total(self) -> int:
+		return self.__added_image_total
+
+	def get_image_total(self) -> int:
+		return self.__image_total
+
+	@classmethod
+	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
+		return TrainerClientServerMessageTypeEnum.AddImageBatchAcknowledgement
+
+	def to_json(self) -> Dict:
+		json_object = super().to_json()
+		json_object["image_batch_uuid"] = self.__image_batch_uuid
+		json_object["added_image_total"] = self.__added_image_total
+		json_object["image_total"] = self.__image_total
+		return json_object
+
+	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
+		return TrainerErrorTrainerClientServerMessage(
+			structure_state_name=structure_transition_exception.get_structure_state().value,
+			client_server_message_json_string=json.dumps(structure_transition_exception.get_structure_influence().get_client_server_message().to_json()),
+			destination_uuid=destination_uuid
+		)
+
+
+class TrainModelRequestTrainerClientServerMessage(TrainerClientServerMessage):
+
+	def __init__(self, *, destination_uuid: str):
+		super().__init__(
+			destination_uuid=destination_uuid
+		)
+
+		pass
+
+	@classmethod
+	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
+		return TrainerClientServerMessageTypeEnum.TrainModelRequest
+
+	def to_json(self) -> Dict:
+		json_object = super().to_json()
 		return json_object
 
 	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
@@ -147,16 +309,34 @@ class AddImageAnnouncementTrainerClientServerMessage(TrainerClientServerMessage)
 
 class UpdateModelBroadcastTrainerClientServerMessage(TrainerClientServerMessage):
 
-	def __init__(self, *, model_bytes_base64string: str, destination_uuid: str):
+	def __init__(self, *, model_bytes_base64string: str or None, destination_uuid: str, quantized_model_bytes_base64string: str = None, model_attachment_uuid: str = None, quantized_model_attachment_uuid: str = None, model_version_index: int = None):
 		super().__init__(
 			destination_uuid=destination_uuid
 		)
 
 		self.__model_bytes_base64string = model_bytes_base64string
+		self.__quantized_model_bytes_base64string = quantized_model_bytes_base64string
+		self.__model_attachment_uuid = model_attachment_uuid
+		self.__quantized_model_attachment_uuid = quantized_model_attachment_uuid
+		self.__model_version_index = model_version_index
 
 	def get_model_bytes(self) -> bytes:
 		return base64.b64decode(self.__model_bytes_base64string.encode())
 
+	def get_quantized_model_bytes(self) -> bytes or None:
+		if self.__quantized_model_bytes_base64string is None:
+			return None
+		return base64.b64decode(self.__quantized_model_bytes_base64string.encode())
+
+	def get_model_attachment_uuid(self) -> str or None:
+		return self.__model_attachment_uuid
+
+	def get_quantized_model_attachment_uuid(self) -> str or None:
+		return self.__quantized_model_attachment_uuid
+
+	def get_model_version_index(self) -> int or None:
+		return self.__model_version_index
+
 	@classmethod
 	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
 		return TrainerClientServerMessageTypeEnum.UpdateModelBroadcast
@@ -164,6 +344,49 @@ class UpdateModelBroadcastTrainerClientServerMessage(TrainerClientServerMessage)
 	def to_json(self) -> Dict:
 		json_object = super().to_json()
 		json_object["model_bytes_base64string"] = self.__model_bytes_base64string
+		json_object["quantized_model_bytes_base64string"] = self.__quantized_model_bytes_base64string
+		json_object["model_attachment_uuid"] = self.__model_attachment_uuid
+		json_object["quantized_model_attachment_uuid"] = self.__quantized_model_attachment_uuid
+		json_object["model_version_index"] = self.__model_version_index
+		return json_object
+
+	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
+		return TrainerErrorTrainerClientServerMessage(
+			structure_state_name=structure_transition_exception.get_structure_state().value,
+			client_server_message_json_string=json.dumps(structure_transition_exception.get_structure_influence().get_client_server_message().to_json()),
+			destination_uuid=destination_uuid
+		)
+
+
+class UpdateModelAcknowledgementTrainerClientServerMessage(TrainerClientServerMessage):
+
+	def __init__(self, *, model_sha256: str, model_version_index: int or None, is_successful: bool, destination_uuid: str):
+		super().__init__(
+			destination_uuid=destination_uuid
+		)
+
+		self.__model_sha256 = model_sha256
+		self.__model_version_index = model_version_index
+		self.__is_successful = is_successful
+
+	def get_model_sha256(self) -> str:
+		return self.__model_sha256
+
+	def get_model_version_index(self) -> int or None:
+		return self.__model_version_index
+
+	def is_successful(self) -> bool:
+		return self.__is_successful
+
+	@classmethod
+	def get_client_server_message_type(cls) -> ClientServerMessageTypeEnum:
+		return TrainerClientServerMessageTypeEnum.UpdateModelAcknowledgement
+
+	def to_json(self) -> Dict:
+		json_object = super().to_json()
+		json_object["model_sha256"] = self.__model_sha256
+		json_object["model_version_index"] = self.__model_version_index
+		json_object["is_successful"] = self.__is_successful
 		return json_object
 
 	def get_structural_error_client_server_message_response(self, *, structure_transition_exception: StructureTransitionException, destination_uuid: str) -> ClientServerMessage:
@@ -178,31 +401,94 @@ class UpdateModelBroadcastTrainerClientServerMessage(TrainerClientServerMessage)
 # Structures
 ###############################################################################
 
-class DetectorStructure(Structure):
+class ImageSourceStructure(Structure):
 
 	def __init__(self, *, source_uuid: str):
+		super().__init__(
+			states=ImageSourceStructureStateEnum,
+			initial_state=ImageSourceStructureStateEnum.Active
+		)
+
+		self.__source_uuid = source_uuid
+
+	def on_client_connected(self, *, source_uuid: str, source_type: SourceTypeEnum, tag_json: Dict or None):
+		raise Exception(f"Unexpected connection from source {source_type.value}")
+
+	def send_attachment_endpoint_announcement(self, *, host_address: str, host_port: int):
+		self.send_client_server_message(
+			client_server_message=AttachmentEndpointAnnouncementTrainerClientServerMessage(
+				host_address=host_address,
+				host_port=host_port,
+				destination_uuid=self.__source_uuid
+			)
+		)
+
+	def send_add_image_batch_acknowledgement(self, *, image_batch_uuid: str, added_image_total: int, image_total: int):
+		self.send_client_server_message(
+			client_server_message=AddImageBatchAcknowledgementTrainerClientServerMessage(
+				image_batch_uuid=image_batch_uuid,
+				added_image_total=added_image_total,
+				image_total=image_total,
+				destination_uuid=self.__source_uuid
+			)
+		)
+
+
+class DetectorStructure(Structure):
+
+	def __init__(self, *, source_uuid: str, is_attachment_supported: bool, is_model_acknowledgement_supported: bool):
 		super().__init__(
 			states=DetectorStructureStateEnum,
 			initial_state=DetectorStructureStateEnum.Active
 		)
 
 		self.__source_uuid = source_uuid
+		self.__is_attachment_supported = is_attachment_supported
+		self.__is_model_acknowledgement_supported = is_model_acknowledgement_supported
+
+	def is_attachment_supported(self) -> bool:
+		return self.__is_attachment_supported
+
+	def is_model_acknowledgement_supported(self) -> bool:
+		return self.__is_model_acknowledgement_supported
 
 	def on_client_connected(self, *, source_uuid: str, source_type: SourceTypeEnum, tag_json: Dict or None):
 		raise Exception(f"Unexpected connection from source {source_type.value}")
 
-	def send_updated_model(self, *, model_bytes: bytes):
+	def send_attachment_endpoint_announcement(self, *, host_address: str, host_port: int):
+		self.send_client_server_message(
+			client_server_message=AttachmentEndpointAnnouncementTrainerClientServerMessage(
+				host_address=host_address,
+				host_port=host_port,
+				destination_uuid=self.__source_uuid
+			)
+		)
+
+	def send_updated_model_attachment(self, *, model_attachment_uuid: str, quantized_model_attachment_uuid: str or None, model_version_index: int):
+		self.send_client_server_message(
+			client_server_message=UpdateModelBroadcastTrainerClientServerMessage(
+				model_bytes_base64string=None,
+				destination_uuid=self.__source_uuid,
+				model_attachment_uuid=model_attachment_uuid,
+				quantized_model_attachment_uuid=quantized_model_attachment_uuid,
+				model_version_index=model_version_index
+			)
+		)
+
+	def send_updated_model(self, *, model_bytes: bytes, quantized_model_bytes: bytes or None, model_version_index: int):
 		self.send_client_server_message(
 			client_server_message=UpdateModelBroadcastTrainerClientServerMessage(
 				model_bytes_base64string=base64.b64encode(model_bytes).decode(),
-				destination_uuid=self.__source_uuid
+				destination_uuid=self.__source_uuid,
+				quantized_model_bytes_base64string=None if quantized_model_bytes is None else base64.b64encode(quantized_model_bytes).decode(),
+				model_version_index=model_version_index
 			)
 		)
 
 
 class TrainerStructure(Structure):
 
-	def __init__(self, *, script_directory_path: str, temp_image_directory_path: str, training_directory_path: str, validation_directory_path: str, model_directory_path: str, yolov5_directory_path: str, image_size: int, training_batch_size: int, training_epochs: int, is_debug: bool = False):
+	def __init__(self, *, script_directory_path: str, temp_image_directory_path: str, training_directory_path: str, validation_directory_path: str, model_directory_path: str, yolov5_directory_path: str, image_size: int, training_batch_size: int, training_epochs: int, is_quantization_enabled: bool, quantization_calibration_image_total: int, attachment_host_address: str, attachment_advertised_host_address: str, attachment_port: int, training_image_total_threshold: int, minimum_training_interval_seconds: float, model_broadcast_thread_total: int, model_broadcast_timeout_seconds: float, is_debug: bool = False):
 		super().__init__(
 			states=TrainerStructureStateEnum,
 			initial_state=TrainerStructureStateEnum.Active
@@ -217,19 +503,45 @@ class TrainerStructure(Structure):
 		self.__image_size = image_size
 		self.__training_batch_size = training_batch_size
 		self.__training_epochs = training_epochs
+		self.__is_quantization_enabled = is_quantization_enabled
+		self.__quantization_calibration_image_total = quantization_calibration_image_total
+		self.__attachment_host_address = attachment_host_address
+		self.__attachment_advertised_host_address = attachment_advertised_host_address
+		self.__attachment_port = attachment_port
+		self.__training_image_total_threshold = training_image_total_threshold
+		self.__minimum_training_interval_seconds = minimum_training_interval_seconds
+		self.__model_broadcast_thread_total = model_broadcast_thread_total
+		self.__model_broadcast_timeout_seconds = model_broadcast_timeout_seconds
 		self.__is_debug = is_debug
 
 		self.__training_script_file_path = None  # type: str
 		self.__training_model_file_path = None  # type: str
+		self.__quantized_model_file_path = None  # type: str
+		self.__quantization_report_file_path = None  # type: str
+		self.__quantization_python_file_path = None  # type: str
 		self.__training_model_file_path_semaphore = Semaphore()
 		self.__is_training_model_thread_active = True
 		self.__training_subprocess_wrapper = None  # type: SubprocessWrapper
 		self.__training_model_thread = None
+		self.__training_condition = threading.Condition()
+		self.__new_training_image_total = 0
+		self.__is_training_requested = False
+		self.__training_start_time = None  # type: float
 		self.__available_image_uuids = []  # type: List[str]
 		self.__available_image_uuids_semaphore = Semaphore()
 		self.__directory_name_per_image_usage_type = {}  # type: Dict[ImageUsageTypeEnum, str]
+		self.__image_source_structure_per_source_uuid = {}  # type: Dict[str, ImageSourceStructure]
 		self.__detector_structure_per_source_uuid = {}  # type: Dict[str, DetectorStructure]
 		self.__detector_structure_per_source_uuid_semaphore = Semaphore()
+		self.__attachment_server = None  # type: AttachmentServer
+		self.__model_attachment_uuids = []  # type: List[str]
+		self.__model_attachment_file_paths = []  # type: List[str]
+		self.__model_file_identities = []  # type: List[Tuple[int, int, int]]
+		self.__model_registry_file_path = None  # type: str
+		self.__model_registry_json = None  # type: Dict
+		self.__model_acknowledgement_per_detector_source_uuid = {}  # type: Dict[str, Tuple[str, bool]]
+		self.__model_sha256_and_version_index_per_detector_source_uuid = {}  # type: Dict[str, Tuple[str, int]]
+		self.__model_acknowledgement_condition = threading.Condition()
 
 		self.add_transition(
 			client_server_message_type=TrainerClientServerMessageTypeEnum.AddImageAnnouncement,
@@ -239,12 +551,40 @@ class TrainerStructure(Structure):
 			on_transition=self.__image_source_add_image_announcement_transition
 		)
 
+		self.add_transition(
+			client_server_message_type=TrainerClientServerMessageTypeEnum.AddImageBatchAnnouncement,
+			from_source_type=TrainerSourceTypeEnum.ImageSource,
+			start_structure_state=TrainerStructureStateEnum.Active,
+			end_structure_state=TrainerStructureStateEnum.Active,
+			on_transition=self.__image_source_add_image_batch_announcement_transition
+		)
+
+		self.add_transition(
+			client_server_message_type=TrainerClientServerMessageTypeEnum.TrainModelRequest,
+			from_source_type=TrainerSourceTypeEnum.ImageSource,
+			start_structure_state=TrainerStructureStateEnum.Active,
+			end_structure_state=TrainerStructureStateEnum.Active,
+			on_transition=self.__image_source_train_model_request_transition
+		)
+
+		self.add_transition(
+			client_server_message_type=TrainerClientServerMessageTypeEnum.UpdateModelAcknowledgement,
+			from_source_type=TrainerSourceTypeEnum.Detector,
+			start_structure_state=TrainerStructureStateEnum.Active,
+			end_structure_state=TrainerStructureStateEnum.Active,
+			on_transition=self.__detector_update_model_acknowledgement_transition
+		)
+
 		self.__initialize()
 
 	def __initialize(self):
 
 		self.__training_script_file_path = os.path.join(self.__script_directory_path, "train.sh")
 		self.__training_model_file_path = os.path.join(self.__model_directory_path, "training.pt")
+		self.__quantized_model_file_path = os.path.join(self.__model_directory_path, "training.int8.onnx")
+		self.__quantization_report_file_path = os.path.join(self.__model_directory_path, "training.int8.json")
+		self.__model_registry_file_path = os.path.join(self.__model_directory_path, "training.json")
+		self.__quantization_python_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quantize.py")
 
 		self.__directory_name_per_image_usage_type[ImageUsageTypeEnum.Training] = "training"
 		self.__directory_name_per_image_usage_type[ImageUsageTypeEnum.Validation] = "validation"
@@ -253,6 +593,34 @@ class TrainerStructure(Structure):
 			if image_usage_type not in self.__directory_name_per_image_usage_type:
 				raise Exception(f"Failed to define temp directory name for image usage type \"{image_usage_type.value}\".")
 
+		# snapshots and staged models left by a previous run are not served by this one
+		for file_name in os.listdir(self.__model_directory_path):
+			if file_name.startswith("attachment.") or file_name.endswith(".tmp.pt") or file_name.endswith(".tmp.onnx"):
+				os.remove(os.path.join(self.__model_directory_path, file_name))
+
+		if self.__attachment_port != 0:
+			# chunked uploads are staged beside the temp images so that a committed one is moved into place rather than copied, and partial ones are kept to be resumed after a restart
+			upload_directory_path = os.path.join(self.__temp_image_directory_path, "uploads")
+			if not os.path.exists(upload_directory_path):
+				os.makedirs(upload_directory_path)
+			self.__attachment_server = AttachmentServer(
+				host_address=self.__attachment_host_address,
+				host_port=self.__attachment_port,
+				upload_directory_path=upload_directory_path
+			)
+			start_thread(self.__attachment_server.serve_forever)
+
+		if os.path.exists(self.__training_model_file_path):
+			if os.path.exists(self.__model_registry_file_path):
+				with open(self.__model_registry_file_path, "r") as file_handle:
+					self.__model_registry_json = json.load(file_handle)
+			if self.__model_registry_json is None or self.__model_registry_json["size_bytes"] != os.path.getsize(self.__training_model_file_path):
+				# weights from before the registry, or replaced by hand, are versioned after whatever was last recorded
+				self.__update_model_registry()
+
+		# without weights there is nothing to serve yet, so the first run does not wait for new images
+		self.__is_training_requested = not os.path.exists(self.__training_model_file_path)
+
 		self.__training_model_thread = start_thread(self.__training_model_thread_method)
 
 	def __image_source_add_image_announcement_transition(self, structure_influence: StructureInfluence):
@@ -261,65 +629,512 @@ class TrainerStructure(Structure):
 		if not isinstance(client_server_message, AddImageAnnouncementTrainerClientServerMessage):
 			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
 		else:
-			image_bytes = client_server_message.get_image_bytes()
-			image_extension = client_server_message.get_image_extension()
-			if image_extension.startswith("."):
-				image_extension = image_extension[1:]
-			annotation_bytes = client_server_message.get_annotation_bytes()
+			image_attachment_uuid = client_server_message.get_image_attachment_uuid()
+			uploaded_image_file_path = None
+			if image_attachment_uuid is None:
+				image_bytes = client_server_message.get_image_bytes()
+			elif self.__attachment_server is None:
+				raise Exception(f"Unexpected image attachment {image_attachment_uuid} without an attachment server.")
+			else:
+				# the image was uploaded to the attachment server ahead of this announcement, where a large one was streamed to disk in chunks
+				image_bytes = None
+				uploaded_image_file_path = self.__attachment_server.pop_uploaded_attachment_file_path(
+					attachment_uuid=image_attachment_uuid
+				)
+				if uploaded_image_file_path is None:
+					image_bytes = self.__attachment_server.pop_attachment(
+						attachment_uuid=image_attachment_uuid
+					)
+					if image_bytes is None:
+						raise Exception(f"Failed to find image attachment {image_attachment_uuid}.")
+
+			self.__save_image(
+				image_bytes=image_bytes,
+				uploaded_image_file_path=uploaded_image_file_path,
+				image_extension=client_server_message.get_image_extension(),
+				annotation_bytes=client_server_message.get_annotation_bytes(),
+				image_usage_type=client_server_message.get_image_usage_type()
+			)
 
-			image_uuid = str(uuid.uuid4())
-			image_usage_type_directory_name = self.__directory_name_per_image_usage_type[client_server_message.get_image_usage_type()]
-			image_file_path = os.path.join(self.__temp_image_directory_path, image_usage_type_directory_name, f"{image_uuid}.{image_extension}")
-			annotation_file_path = os.path.join(self.__temp_image_directory_path, image_usage_type_directory_name, f"{image_uuid}.txt")
+			# validation images change how a model is scored rather than the model itself, so only training images count toward a run
+			if client_server_message.get_image_usage_type() == ImageUsageTypeEnum.Training:
+				self.__add_new_training_image_total(
+					new_training_image_total=1
+				)
 
-			if self.__is_debug:
-				print(f"{datetime.utcnow()}: TrainerStructure: __image_source_add_image_announcement_transition: saving image to {image_file_path}")
+	def __image_source_add_image_batch_announcement_transition(self, structure_influence: StructureInfluence):
+
+		client_server_message = structure_influence.get_client_server_message()
+		if not isinstance(client_server_message, AddImageBatchAnnouncementTrainerClientServerMessage):
+			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
+		else:
+			image_json_dicts = client_server_message.get_image_json_dicts()
+			added_image_total = 0
+			new_training_image_total = 0
+			try:
+				images_attachment_uuid = client_server_message.get_images_attachment_uuid()
+				if images_attachment_uuid is None:
+					images_view = None
+				elif self.__attachment_server is None:
+					raise Exception(f"Unexpected images attachment {images_attachment_uuid} without an attachment server.")
+				else:
+					# the images of the batch were uploaded back to back as one attachment
+					images_bytes = self.__attachment_server.pop_attachment(
+						attachment_uuid=images_attachment_uuid
+					)
+					if images_bytes is None:
+						raise Exception(f"Failed to find images attachment {images_attachment_uuid}.")
+					images_view = memoryview(images_bytes)
+
+				image_offset = 0
+				for image_json_dict in image_json_dicts:
+					if images_view is None:
+						image_bytes = base64.b64decode(image_json_dict["image_bytes_base64string"].encode())
+					else:
+						image_bytes = images_view[image_offset:image_offset + image_json_dict["image_size_bytes"]]
+						image_offset += image_json_dict["image_size_bytes"]
+					image_usage_type = ImageUsageTypeEnum(image_json_dict["image_usage_type_string"])
+					self.__save_image(
+						image_bytes=image_bytes,
+						image_extension=image_json_dict["image_extension"],
+						annotation_bytes=base64.b64decode(image_json_dict["annotation_bytes_base64string"].encode()),
+						image_usage_type=image_usage_type
+					)
+					added_image_total += 1
+					if image_usage_type == ImageUsageTypeEnum.Training:
+						new_training_image_total += 1
+			finally:
+				# the whole batch counts as one notification, and is always acknowledged so that the image source can send more
+				self.__add_new_training_image_total(
+					new_training_image_total=new_training_image_total
+				)
+				image_source_structure = self.__image_source_structure_per_source_uuid.get(structure_influence.get_source_uuid(), None)
+				if image_source_structure is not None:
+					image_source_structure.send_add_image_batch_acknowledgement(
+						image_batch_uuid=client_server_message.get_image_batch_uuid(),
+						added_image_total=added_image_total,
+						image_total=len(image_json_dicts)
+					)
+
+	def __save_image(self, *, image_bytes: bytes or memoryview or None, image_extension: str, annotation_bytes: bytes, image_usage_type: ImageUsageTypeEnum, uploaded_image_file_path: str = None):
+
+		if image_extension.startswith("."):
+			image_extension = image_extension[1:]
+
+		image_uuid = str(uuid.uuid4())
+		image_usage_type_directory_name = self.__directory_name_per_image_usage_type[image_usage_type]
+		image_file_path = os.path.join(self.__temp_image_directory_path, image_usage_type_directory_name, f"{image_uuid}.{image_extension}")
+		annotation_file_path = os.path.join(self.__temp_image_directory_path, image_usage_type_directory_name, f"{image_uuid}.txt")
+
+		if self.__is_debug:
+			print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: saving image to {image_file_path}")
+		if uploaded_image_file_path is None:
 			with open(image_file_path, "wb") as file_handle:
 				file_handle.write(image_bytes)
+		else:
+			os.replace(uploaded_image_file_path, image_file_path)
+
+		if self.__is_debug:
+			print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: saving annotation to {annotation_file_path}")
+		with open(annotation_file_path, "wb") as file_handle:
+			file_handle.write(annotation_bytes)
+
+		# make the image and annotation available to be brought over to the training environment for the model
+		self.__available_image_uuids_semaphore.acquire()
+		self.__available_image_uuids.append(image_uuid)
+		self.__available_image_uuids_semaphore.release()
 
+	def __add_new_training_image_total(self, *, new_training_image_total: int):
+		if new_training_image_total != 0:
+			self.__training_condition.acquire()
+			try:
+				self.__new_training_image_total += new_training_image_total
+				self.__training_condition.notify_all()
+			finally:
+				self.__training_condition.release()
+
+	def __image_source_train_model_request_transition(self, structure_influence: StructureInfluence):
+
+		client_server_message = structure_influence.get_client_server_message()
+		if not isinstance(client_server_message, TrainModelRequestTrainerClientServerMessage):
+			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
+		else:
 			if self.__is_debug:
-				print(f"{datetime.utcnow()}: TrainerStructure: __image_source_add_image_announcement_transition: saving annotation to {annotation_file_path}")
-			with open(annotation_file_path, "wb") as file_handle:
-				file_handle.write(annotation_bytes)
+				print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: training requested")
+			self.__training_condition.acquire()
+			try:
+				self.__is_training_requested = True
+				self.__training_condition.notify_all()
+			finally:
+				self.__training_condition.release()
+
+	def __detector_update_model_acknowledgement_transition(self, structure_influence: StructureInfluence):
+
+		client_server_message = structure_influence.get_client_server_message()
+		if not isinstance(client_server_message, UpdateModelAcknowledgementTrainerClientServerMessage):
+			raise Exception(f"Unexpected message type: {client_server_message.__class__.get_client_server_message_type()}")
+		else:
+			source_uuid = structure_influence.get_source_uuid()
+			if client_server_message.is_successful():
+				print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: detector {source_uuid} holds model version {client_server_message.get_model_version_index()} ({client_server_message.get_model_sha256()}).")
+			else:
+				print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: detector {source_uuid} failed to update to model version {client_server_message.get_model_version_index()} ({client_server_message.get_model_sha256()}).")
+			self.__model_acknowledgement_condition.acquire()
+			try:
+				self.__model_acknowledgement_per_detector_source_uuid[source_uuid] = (client_server_message.get_model_sha256(), client_server_message.is_successful())
+				if client_server_message.is_successful():
+					self.__model_sha256_and_version_index_per_detector_source_uuid[source_uuid] = (client_server_message.get_model_sha256(), client_server_message.get_model_version_index())
+				self.__model_acknowledgement_condition.notify_all()
+			finally:
+				self.__model_acknowledgement_condition.release()
+
+	def __wait_for_training(self) -> bool:
 
-			# make the image and annotation available to be brought over to the training environment for the model
-			self.__available_image_uuids_semaphore.acquire()
-			self.__available_image_uuids.append(image_uuid)
-			self.__available_image_uuids_semaphore.release()
+		# blocks without polling until a run is due and returns false once the trainer is disposed
+		self.__training_condition.acquire()
+		try:
+			while self.__is_training_model_thread_active:
+				if self.__is_training_requested or self.__new_training_image_total >= self.__training_image_total_threshold:
+					if self.__training_start_time is None:
+						wait_seconds = 0.0
+					else:
+						wait_seconds = self.__training_start_time + self.__minimum_training_interval_seconds - time.monotonic()
+					if wait_seconds <= 0.0:
+						if self.__is_debug:
+							print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: starting training with {self.__new_training_image_total} new training images (requested: {self.__is_training_requested})")
+						self.__is_training_requested = False
+						self.__new_training_image_total = 0
+						self.__training_start_time = time.monotonic()
+						return True
+					self.__training_condition.wait(wait_seconds)
+				else:
+					self.__training_condition.wait()
+			return False
+		finally:
+			self.__training_condition.release()
 
 	def on_client_connected(self, *, source_uuid: str, source_type: SourceTypeEnum, tag_json: Dict or None):
+		# peers that predate attachments connect without a tag and keep receiving payloads as base64
+		is_attachment_supported = self.__attachment_server is not None and tag_json is not None and tag_json.get("is_attachment_supported", False)
 		if source_type == TrainerSourceTypeEnum.ImageSource:
-			# image source structure not needed at the moment
 			print(f"{datetime.utcnow()}: TrainerStructure: on_client_connected: Image source connected.")
-			pass
+			image_source_structure = ImageSourceStructure(
+				source_uuid=source_uuid
+			)
+			self.register_child_structure(
+				structure=image_source_structure
+			)
+			self.__image_source_structure_per_source_uuid[source_uuid] = image_source_structure
+			if is_attachment_supported:
+				image_source_structure.send_attachment_endpoint_announcement(
+					host_address=self.__attachment_advertised_host_address,
+					host_port=self.__attachment_port
+				)
 		elif source_type == TrainerSourceTypeEnum.Detector:
 			detector_structure = DetectorStructure(
-				source_uuid=source_uuid
+				source_uuid=source_uuid,
+				is_attachment_supported=is_attachment_supported,
+				is_model_acknowledgement_supported=tag_json is not None and tag_json.get("is_model_acknowledgement_supported", False)
 			)
 			self.register_child_structure(
 				structure=detector_structure
 			)
+			if is_attachment_supported:
+				detector_structure.send_attachment_endpoint_announcement(
+					host_address=self.__attachment_advertised_host_address,
+					host_port=self.__attachment_port
+				)
+			self.__training_model_file_path_semaphore.acquire()
+			try:
+				model_registry_json = self.__model_registry_json
+			finally:
+				self.__training_model_file_path_semaphore.release()
 			self.__detector_structure_per_source_uuid_semaphore.acquire()
 			try:
-				self.__training_model_file_path_semaphore.acquire()
-				try:
-					with open(self.__training_model_file_path, "rb") as file_handle:
-						model_bytes = file_handle.read()
-					detector_structure.send_updated_model(
-						model_bytes=model_bytes
-					)
-					self.__detector_structure_per_source_uuid[source_uuid] = detector_structure
-				finally:
-					self.__training_model_file_path_semaphore.release()
+				self.__detector_structure_per_source_uuid[source_uuid] = detector_structure
 			finally:
 				self.__detector_structure_per_source_uuid_semaphore.release()
+			# sent outside of the detector lock so that a slow transfer does not hold up other detectors or a broadcast, which the detector ignores if it repeats this model
+			if model_registry_json is None:
+				if self.__is_debug:
+					print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: no model to send to detector {source_uuid} yet.")
+			elif tag_json is not None and tag_json.get("model_sha256", None) == model_registry_json["sha256"]:
+				# a detector that restarted or reconnected with the current weights only needed the handshake
+				if self.__is_debug:
+					print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: detector {source_uuid} already holds model version {model_registry_json['model_version_index']}.")
+				self.__model_acknowledgement_condition.acquire()
+				try:
+					self.__model_sha256_and_version_index_per_detector_source_uuid[source_uuid] = (model_registry_json["sha256"], model_registry_json["model_version_index"])
+				finally:
+					self.__model_acknowledgement_condition.release()
+			else:
+				self.__send_updated_model(
+					detector_structure=detector_structure
+				)
 		else:
 			raise Exception(f"Unexpected connection from source: {source_type.value}")
 
+	def __send_updated_model_and_wait_for_acknowledgement(self, *, source_uuid: str, detector_structure: DetectorStructure, model_sha256: str) -> bool or None:
+
+		# the timeout covers the transfer as well as the acknowledgement
+		timeout_time = time.monotonic() + self.__model_broadcast_timeout_seconds
+
+		self.__send_updated_model(
+			detector_structure=detector_structure
+		)
+
+		if not detector_structure.is_model_acknowledgement_supported():
+			return None
+
+		# holding a pool thread until the detector has the model bounds how many transfers run at once
+		self.__model_acknowledgement_condition.acquire()
+		try:
+			while True:
+				model_acknowledgement = self.__model_acknowledgement_per_detector_source_uuid.get(source_uuid, None)
+				if model_acknowledgement is not None and model_acknowledgement[0] == model_sha256:
+					return model_acknowledgement[1]
+				if not self.__is_training_model_thread_active:
+					return None
+				remaining_seconds = timeout_time - time.monotonic()
+				if remaining_seconds <= 0:
+					raise FutureTimeoutError(f"Detector {source_uuid} did not acknowledge model {model_sha256} in time.")
+				self.__model_acknowledgement_condition.wait(remaining_seconds)
+		finally:
+			self.__model_acknowledgement_condition.release()
+
+	def __broadcast_updated_model(self):
+
+		self.__training_model_file_path_semaphore.acquire()
+		try:
+			model_sha256 = self.__model_registry_json["sha256"]
+		finally:
+			self.__training_model_file_path_semaphore.release()
+
+		self.__detector_structure_per_source_uuid_semaphore.acquire()
+		try:
+			detector_structure_per_source_uuid = dict(self.__detector_structure_per_source_uuid)
+		finally:
+			self.__detector_structure_per_source_uuid_semaphore.release()
+
+		if not detector_structure_per_source_uuid:
+			return
+
+		# detectors keep registering while the transfers run, and they are sent the model on connection instead
+		disconnected_detector_source_uuids = []  # type: List[str]
+		timed_out_detector_source_uuids = []  # type: List[str]
+		broadcast_thread_total = min(self.__model_broadcast_thread_total, len(detector_structure_per_source_uuid))
+		# each detector waits its turn for a pool thread, so the whole broadcast is allowed one timeout per round of transfers
+		broadcast_round_total = -(-len(detector_structure_per_source_uuid) // broadcast_thread_total)
+		timeout_time = time.monotonic() + self.__model_broadcast_timeout_seconds * broadcast_round_total
+		executor = ThreadPoolExecutor(max_workers=broadcast_thread_total)
+		try:
+			future_per_source_uuid = {}
+			for source_uuid, detector_structure in detector_structure_per_source_uuid.items():
+				future_per_source_uuid[source_uuid] = executor.submit(partial(self.__send_updated_model_and_wait_for_acknowledgement, source_uuid=source_uuid, detector_structure=detector_structure, model_sha256=model_sha256))
+			for source_uuid, future in future_per_source_uuid.items():
+				try:
+					is_successful = future.result(timeout=max(0.0, timeout_time - time.monotonic()))
+					if self.__is_debug:
+						if is_successful is None:
+							print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: broadcasted updated model to detector {source_uuid} without acknowledgement.")
+						elif is_successful:
+							print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: detector {source_uuid} acknowledged updated model.")
+						else:
+							print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: detector {source_uuid} rejected updated model.")
+				except FutureTimeoutError as ex:
+					future.cancel()
+					if self.__is_debug:
+						print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: timed out sending updated model to detector {source_uuid}.")
+					timed_out_detector_source_uuids.append(source_uuid)
+				except ReadWriteSocketClosedException as ex:
+					if self.__is_debug:
+						print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: disconnected from detector {source_uuid}.")
+					disconnected_detector_source_uuids.append(source_uuid)
+				except Exception as ex:
+					print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: ex: {ex}")
+		finally:
+			# a transfer stuck on its socket is left behind rather than holding up the next model
+			executor.shutdown(wait=False)
+
+		self.__detector_structure_per_source_uuid_semaphore.acquire()
+		try:
+			for source_uuid in disconnected_detector_source_uuids:
+				if self.__detector_structure_per_source_uuid.get(source_uuid, None) is detector_structure_per_source_uuid[source_uuid]:
+					del self.__detector_structure_per_source_uuid[source_uuid]
+		finally:
+			self.__detector_structure_per_source_uuid_semaphore.release()
+
+		self.__model_acknowledgement_condition.acquire()
+		try:
+			for source_uuid in disconnected_detector_source_uuids:
+				self.__model_acknowledgement_per_detector_source_uuid.pop(source_uuid, None)
+				self.__model_sha256_and_version_index_per_detector_source_uuid.pop(source_uuid, None)
+			detector_source_uuids_per_model_version_index = {}  # type: Dict[int, List[str]]
+			for source_uuid, (_, model_version_index) in self.__model_sha256_and_version_index_per_detector_source_uuid.items():
+				detector_source_uuids_per_model_version_index.setdefault(model_version_index, []).append(source_uuid)
+		finally:
+			self.__model_acknowledgement_condition.release()
+		print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: detectors per model version: {detector_source_uuids_per_model_version_index}, timed out detectors: {timed_out_detector_source_uuids}")
+
+	def __get_file_sha256(self, *, file_path: str) -> str:
+		file_hash = hashlib.sha256()
+		with open(file_path, "rb") as file_handle:
+			for chunk_bytes in iter(partial(file_handle.read, 1024 * 1024), b""):
+				file_hash.update(chunk_bytes)
+		return file_hash.hexdigest()
+
+	def __update_model_registry(self):
+		# each trained model gets the next version index along with the hash that detectors compare against the weights they hold
+		if self.__model_registry_json is None:
+			model_version_index = 1
+		else:
+			model_version_index = self.__model_registry_json["model_version_index"] + 1
+		model_registry_json = {
+			"model_version_index": model_version_index,
+			"sha256": self.__get_file_sha256(
+				file_path=self.__training_model_file_path
+			),
+			"size_bytes": os.path.getsize(self.__training_model_file_path)
+		}
+		temporary_file_path = f"{self.__model_registry_file_path}.{uuid.uuid4()}.tmp"
+		with open(temporary_file_path, "w") as file_handle:
+			json.dump(model_registry_json, file_handle)
+		os.replace(temporary_file_path, self.__model_registry_file_path)
+		self.__model_registry_json = model_registry_json
+
+	def __publish_model(self, *, model_file_path: str, quantized_model_file_path: str or None):
+
+		# the weights, their quantized variant and the registry change together so that a detector is never sent one labelled as another
+		self.__training_model_file_path_semaphore.acquire()
+		try:
+			os.replace(model_file_path, self.__training_model_file_path)
+			if quantized_model_file_path is not None:
+				os.replace(quantized_model_file_path, self.__quantized_model_file_path)
+			elif os.path.exists(self.__quantized_model_file_path):
+				# the previous variant no longer matches the weights, so it is never sent alongside them
+				os.remove(self.__quantized_model_file_path)
+			self.__update_model_registry()
+			if self.__attachment_server is not None:
+				# published once up front so that the concurrent sends only read the attachments
+				self.__get_model_attachment_uuids()
+		finally:
+			self.__training_model_file_path_semaphore.release()
+
+	def __get_model_attachment_uuids_and_version_index(self) -> Tuple[List[str], int]:
+
+		self.__training_model_file_path_semaphore.acquire()
+		try:
+			return self.__get_model_attachment_uuids(), self.__model_registry_json["model_version_index"]
+		finally:
+			self.__training_model_file_path_semaphore.release()
+
+	def __get_model_attachment_uuids(self) -> List[str]:
+
+		# only called while holding the training model file path semaphore, since the previous snapshot is removed here
+		model_file_paths = [self.__training_model_file_path]
+		if os.path.exists(self.__quantized_model_file_path):
+			model_file_paths.append(self.__quantized_model_file_path)
+
+		model_file_identities = []  # type: List[Tuple[int, int, int]]
+		for model_file_path in model_file_paths:
+			model_file_stat = os.stat(model_file_path)
+			model_file_identities.append((model_file_stat.st_ino, model_file_stat.st_mtime_ns, model_file_stat.st_size))
+
+		if model_file_identities != self.__model_file_identities:
+			# the models are replaced rather than rewritten, so a hard link keeps serving the same bytes to detectors that are still downloading
+			model_attachment_uuids = []  # type: List[str]
+			model_attachment_file_paths = []  # type: List[str]
+			for model_file_path in model_file_paths:
+				temporary_attachment_file_path = os.path.join(self.__model_directory_path, f"attachment.{uuid.uuid4()}.tmp")
+				os.link(model_file_path, temporary_attachment_file_path)
+				attachment_sha256 = self.__get_file_sha256(
+					file_path=temporary_attachment_file_path
+				)
+				attachment_file_path = os.path.join(self.__model_directory_path, f"attachment.{attachment_sha256}{os.path.splitext(model_file_path)[1]}")
+				os.replace(temporary_attachment_file_path, attachment_file_path)
+				# detectors version their models by this same hash, so they can skip a download they already have
+				self.__attachment_server.add_attachment_file(
+					attachment_uuid=attachment_sha256,
+					attachment_file_path=attachment_file_path,
+					attachment_sha256=attachment_sha256
+				)
+				model_attachment_uuids.append(attachment_sha256)
+				model_attachment_file_paths.append(attachment_file_path)
+			for attachment_uuid, attachment_file_path in zip(self.__model_attachment_uuids, self.__model_attachment_file_paths):
+				if attachment_uuid not in model_attachment_uuids:
+					self.__attachment_server.remove_attachment(
+						attachment_uuid=attachment_uuid
+					)
+					os.remove(attachment_file_path)
+			self.__model_attachment_uuids = model_attachment_uuids
+			self.__model_attachment_file_paths = model_attachment_file_paths
+			self.__model_file_identities = model_file_identities
+
+		return self.__model_attachment_uuids
+
+	def __send_updated_model(self, *, detector_structure: DetectorStructure):
+
+		if detector_structure.is_attachment_supported():
+			# the detector streams the models from the attachment server, where a single copy on disk is shared by every detector
+			model_attachment_uuids, model_version_index = self.__get_model_attachment_uuids_and_version_index()
+			detector_structure.send_updated_model_attachment(
+				model_attachment_uuid=model_attachment_uuids[0],
+				quantized_model_attachment_uuid=model_attachment_uuids[1] if len(model_attachment_uuids) == 2 else None,
+				model_version_index=model_version_index
+			)
+		else:
+			# the files are replaced rather than rewritten, so handles opened together keep reading the same version
+			quantized_model_file_handle = None
+			self.__training_model_file_path_semaphore.acquire()
+			try:
+				model_file_handle = open(self.__training_model_file_path, "rb")
+				if os.path.exists(self.__quantized_model_file_path):
+					quantized_model_file_handle = open(self.__quantized_model_file_path, "rb")
+				model_version_index = self.__model_registry_json["model_version_index"]
+			finally:
+				self.__training_model_file_path_semaphore.release()
+			with model_file_handle:
+				model_bytes = model_file_handle.read()
+			quantized_model_bytes = None
+			if quantized_model_file_handle is not None:
+				with quantized_model_file_handle:
+					quantized_model_bytes = quantized_model_file_handle.read()
+			detector_structure.send_updated_model(
+				model_bytes=model_bytes,
+				quantized_model_bytes=quantized_model_bytes,
+				model_version_index=model_version_index
+			)
+
+	def __quantize_model(self, *, model_file_path: str) -> str or None:
+
+		temporary_quantized_model_file_path = f"{self.__quantized_model_file_path}.{uuid.uuid4()}.tmp.onnx"
+		quantization_subprocess_wrapper = SubprocessWrapper(
+			command=sys.executable,
+			arguments=[self.__quantization_python_file_path, self.__yolov5_directory_path, model_file_path, os.path.join(self.__yolov5_directory_path, "data", "service_data.yaml"), os.path.join(self.__validation_directory_path, "images"), str(self.__image_size), str(self.__quantization_calibration_image_total), temporary_quantized_model_file_path, self.__quantization_report_file_path]
+		)
+		if self.__is_debug:
+			print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: Quantization script: (start)")
+		exit_code, quantization_output = quantization_subprocess_wrapper.run()
+		if self.__is_debug:
+			print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: Quantization exit code: {exit_code}")
+			print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: Quantization output: {quantization_output}")
+			print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: Quantization script: (end)")
+
+		if exit_code != 0 or not os.path.exists(temporary_quantized_model_file_path):
+			print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: failed to quantize model with exit code {exit_code}.")
+			if os.path.exists(temporary_quantized_model_file_path):
+				os.remove(temporary_quantized_model_file_path)
+			return None
+		else:
+			with open(self.__quantization_report_file_path, "r") as file_handle:
+				report_json = json.load(file_handle)
+			print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: quantization report: {json.dumps(report_json)}")
+			return temporary_quantized_model_file_path
+
 	def __training_model_thread_method(self):
 
 		try:
-			while self.__is_training_model_thread_active:
+			while self.__wait_for_training():
 
 				# check the available images and annotation for new training data
 				self.__available_image_uuids_semaphore.acquire()
@@ -391,55 +1206,38 @@ class TrainerStructure(Structure):
 						print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: Training shell script: (end)")
 					# TODO save output to log
 
-					# ensure that training weights are saved to appropriate file path
-					destination_last_model_file_path = None
+					# ensure that training weights are staged beside the published file path
+					staged_model_file_path = None
 					for line in training_output.split("\n"):
 						if line.startswith("Optimizer stripped from") and "last.pt" in line:
 							path_index = line.index("runs")
 							source_last_model_file_path = os.path.join(self.__yolov5_directory_path, line[path_index:line.index("last.pt")], "last.pt")
-							destination_last_model_file_path = os.path.join(self.__model_directory_path, "training.pt")
+							# published later by replacing rather than overwriting, so that the previous model stays intact for any detector still downloading it
+							staged_model_file_path = os.path.join(self.__model_directory_path, f"training.{uuid.uuid4()}.tmp.pt")
 							if self.__is_debug:
-								print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: saving model from {source_last_model_file_path} to {destination_last_model_file_path}")
-							shutil.copy(source_last_model_file_path, destination_last_model_file_path)
+								print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: staging model from {source_last_model_file_path} to {staged_model_file_path}")
+							shutil.copy(source_last_model_file_path, staged_model_file_path)
 							break
 
 					self.__training_subprocess_wrapper = None
 
-					if destination_last_model_file_path is None:
+					if staged_model_file_path is None:
 						print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: failed to find latest model.")
 					else:
-						# get trained weights file path to send to detectors
+						staged_quantized_model_file_path = None
+						if self.__is_quantization_enabled:
+							staged_quantized_model_file_path = self.__quantize_model(
+								model_file_path=staged_model_file_path
+							)
+						self.__publish_model(
+							model_file_path=staged_model_file_path,
+							quantized_model_file_path=staged_quantized_model_file_path
+						)
 
 						if self.__is_debug:
 							print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: broadcasting updated model to detectors.")
 
-						self.__detector_structure_per_source_uuid_semaphore.acquire()
-						try:
-							with open(destination_last_model_file_path, "rb") as file_handle:
-								model_bytes = file_handle.read()
-
-							disconnected_detector_source_uuids = []  # type: List[str]
-							for source_uuid, detector_structure in self.__detector_structure_per_source_uuid.items():
-								try:
-									detector_structure.send_updated_model(
-										model_bytes=model_bytes
-									)
-									if self.__is_debug:
-										print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: broadcasted updated model to detector {source_uuid}.")
-								except ReadWriteSocketClosedException as ex:
-									if self.__is_debug:
-										print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: disconnected from detector {source_uuid}.")
-									disconnected_detector_source_uuids.append(source_uuid)
-								except Exception as ex:
-									print(f"{datetime.utcnow()}: TrainerStructure: {inspect.stack()[0][3]}: ex: {ex}")
-
-							for source_uuid in disconnected_detector_source_uuids:
-								del self.__detector_structure_per_source_uuid[source_uuid]
-
-						finally:
-							self.__detector_structure_per_source_uuid_semaphore.release()
-
-				time.sleep(10.0)
+						self.__broadcast_updated_model()
 
 		except Exception as ex:
 			print(f"{datetime.utcnow()}: {inspect.stack()[0][3]}: ex: {ex}")
@@ -447,14 +1245,27 @@ class TrainerStructure(Structure):
 
 	def dispose(self):
 		super().dispose()
-		self.__is_training_model_thread_active = False
+		self.__training_condition.acquire()
+		try:
+			self.__is_training_model_thread_active = False
+			self.__training_condition.notify_all()
+		finally:
+			self.__training_condition.release()
+		self.__model_acknowledgement_condition.acquire()
+		try:
+			self.__model_acknowledgement_condition.notify_all()
+		finally:
+			self.__model_acknowledgement_condition.release()
 		if self.__training_subprocess_wrapper is not None:
 			self.__training_subprocess_wrapper.kill()
+		if self.__attachment_server is not None:
+			self.__attachment_server.shutdown()
+			self.__attachment_server.server_close()
 
 
 class TrainerStructureFactory(StructureFactory):
 
-	def __init__(self, *, script_directory_path: str, temp_image_directory_path: str, training_directory_path: str, validation_directory_path: str, model_directory_path: str, yolov5_directory_path: str, image_size: int, training_batch_size: int, training_epochs: int, is_debug: bool = False):
+	def __init__(self, *, script_directory_path: str, temp_image_directory_path: str, training_directory_path: str, validation_directory_path: str, model_directory_path: str, yolov5_directory_path: str, image_size: int, training_batch_size: int, training_epochs: int, is_quantization_enabled: bool, quantization_calibration_image_total: int, attachment_host_address: str, attachment_advertised_host_address: str, attachment_port: int, training_image_total_threshold: int, minimum_training_interval_seconds: float, model_broadcast_thread_total: int, model_broadcast_timeout_seconds: float, is_debug: bool = False):
 
 		self.__script_directory_path = script_directory_path
 		self.__temp_image_directory_path = temp_image_directory_path
@@ -465,6 +1276,15 @@ class TrainerStructureFactory(StructureFactory):
 		self.__image_size = image_size
 		self.__training_batch_size = training_batch_size
 		self.__training_epochs = training_epochs
+		self.__is_quantization_enabled = is_quantization_enabled
+		self.__quantization_calibration_image_total = quantization_calibration_image_total
+		self.__attachment_host_address = attachment_host_address
+		self.__attachment_advertised_host_address = attachment_advertised_host_address
+		self.__attachment_port = attachment_port
+		self.__training_image_total_threshold = training_image_total_threshold
+		self.__minimum_training_interval_seconds = minimum_training_interval_seconds
+		self.__model_broadcast_thread_total = model_broadcast_thread_total
+		self.__model_broadcast_timeout_seconds = model_broadcast_timeout_seconds
 		self.__is_debug = is_debug
 
 	def get_structure(self) -> Structure:
@@ -478,5 +1298,14 @@ class TrainerStructureFactory(StructureFactory):
 			image_size=self.__image_size,
 			training_batch_size=self.__training_batch_size,
 			training_epochs=self.__training_epochs,
+			is_quantization_enabled=self.__is_quantization_enabled,
+			quantization_calibration_image_total=self.__quantization_calibration_image_total,
+			attachment_host_address=self.__attachment_host_address,
+			attachment_advertised_host_address=self.__attachment_advertised_host_address,
+			attachment_port=self.__attachment_port,
+			training_image_total_threshold=self.__training_image_total_threshold,
+			minimum_training_interval_seconds=self.__minimum_training_interval_seconds,
+			model_broadcast_thread_total=self.__model_broadcast_thread_total,
+			model_broadcast_timeout_seconds=self.__model_broadcast_timeout_seconds,
 			is_debug=self.__is_debug
 		)